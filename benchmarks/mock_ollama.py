@@ -0,0 +1,223 @@
+"""Deterministic stand-in for the Ollama HTTP API.
+
+Implements /api/generate and /api/chat (streaming and non-streaming),
+/api/embed and /api/tags with a fixed response, a configurable delay before
+the first token and a fixed token rate, so benchmark numbers reflect this
+project's overhead rather than model speed. Embeddings are hashed bags of
+identifier parts, so texts sharing words are similar and search results are
+deterministic.
+
+    python benchmarks/mock_ollama.py --port 11435 --latency-ms 50 --token-rate 200
+"""
+import argparse
+import json
+import math
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+RESPONSE_TEXT = (
+    "```python\n"
+    "def handle(request):\n"
+    "    result = process(request)\n"
+    "    return result\n"
+    "```\n"
+    "This handles the request and returns the processed result."
+)
+
+MODELS = ["codellama:7b", "deepseek-coder:6.7b", "codegemma:7b", "llama3:8b",
+          "nomic-embed-text"]
+
+EMBEDDING_DIM = 256
+
+def response_tokens(count: int) -> List[str]:
+    """The first `count` whitespace-delimited tokens of RESPONSE_TEXT, repeated as needed"""
+    words = re.findall(r'\S+\s*', RESPONSE_TEXT)
+    return [words[i % len(words)] for i in range(count)]
+
+def embed_text(text: str, dim: int = EMBEDDING_DIM) -> List[float]:
+    """Unit-length hashed bag of lower-cased identifier parts"""
+    vector = [0.0] * dim
+    for word in re.findall(r'[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+', text):
+        vector[zlib.crc32(word.lower().encode()) % dim] += 1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+class MockOllama:
+    """Threaded mock server; use as a context manager or call start()/stop()"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 token_rate: float = 0.0, tokens: int = 32):
+        self.latency = latency
+        self.token_rate = token_rate  # tokens per second; 0 sends them all at once
+        self.tokens = response_tokens(tokens)
+        self.requests = 0
+        self.embed_requests = 0
+        self.preloads = 0
+        self.request_times: List[float] = []  # wall-clock arrival of each generate/chat call
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockOllama":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockOllama":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _token_delay(self) -> float:
+        return 1.0 / self.token_rate if self.token_rate else 0.0
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like Ollama
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path != "/api/tags":
+                    self._send_json(404, {"error": "not found"})
+                    return
+                self._send_json(200, {"models": [{"name": name} for name in MODELS]})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    request = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    self._send_json(400, {"error": "invalid JSON"})
+                    return
+                if self.path == "/api/embed":
+                    self._embed(request)
+                    return
+                if self.path not in ("/api/generate", "/api/chat"):
+                    self._send_json(404, {"error": "not found"})
+                    return
+
+                model = request.get("model", MODELS[0])
+                if model not in MODELS:
+                    self._send_json(404, {"error": f"model '{model}' not found"})
+                    return
+                if self.path == "/api/generate" and "prompt" not in request:
+                    # No prompt: Ollama only loads the model
+                    mock.preloads += 1
+                    self._send_json(200, {"model": model, "response": "", "done": True,
+                                          "done_reason": "load"})
+                    return
+                mock.requests += 1
+                mock.request_times.append(time.time())
+
+                started = time.perf_counter()
+                time.sleep(mock.latency)
+                prompt_eval = time.perf_counter() - started
+                chat = self.path == "/api/chat"
+                if request.get("stream", True):
+                    self._stream(model, request, started, prompt_eval, chat)
+                else:
+                    time.sleep(mock._token_delay() * len(mock.tokens))
+                    self._send_json(200, self._final(model, request, started, prompt_eval,
+                                                     **self._text(''.join(mock.tokens), chat)))
+
+            def _embed(self, request):
+                mock.embed_requests += 1
+                texts = request.get("input", [])
+                if isinstance(texts, str):
+                    texts = [texts]
+                time.sleep(mock.latency)
+                self._send_json(200, {"model": request.get("model"),
+                                      "embeddings": [embed_text(text) for text in texts]})
+
+            @staticmethod
+            def _text(text, chat):
+                if chat:
+                    return {"message": {"role": "assistant", "content": text}}
+                return {"response": text}
+
+            def _final(self, model, request, started, prompt_eval, **extra):
+                total = time.perf_counter() - started
+                prompt = request.get("prompt") or ''.join(
+                    m.get("content", "") for m in request.get("messages", []))
+                body = {
+                    "model": model,
+                    "done": True,
+                    "total_duration": int(total * 1e9),
+                    "prompt_eval_count": len(prompt) // 4,
+                    "prompt_eval_duration": int(prompt_eval * 1e9),
+                    "eval_count": len(mock.tokens),
+                    "eval_duration": int((total - prompt_eval) * 1e9),
+                }
+                body.update(extra)
+                return body
+
+            def _chunk(self, body):
+                data = json.dumps(body).encode() + b"\n"
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+            def _stream(self, model, request, started, prompt_eval, chat):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                delay = mock._token_delay()
+                try:
+                    for token in mock.tokens:
+                        if delay:
+                            time.sleep(delay)
+                        self._chunk({"model": model, "done": False, **self._text(token, chat)})
+                    self._chunk(self._final(model, request, started, prompt_eval,
+                                            **self._text("", chat)))
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True  # client cancelled mid-stream
+
+        return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock Ollama server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay before the first token")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="Tokens per second (0 = instant)")
+    parser.add_argument("--tokens", type=int, default=32, help="Tokens per response")
+    args = parser.parse_args()
+
+    mock = MockOllama(args.host, args.port, args.latency_ms / 1000.0, args.token_rate, args.tokens)
+    print(f"Mock Ollama listening on {mock.url}")
+    try:
+        mock._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock._server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+"""Benchmark the assistant against a mock Ollama server and synthetic repos.
+
+Writes p50/p95/p99 latency, throughput and peak RSS per benchmark as JSON;
+pass --compare with an earlier run's output to flag regressions.
+
+    python benchmarks/run_benchmarks.py --sizes 1000,10000 --out bench.json
+    python benchmarks/run_benchmarks.py --sizes 1000 --compare bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+sys.path.insert(0, str(SRC_DIR))
+
+from mock_ollama import MockOllama
+from ollama_client import OllamaClient
+from assistant import AICodeAssistant, TaskType, CodeContext
+from context_manager import ContextManager
+from code_parser import CodeParser
+from semantic_index import SemanticIndex
+
+FILES_PER_DIR = 100
+
+PYTHON_TEMPLATE = '''import os
+from pkg{prev_dir}.mod{prev} import helper_{prev}
+
+class Service{n}:
+    """Synthetic service {n}"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def run(self, items):
+        total = 0
+        for item in items:
+            total += helper_{n}(item)
+        return total
+
+def helper_{n}(value):
+    return value * {n}
+
+def format_{n}(value):
+    return os.path.join("out", str(value))
+'''
+
+JS_TEMPLATE = '''import {{ helper{prev} }} from './mod{prev}';
+
+export class Widget{n} {{
+  constructor(name) {{
+    this.name = name;
+  }}
+
+  render(items) {{
+    return items.map(helper{n});
+  }}
+}}
+
+export function helper{n}(value) {{
+  return value * {n};
+}}
+'''
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+def peak_rss_mb() -> float:
+    """Process high-water RSS (ru_maxrss is KB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def summarize(name: str, latencies: List[float], elapsed: float,
+              repo_files: Optional[int] = None, **extra) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    result = {
+        "name": name,
+        "repo_files": repo_files,
+        "samples": len(ordered),
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 3),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        "throughput_per_sec": round(len(ordered) / elapsed, 3) if elapsed else 0.0,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+    result.update(extra)
+    return result
+
+def build_repo(root: Path, file_count: int):
+    """Synthetic project: directories of 100 files, 3 Python to 1 JavaScript"""
+    marker = root / ".bench-files"
+    if marker.exists() and marker.read_text() == str(file_count):
+        return
+    if root.exists():
+        shutil.rmtree(root)
+    for n in range(file_count):
+        directory = root / f"pkg{n // FILES_PER_DIR}"
+        if n % FILES_PER_DIR == 0:
+            directory.mkdir(parents=True)
+        prev = max(n - 1, 0)
+        if n % 4 == 3:
+            (directory / f"mod{n}.js").write_text(JS_TEMPLATE.format(n=n, prev=prev))
+        else:
+            (directory / f"mod{n}.py").write_text(
+                PYTHON_TEMPLATE.format(n=n, prev=prev, prev_dir=prev // FILES_PER_DIR))
+    marker.write_text(str(file_count))
+
+def sample_files(root: Path, file_count: int, samples: int) -> List[str]:
+    rng = random.Random(file_count)  # same files every run
+    picks = rng.sample(range(file_count), min(samples, file_count))
+    return [str(root / f"pkg{n // FILES_PER_DIR}" / (f"mod{n}.js" if n % 4 == 3 else f"mod{n}.py"))
+            for n in picks]
+
+def time_calls(fn: Callable[[Any], Any], items: List[Any]):
+    latencies = []
+    started = time.perf_counter()
+    for item in items:
+        t = time.perf_counter()
+        fn(item)
+        latencies.append(time.perf_counter() - t)
+    return latencies, time.perf_counter() - started
+
+async def time_concurrent(fn: Callable[[Any], Any], items: List[Any], concurrency: int):
+    latencies = []
+    queue = list(items)
+
+    async def worker():
+        while queue:
+            item = queue.pop()
+            t = time.perf_counter()
+            await fn(item)
+            latencies.append(time.perf_counter() - t)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - started
+
+async def bench_client(url: str, requests: int, concurrency: int) -> List[Dict[str, Any]]:
+    client = OllamaClient(url, model="codellama:7b")
+    results = []
+    try:
+        await client.generate("warm up the pool")
+
+        latencies, elapsed = await time_concurrent(
+            lambda i: client.generate(f"prompt {i}"), list(range(requests)), concurrency)
+        results.append(summarize("ollama_client.generate", latencies, elapsed,
+                                 concurrency=concurrency))
+
+        first_tokens = []
+
+        async def stream(i):
+            t = time.perf_counter()
+            first = None
+            async for _ in client.stream(f"prompt {i}"):
+                if first is None:
+                    first = time.perf_counter() - t
+            first_tokens.append(first or 0.0)
+
+        latencies, elapsed = await time_concurrent(stream, list(range(requests)), concurrency)
+        ttft = sorted(first_tokens)
+        results.append(summarize("ollama_client.stream", latencies, elapsed,
+                                 concurrency=concurrency,
+                                 ttft_p50_ms=round(percentile(ttft, 0.50) * 1000, 3),
+                                 ttft_p95_ms=round(percentile(ttft, 0.95) * 1000, 3)))
+    finally:
+        await client.aclose()
+    return results
+
+async def bench_repo(url: str, root: Path, file_count: int, samples: int,
+                     concurrency: int) -> List[Dict[str, Any]]:
+    results = []
+
+    context_manager = ContextManager(str(root))
+    started = time.perf_counter()
+    context_manager.get_project_structure()
+    elapsed = time.perf_counter() - started
+    results.append(summarize("context_manager.index_build", [elapsed], elapsed, file_count))
+
+    # Cold import graph and symbol index: no paths set, so nothing is loaded from disk
+    started = time.perf_counter()
+    context_manager.build_indexes()
+    elapsed = time.perf_counter() - started
+    results.append(summarize("context_manager.build_indexes", [elapsed], elapsed, file_count,
+                             workers=context_manager.scanner.workers))
+
+    files = sample_files(root, file_count, samples)
+    latencies, elapsed = time_calls(context_manager.get_file_context, files)
+    results.append(summarize("context_manager.get_file_context", latencies, elapsed, file_count))
+
+    parser = CodeParser()
+    sources = [(Path(f).read_text(), context_manager._detect_language(f), f) for f in files]
+    latencies, elapsed = time_calls(lambda s: parser.parse_functions(*s), sources)
+    results.append(summarize("code_parser.parse_functions", latencies, elapsed, file_count))
+
+    symbols = [("helper_" if f.endswith(".py") else "helper") + Path(f).stem[3:] for f in files]
+    latencies, elapsed = time_calls(context_manager.find_definitions, symbols)
+    results.append(summarize("context_manager.find_definitions", latencies, elapsed, file_count))
+
+    client = OllamaClient(url, model="codellama:7b")
+    assistant = AICodeAssistant(client, context_manager)
+
+    # In-memory store so every run embeds the whole repo
+    semantic = SemanticIndex(context_manager, client)
+    started = time.perf_counter()
+    await semantic.ensure_built()
+    elapsed = time.perf_counter() - started
+    results.append(summarize("semantic_index.build", [elapsed], elapsed, file_count,
+                             chunks=len(semantic.store)))
+    queries = [f"where is helper {Path(f).stem[3:]} used" for f in files]
+    latencies, elapsed = await time_concurrent(semantic.search, queries, concurrency)
+    results.append(summarize("semantic_index.search", latencies, elapsed, file_count,
+                             concurrency=concurrency))
+
+    async def review(file_path):
+        content = context_manager.read_file(file_path)
+        context = CodeContext(file_path=file_path, content=content,
+                              language=context_manager._detect_language(file_path),
+                              cursor_position=len(content) // 2)
+        await assistant.process_request(TaskType.CODE_REVIEW, context, "Please review this code")
+
+    try:
+        latencies, elapsed = await time_concurrent(review, files, concurrency)
+        results.append(summarize("assistant.process_request", latencies, elapsed, file_count,
+                                 concurrency=concurrency))
+    finally:
+        await client.aclose()
+    return results
+
+def bench_cli_startup(mock: MockOllama, work_dir: Path, runs: int,
+                      budget_ms: float) -> Dict[str, Any]:
+    """Spawn one-shot `cli.py review FILE` and time process start to its first request"""
+    project = work_dir / "cli-project"
+    project.mkdir(parents=True, exist_ok=True)
+    source = project / "hook_target.py"
+    source.write_text(PYTHON_TEMPLATE.format(n=1, prev=0, prev_dir=0))
+    config_path = work_dir / "cli-config.json"  # JSON is valid YAML
+    config_path.write_text(json.dumps({
+        "ollama": {"base_url": mock.url, "coalesce_requests": False},
+        "cache": {"enabled": False},
+        "index": {"persist": False},
+    }))
+
+    command = [sys.executable, "-m", "ui.cli", "--project", str(project),
+               "--config", str(config_path), "review", str(source)]
+    startups, totals = [], []
+    started = time.perf_counter()
+    for _ in range(runs):
+        seen = len(mock.request_times)
+        spawned = time.time()
+        subprocess.run(command, cwd=SRC_DIR, stdout=subprocess.DEVNULL, check=True)
+        totals.append(time.time() - spawned)
+        if len(mock.request_times) > seen:
+            startups.append(mock.request_times[seen] - spawned)
+    elapsed = time.perf_counter() - started
+
+    result = summarize("cli.startup_to_first_request", startups, elapsed, budget_ms=budget_ms)
+    ordered = sorted(totals)
+    result["total_p50_ms"] = round(percentile(ordered, 0.50) * 1000, 3)
+    result["over_budget"] = result["p50_ms"] > budget_ms
+    return result
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> bool:
+    """Print p95/throughput changes per benchmark; True if anything regressed"""
+    previous = {(r["name"], r["repo_files"]): r for r in baseline["results"]}
+    regressed = False
+    print(f"{'benchmark':40} {'files':>7} {'p95 ms':>21} {'throughput/s':>23}", file=sys.stderr)
+    for result in current["results"]:
+        old = previous.get((result["name"], result["repo_files"]))
+        if old is None:
+            continue
+        p95_change = (result["p95_ms"] - old["p95_ms"]) / old["p95_ms"] if old["p95_ms"] else 0.0
+        tput_change = ((result["throughput_per_sec"] - old["throughput_per_sec"])
+                       / old["throughput_per_sec"]) if old["throughput_per_sec"] else 0.0
+        flag = ""
+        if p95_change > threshold or tput_change < -threshold:
+            flag = "  REGRESSION"
+            regressed = True
+        print(f"{result['name']:40} {result['repo_files'] or '-':>7} "
+              f"{old['p95_ms']:>9.2f} -> {result['p95_ms']:>9.2f} "
+              f"{old['throughput_per_sec']:>10.1f} -> {result['throughput_per_sec']:>10.1f}{flag}", file=sys.stderr)
+    return regressed
+
+async def run(args) -> Dict[str, Any]:
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    work_dir = Path(args.work_dir) if args.work_dir else Path(tempfile.gettempdir()) / "ai-assistant-bench"
+    results = []
+
+    with MockOllama(latency=args.latency_ms / 1000.0, token_rate=args.token_rate,
+                    tokens=args.tokens) as mock:
+        results.extend(await bench_client(mock.url, args.requests, args.concurrency))
+        if args.cli_runs:
+            results.append(bench_cli_startup(mock, work_dir, args.cli_runs, args.startup_budget_ms))
+        for size in sizes:
+            root = work_dir / f"repo-{size}"
+            print(f"Building {size}-file repo in {root}", file=sys.stderr)
+            build_repo(root, size)
+            print(f"Benchmarking {size}-file repo", file=sys.stderr)
+            results.extend(await bench_repo(mock.url, root, size, args.samples, args.concurrency))
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "mock": {"latency_ms": args.latency_ms, "token_rate": args.token_rate,
+                     "tokens": args.tokens},
+            "requests": args.requests,
+            "samples": args.samples,
+            "concurrency": args.concurrency,
+            "startup_budget_ms": args.startup_budget_ms,
+        },
+        "results": results,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="AI Coding Assistant benchmarks")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Synthetic repo sizes (files)")
+    parser.add_argument("--samples", type=int, default=200, help="Files sampled per repo benchmark")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per client benchmark")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Mock time to first token")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="Mock tokens/sec (0 = instant)")
+    parser.add_argument("--tokens", type=int, default=32, help="Mock tokens per response")
+    parser.add_argument("--cli-runs", type=int, default=20, help="One-shot CLI launches to time (0 to skip)")
+    parser.add_argument("--startup-budget-ms", type=float, default=100.0,
+                        help="Budget from process start to the first model request")
+    parser.add_argument("--work-dir", default=None, help="Where synthetic repos are kept between runs")
+    parser.add_argument("--out", default=None, help="Write results JSON here (default stdout)")
+    parser.add_argument("--compare", default=None, help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative p95/throughput change counted as a regression")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,18 @@
 import asyncio
+import hashlib
 import json
-from typing import Dict, List, Optional, Any
+import httpx
+from typing import AsyncIterator, Callable, Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass
 from enum import Enum
+from response_cache import ResponseCache
+from request_coalescer import CoalescingClient
+from context_builder import AssembledContext, ContextAssembler
+from tracing import Tracer
+from sessions import DEFAULT_SESSION, HistoryEntry, SessionStore
+from conversation import ConversationManager
+from ollama_client import ErrorText, FallbackText, StreamError
+from response_parser import ResponseParser
 
 class TaskType(Enum):
     CODE_COMPLETION = "code_completion"
@@ -12,7 +22,7 @@ class TaskType(Enum):
     REFACTORING = "refactoring"
     DOCUMENTATION = "documentation"
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class CodeContext:
     file_path: str
     content: str
@@ -20,162 +30,578 @@ class CodeContext:
     cursor_position: int
     selected_text: Optional[str] = None
 
-class AICodeAssistant:
-    def __init__(self, model_client, context_manager):
-        self.model_client = model_client
-        self.context_manager = context_manager
-        self.conversation_history = []
-        
-    async def process_request(self, task_type: TaskType, context: CodeContext, 
-                            user_input: str) -> Dict[str, Any]:
-        """Main method to process coding assistance requests"""
-        
-        # Build context-aware prompt
-        prompt = self._build_prompt(task_type, context, user_input)
-        
-        # Get response from AI model
-        response = await self.model_client.generate_response(prompt)
-        
-        # Process and format response
-        result = self._process_response(response, task_type, context)
-        
-        # Update conversation history
-        self._update_history(user_input, result)
-        
-        return result
-    
-    def _build_prompt(self, task_type: TaskType, context: CodeContext, 
-                     user_input: str) -> str:
-        """Build context-aware prompts for different task types"""
-        
-        base_context = f"""
-File: {context.file_path}
-Language: {context.language}
-Current code:
-```{context.language}
-{context.content}
-"""
-        if context.selected_text:
-            base_context += f"\nSelected text: {context.selected_text}"
-    
-        prompt_templates = {
-            TaskType.CODE_COMPLETION: f"""
-{base_context}
-Cursor position: {context.cursor_position}
-Complete the code at the cursor position. Provide only the completion text.
-User request: {user_input}
-""",
-TaskType.CODE_REVIEW: f"""
-{base_context}
-Please review this code for:
+TASK_INSTRUCTIONS = {
+    TaskType.CODE_COMPLETION: "Complete the code at the cursor position. Provide only the completion text.",
+    TaskType.CODE_REVIEW: """Please review this code for:
 
 Potential bugs
 Performance issues
 Best practices
 Code quality
-
-User request: {user_input}
 """,
-TaskType.DEBUGGING: f"""
-{base_context}
-Help debug this code. Analyze for:
+    TaskType.DEBUGGING: """Help debug this code. Analyze for:
 
 Syntax errors
 Logic errors
 Common pitfalls
 Suggested fixes
-
-User request: {user_input}
 """,
-TaskType.EXPLANATION: f"""
-{base_context}
-Explain this code in detail:
+    TaskType.EXPLANATION: """Explain this code in detail:
 
 What it does
 How it works
 Key concepts used
-
-User request: {user_input}
 """,
-TaskType.REFACTORING: f"""
-{base_context}
-Suggest refactoring improvements:
+    TaskType.REFACTORING: """Suggest refactoring improvements:
 
 Code structure
 Performance optimizations
 Readability improvements
 Design patterns
-
-User request: {user_input}
 """,
-TaskType.DOCUMENTATION: f"""
-{base_context}
-Generate documentation for this code:
+    TaskType.DOCUMENTATION: """Generate documentation for this code:
 
 Function/class descriptions
 Parameter explanations
 Usage examples
 Return value descriptions
+""",
+}
 
-User request: {user_input}
-"""
+# Fill-in-the-middle prompt formats of code models, by model family: the
+# model sees the code before and after the cursor in the layout it was
+# trained on and generates only what goes between, ending on its own stop
+# token. Sent with raw=True so Ollama applies no chat template.
+FIM_TEMPLATES = {
+    "codellama": ("<PRE> {prefix} <SUF>{suffix} <MID>", ["<EOT>"]),
+    "deepseek-coder": ("<｜fim▁begin｜>{prefix}<｜fim▁hole｜>{suffix}<｜fim▁end｜>",
+                       ["<｜fim▁begin｜>", "<｜fim▁hole｜>", "<｜fim▁end｜>", "<|EOT|>"]),
+    "codegemma": ("<|fim_prefix|>{prefix}<|fim_suffix|>{suffix}<|fim_middle|>",
+                  ["<|fim_prefix|>", "<|fim_suffix|>", "<|fim_middle|>", "<|file_separator|>"]),
 }
-        return prompt_templates.get(task_type, f"{base_context}\n{user_input}")
 
-def _process_response(self, response: str, task_type: TaskType, 
-                     context: CodeContext) -> Dict[str, Any]:
-    """Process AI response based on task type"""
-    
-    result = {
-        "task_type": task_type.value,
-        "response": response,
-        "context": context,
-        "timestamp": asyncio.get_event_loop().time()
-    }
-    
-    # Add task-specific processing
-    if task_type == TaskType.CODE_COMPLETION:
-        result["completion"] = self._extract_code_completion(response)
-    elif task_type == TaskType.CODE_REVIEW:
-        result["issues"] = self._extract_code_issues(response)
-    elif task_type == TaskType.DEBUGGING:
-        result["fixes"] = self._extract_debug_fixes(response)
+LINE_COMMENTS = {"python": "#", "ruby": "#"}
+
+def content_hash(content: str) -> str:
+    return hashlib.blake2b(content.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+
+@dataclass(frozen=True, slots=True)
+class ContextRef:
+    """What a result records about its CodeContext: identity, not content"""
+    file_path: str
+    language: str
+    cursor_position: int
+    content_hash: str
+    size: int
+
+    @classmethod
+    def from_context(cls, context: CodeContext) -> "ContextRef":
+        return cls(context.file_path, context.language, context.cursor_position,
+                   content_hash(context.content), len(context.content))
+
+def _without_type(elements: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """ResponseParser elements as result entries (the list already says what they are)"""
+    return [{k: v for k, v in element.items() if k != "type"} for element in elements]
+
+def _fallback_model(text: Optional[str]) -> Optional[str]:
+    """The fallback model that produced a reply (or its first token), if one did"""
+    return text.model if isinstance(text, FallbackText) else None
+
+def _stream_error(tokens: List[str]) -> Optional[str]:
+    """The error that cut a streamed response short, if it was"""
+    return str(tokens[-1]) if tokens and isinstance(tokens[-1], StreamError) else None
+
+def serialize_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON-safe copy of a result, replacing the ContextRef with its path"""
+    serialized = {k: v for k, v in result.items() if k != "context"}
+    serialized["file_path"] = result["context"].file_path
+    return serialized
+
+class AICodeAssistant:
+    def __init__(self, model_client, context_manager, response_cache=None,
+                 temperature: float = 0.7, max_tokens: int = 2000,
+                 context_assembler: Optional[ContextAssembler] = None,
+                 task_models: Optional[Dict[str, str]] = None,
+                 tracer: Optional[Tracer] = None,
+                 sessions: Optional[SessionStore] = None,
+                 conversation: Optional[ConversationManager] = None,
+                 semantic_index=None,
+                 semantic_factory: Optional[Callable[[], Any]] = None,
+                 retrieval_tasks: Tuple[str, ...] = ("explanation", "debugging"),
+                 task_options: Optional[Dict[str, Dict[str, Any]]] = None,
+                 fim: bool = True):
+        self.model_client = model_client
+        self.context_manager = context_manager
+        self.response_cache = response_cache
+        self.context_assembler = context_assembler or ContextAssembler(context_manager)
+        self.task_models = task_models or {}
+        self.tracer = tracer or Tracer()
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        # Ollama options per task type, over the temperature/max_tokens defaults
+        self.task_options = task_options or {}
+        self.fim = fim
+        self.sessions = sessions if sessions is not None else SessionStore()
+        self.conversation = conversation or ConversationManager(model_client, self.sessions)
+        # Built on first use: it imports numpy, which one-shot reviews never need
+        self._semantic_index = semantic_index
+        self._semantic_factory = semantic_factory
+        self.retrieval_tasks = tuple(retrieval_tasks)
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], model_client,
+                    context_manager) -> "AICodeAssistant":
+        """Build an assistant with sampling and cache settings from config.yaml"""
+        ollama = config.get("ollama") or {}
+        models = config.get("models") or {}
+        if ollama.get("coalesce_requests", True):
+            model_client = CoalescingClient(model_client)
+        sessions = SessionStore.from_config(config)
+        semantic = config.get("semantic_index") or {}
+        assembler = ContextAssembler.from_config(config, context_manager)
+
+        def semantic_factory():
+            try:
+                from semantic_index import SemanticIndex
+            except ImportError:  # numpy not installed
+                return None
+            # Shares the assembler's parser, and with it one line-index cache
+            return SemanticIndex.from_config(config, context_manager, model_client,
+                                             parser=assembler.parser)
+
+        return cls(
+            model_client, context_manager,
+            response_cache=ResponseCache.from_config(config, context_manager.project_root),
+            temperature=ollama.get("temperature", 0.7),
+            max_tokens=ollama.get("max_tokens", 2000),
+            context_assembler=assembler,
+            task_models=models.get("routing") or {},
+            tracer=Tracer.from_config(config, context_manager.project_root),
+            sessions=sessions,
+            conversation=ConversationManager.from_config(config, model_client, sessions),
+            semantic_factory=semantic_factory if semantic.get("enabled", True) else None,
+            retrieval_tasks=semantic.get("retrieval_tasks", ("explanation", "debugging")),
+            task_options=config.get("task_options") or {},
+            fim=(config.get("completion") or {}).get("fim", True)
+        )
+
+    @property
+    def semantic_index(self):
+        if self._semantic_factory is not None:
+            factory, self._semantic_factory = self._semantic_factory, None
+            self._semantic_index = factory()
+        return self._semantic_index
+
+    @property
+    def conversation_history(self) -> List[HistoryEntry]:
+        """History of the default session (requests made without a session_id)"""
+        history = self.sessions.peek(DEFAULT_SESSION)
+        return list(history) if history is not None else []
+        
+    async def process_request(self, task_type: TaskType, context: CodeContext, 
+                            user_input: str, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """Main method to process coding assistance requests"""
+        trace = self.tracer.start(task_type.value)
+        activation = self.tracer.activate(trace)
+        try:
+            # Build context-aware prompt within the task's token budget
+            with trace.span("context"):
+                assembled = self._assemble_context(task_type, context)
+            with trace.span("retrieve"):
+                await self._retrieve(task_type, context, user_input, assembled)
+            with trace.span("prompt"):
+                prompt = self._build_prompt(task_type, context, user_input, assembled)
+                history, prompt, code_hash = await self._conversation_turn(
+                    task_type, context, user_input, prompt, session_id, assembled)
+            
+            # Serve repeated requests from the cache
+            with trace.span("cache"):
+                cache_key = self._cache_key(task_type, prompt, history)
+                response = self.response_cache.get(cache_key) if cache_key else None
+            
+            # Get response from AI model
+            parser = None
+            error = None
+            if response is None:
+                with trace.span("model"):
+                    if task_type == TaskType.CODE_COMPLETION:
+                        # Streamed so generation stops where the first code block ends
+                        parser = ResponseParser(task_type.value)
+                        tokens = [token async for token, _ in self._stream_parsed(
+                            task_type, prompt, history, parser)]
+                        parser.close()
+                        error = _stream_error(tokens)
+                        fallback = _fallback_model(tokens[0] if tokens else None)
+                        response = ''.join(tokens)
+                    else:
+                        response = await self.model_client.generate_response(
+                            prompt, **self._model_kwargs(task_type, history)
+                        )
+                        error = str(response) if isinstance(response, ErrorText) else None
+                        fallback = _fallback_model(response)
+                        response = str(response)
+                if error is None:
+                    if fallback is not None:
+                        # Another model answered: cache it as that model's reply
+                        cache_key = self._cache_key(task_type, prompt, history, model=fallback)
+                    self._store_cached(cache_key, response)
+            
+            # Process and format response
+            with trace.span("process"):
+                result = self._process_response(response, task_type, context, parser)
+                if error is not None:
+                    result["error"] = error
+            self._record_context_usage(result, assembled)
+            
+            # Update conversation history
+            self._update_history(user_input, result, session_id,
+                                 prompt if history is not None else "", code_hash)
+            
+            self.tracer.finish(trace, result)
+            return result
+        finally:
+            self.tracer.deactivate(activation)
+
+    async def stream_request(self, task_type: TaskType, context: CodeContext,
+                             user_input: str, session_id: Optional[str] = None
+                             ) -> AsyncIterator[Dict[str, Any]]:
+        """Streaming variant of process_request.
+
+        Yields {"event": "token", "data": str} as tokens arrive, and
+        {"event": "code_block" | "issue" | "fix", "data": element} as soon as
+        each structured element of the response is complete (see
+        ResponseParser), then a single {"event": "result", "data": result}
+        post-processed exactly as process_request would.
+        """
+        trace = self.tracer.start(task_type.value)
+        activation = self.tracer.activate(trace)
+        try:
+            with trace.span("context"):
+                assembled = self._assemble_context(task_type, context)
+            with trace.span("retrieve"):
+                await self._retrieve(task_type, context, user_input, assembled)
+            with trace.span("prompt"):
+                prompt = self._build_prompt(task_type, context, user_input, assembled)
+                history, prompt, code_hash = await self._conversation_turn(
+                    task_type, context, user_input, prompt, session_id, assembled)
+
+            with trace.span("cache"):
+                cache_key = self._cache_key(task_type, prompt, history)
+                response = self.response_cache.get(cache_key) if cache_key else None
+
+            parser = ResponseParser(task_type.value)
+            error = None
+            if response is not None:
+                yield {"event": "token", "data": response}
+                for element in parser.feed(response):
+                    yield {"event": element["type"], "data": element}
+            else:
+                chunks = []
+                with trace.span("model"):
+                    async for token, elements in self._stream_parsed(task_type, prompt,
+                                                                     history, parser):
+                        chunks.append(token)
+                        yield {"event": "token", "data": token}
+                        for element in elements:
+                            yield {"event": element["type"], "data": element}
+                response = ''.join(chunks)
+                error = _stream_error(chunks)
+                if error is None:
+                    fallback = _fallback_model(chunks[0] if chunks else None)
+                    if fallback is not None:
+                        cache_key = self._cache_key(task_type, prompt, history, model=fallback)
+                    self._store_cached(cache_key, response)
+            for element in parser.close():
+                yield {"event": element["type"], "data": element}
+
+            with trace.span("process"):
+                result = self._process_response(response, task_type, context, parser)
+                if error is not None:
+                    result["error"] = error
+            self._record_context_usage(result, assembled)
+            self._update_history(user_input, result, session_id,
+                                 prompt if history is not None else "", code_hash)
+            self.tracer.finish(trace, result)
+        finally:
+            self.tracer.deactivate(activation)
+
+        yield {"event": "result", "data": result}
+
+    async def _stream_parsed(self, task_type: TaskType, prompt: str,
+                             history: Optional[List[Dict[str, str]]],
+                             parser: ResponseParser) -> AsyncIterator[Tuple[str, List[Dict[str, Any]]]]:
+        """Model tokens, each with the elements it completed.
+
+        A completion only needs its first code block, so its stream is
+        closed as soon as that block ends; closing it closes the HTTP
+        request and Ollama stops generating.
+        """
+        stream = self.model_client.stream_response(prompt, **self._model_kwargs(task_type, history))
+        try:
+            async for token in stream:
+                # The error message ending a failed stream is shown, not parsed
+                yield token, [] if isinstance(token, StreamError) else parser.feed(token)
+                if task_type == TaskType.CODE_COMPLETION and parser.code_blocks:
+                    break
+        finally:
+            await stream.aclose()
+
+    def model_for(self, task_type: TaskType) -> str:
+        """The model that will serve this task type"""
+        return self.task_models.get(task_type.value) or self.model_client.model
+
+    def fim_template(self, task_type: TaskType) -> Optional[Tuple[str, List[str]]]:
+        """(prompt template, stop tokens) if this task is served as fill-in-the-middle"""
+        if task_type != TaskType.CODE_COMPLETION or not self.fim:
+            return None
+        # "deepseek-coder:6.7b-base", "library/codellama:7b-code" -> the family
+        family = self.model_for(task_type).split(':')[0].rsplit('/', 1)[-1].lower()
+        for name, template in FIM_TEMPLATES.items():
+            if family.startswith(name):
+                return template
+        return None
+
+    def _options(self, task_type: TaskType) -> Dict[str, Any]:
+        """Ollama sampling options for the task: defaults, then task_options"""
+        options = {"temperature": self.temperature, "num_predict": self.max_tokens}
+        options.update(self.task_options.get(task_type.value) or {})
+        return options
+
+    def _model_kwargs(self, task_type: TaskType,
+                      history: Optional[List[Dict[str, str]]] = None) -> Dict[str, Any]:
+        """Per-task model override from models.routing, options, and chat history if any"""
+        kwargs: Dict[str, Any] = {"options": self._options(task_type)}
+        model = self.task_models.get(task_type.value)
+        if model:
+            kwargs["model"] = model
+        if history is not None:
+            kwargs["history"] = history
+        else:
+            fim = self.fim_template(task_type)
+            if fim is not None:
+                kwargs["raw"] = True
+                kwargs["options"]["stop"] = list(kwargs["options"].get("stop") or ()) + fim[1]
+        return kwargs
+
+    def _cache_key(self, task_type: TaskType, prompt: str,
+                   history: Optional[List[Dict[str, str]]] = None,
+                   model: Optional[str] = None) -> Optional[str]:
+        """Cache key for this request, or None if it should bypass the cache.
+        model is the one that answered, when not the one the task routes to."""
+        if self.response_cache is None:
+            return None
+        kwargs = self._model_kwargs(task_type, history)
+        options = kwargs["options"]
+        if not self.response_cache.is_cacheable(task_type.value, options["temperature"]):
+            return None
+        model = model or self.model_for(task_type)
+        if history is not None:
+            prompt = json.dumps(history) + prompt
+        return self.response_cache.make_key(model, prompt, options, kwargs.get("raw", False))
+
+    def _store_cached(self, cache_key: Optional[str], response: str):
+        """Cache a response unless it is empty; callers skip failed responses"""
+        if cache_key and response:
+            self.response_cache.put(cache_key, response)
+
+    async def _conversation_turn(self, task_type: TaskType, context: CodeContext,
+                                 user_input: str, prompt: str, session_id: Optional[str],
+                                 assembled: Optional[AssembledContext] = None
+                                 ) -> Tuple[Optional[List[Dict[str, str]]], str, str]:
+        """Chat history, user message and the hash of the code it carries, for this turn.
+
+        Requests without a session_id (and completions, which are too frequent
+        and short-lived to be conversation turns) stay single prompts. A
+        follow-up whose exact code window and selection is already in the
+        conversation refers back to it instead of sending it again; the hash
+        is "" when the message carries no code.
+        """
+        if (session_id is None or not self.conversation.enabled
+                or task_type == TaskType.CODE_COMPLETION):
+            return None, prompt, ""
+        history = await self.conversation.history(session_id)
+        if not context.content:
+            return history, prompt, ""
+        code_hash = self._sent_code_hash(context, assembled)
+        if self.conversation.has_code(session_id, context.file_path, code_hash):
+            return history, self._build_followup_prompt(task_type, context, user_input,
+                                                        assembled), ""
+        return history, prompt, code_hash
+
+    def _sent_code_hash(self, context: CodeContext,
+                        assembled: Optional[AssembledContext] = None) -> str:
+        """Identity of the code a prompt shows: the window with its imports and
+        signatures, and the selection"""
+        if assembled is None:
+            code = context.content
+        else:
+            code = '\n'.join([f"{assembled.start_line}-{assembled.end_line}", assembled.code,
+                              *assembled.imports, *assembled.signatures])
+        return content_hash(f"{code}\0{context.selected_text or ''}")
+
+    def _assemble_context(self, task_type: TaskType, context: CodeContext) -> AssembledContext:
+        """Pick the code to send for this request within its token budget"""
+        return self.context_assembler.assemble(
+            task_type.value, context.file_path, context.content, context.language,
+            context.cursor_position, context.selected_text
+        )
+
+    async def _retrieve(self, task_type: TaskType, context: CodeContext, user_input: str,
+                        assembled: AssembledContext):
+        """Add semantically similar project code for questions that need it.
+
+        General questions (no file) always search; file tasks only when
+        listed in retrieval_tasks, since "review this code"
+        says nothing worth searching for.
+        """
+        if not user_input or (context.content and task_type.value not in self.retrieval_tasks):
+            return
+        index = self.semantic_index
+        if index is None:
+            return
+        query = f"{user_input}\n{context.selected_text}" if context.selected_text else user_input
+        assembled.retrieved = await index.retrieve(query, exclude_file=context.file_path or None)
+        assembled.tokens += sum(self.context_assembler.estimate_tokens(code)
+                                for _, code in assembled.retrieved)
+
+    async def preload(self) -> bool:
+        """Load the completion model ahead of the first request; False if it could not be"""
+        try:
+            await self.model_client.preload(self.model_for(TaskType.CODE_COMPLETION))
+        except httpx.HTTPError:
+            return False
+        return True
+
+    def close(self):
+        """Flush the trace log and semantic index and stop background indexing"""
+        self.tracer.close()
+        if self._semantic_index is not None:
+            self._semantic_index.close()
+
+    def _record_context_usage(self, result: Dict[str, Any], assembled: AssembledContext):
+        if assembled.retrieved:
+            result["retrieved"] = [label for label, _ in assembled.retrieved]
+        result["context_tokens"] = assembled.tokens
+        result["context_budget"] = assembled.budget
+        result["context_truncated"] = assembled.truncated
+
+    def _build_prompt(self, task_type: TaskType, context: CodeContext, 
+                     user_input: str, assembled: Optional[AssembledContext] = None) -> str:
+        """Build context-aware prompts for different task types"""
+        if assembled is None:
+            assembled = self._assemble_context(task_type, context)
+        fim = self.fim_template(task_type)
+        if fim is not None:
+            return self._build_fim_prompt(fim[0], context, assembled)
+        
+        base_context = f"""
+File: {context.file_path}
+Language: {context.language}
+{assembled.render(context.language)}
+"""
+        if context.selected_text:
+            base_context += f"\nSelected text: {context.selected_text}"
     
-    return result
-
-def _extract_code_completion(self, response: str) -> str:
-    """Extract code completion from response"""
-    # Simple extraction - can be enhanced with regex
-    lines = response.split('\n')
-    code_lines = []
-    in_code_block = False
+        instructions = self._task_instructions(task_type, context)
+        if instructions is None:
+            return f"{base_context}\n{user_input}"
+        return f"\n{base_context}\n{instructions}\nUser request: {user_input}\n"
+
+    def _build_fim_prompt(self, template: str, context: CodeContext,
+                          assembled: AssembledContext) -> str:
+        """Code before and after the cursor in the model's fill-in-the-middle format.
+
+        The assembled window is split at the cursor. Imports cut off above the
+        window and definitions of symbols used near the cursor go first, as
+        code and comments, so the prefix still reads as one source file.
+        """
+        lines = self.context_assembler.parser.line_index(context.content, context.file_path)
+        window_start = lines.line_start(assembled.start_line)
+        window_end = window_start + len(assembled.code)
+        cursor = min(max(context.cursor_position, window_start), window_end)
+        header = []
+        if assembled.start_line > 0:
+            header.extend(assembled.imports)
+        comment = LINE_COMMENTS.get(context.language, "//")
+        header.extend(f"{comment} {where}: {signature}" for where, signature in assembled.definitions)
+        prefix = context.content[window_start:cursor]
+        if header:
+            prefix = '\n'.join(header) + '\n' + prefix
+        return template.format(prefix=prefix, suffix=context.content[cursor:window_end])
+
+    def _build_followup_prompt(self, task_type: TaskType, context: CodeContext,
+                               user_input: str, assembled: Optional[AssembledContext] = None) -> str:
+        """Prompt for a turn about code already shown earlier in the conversation"""
+        followup = f"\nFile: {context.file_path} (unchanged, shown above)\n"
+        if assembled is not None:
+            followup += ''.join(f"{part}\n" for part in assembled.render_retrieved())
+        if context.selected_text:
+            followup += f"Selected text: {context.selected_text}\n"
+        instructions = self._task_instructions(task_type, context) or ""
+        return f"{followup}{instructions}\nUser request: {user_input}\n"
+
+    def _task_instructions(self, task_type: TaskType, context: CodeContext) -> Optional[str]:
+        instructions = TASK_INSTRUCTIONS.get(task_type)
+        if task_type == TaskType.CODE_COMPLETION:
+            instructions = f"Cursor position: {context.cursor_position}\n{instructions}"
+        return instructions
+
+    def _process_response(self, response: str, task_type: TaskType, 
+                         context: CodeContext,
+                         parser: Optional[ResponseParser] = None) -> Dict[str, Any]:
+        """Process AI response based on task type.
+
+        parser is the closed parser that read the response as it streamed;
+        without one (cached or non-streamed responses) it is parsed here.
+        """
+        if parser is None:
+            parser = ResponseParser.parse(task_type.value, response)
     
-    for line in lines:
-        if line.strip().startswith('```'):
-            in_code_block = not in_code_block
-            continue
-        if in_code_block:
-            code_lines.append(line)
+        result = {
+            "task_type": task_type.value,
+            "response": response,
+            "context": ContextRef.from_context(context),
+            "timestamp": asyncio.get_event_loop().time()
+        }
+        if parser.code_blocks:
+            result["code_blocks"] = _without_type(parser.code_blocks)
     
-    return '\n'.join(code_lines) if code_lines else response
-
-def _extract_code_issues(self, response: str) -> List[Dict[str, str]]:
-    """Extract code issues from review response"""
-    # Enhanced parsing can be added here
-    return [{"issue": response, "severity": "info"}]
-
-def _extract_debug_fixes(self, response: str) -> List[Dict[str, str]]:
-    """Extract debugging fixes from response"""
-    return [{"fix": response, "confidence": "medium"}]
-
-def _update_history(self, user_input: str, result: Dict[str, Any]):
-    """Update conversation history"""
-    self.conversation_history.append({
-        "user_input": user_input,
-        "assistant_response": result,
-        "timestamp": result["timestamp"]
-    })
+        # Add task-specific processing; unstructured replies are passed through whole
+        if task_type == TaskType.CODE_COMPLETION:
+            result["completion"] = parser.code_blocks[0]["code"] if parser.code_blocks else response
+        elif task_type == TaskType.CODE_REVIEW:
+            result["issues"] = (_without_type(parser.issues)
+                                or [{"issue": response, "severity": "info", "line": None}])
+        elif task_type == TaskType.DEBUGGING:
+            result["fixes"] = (_without_type(parser.fixes)
+                               or [{"fix": response, "code": "", "language": "",
+                                    "confidence": "medium"}])
     
-    # Keep only last 10 interactions
-    if len(self.conversation_history) > 10:
-        self.conversation_history = self.conversation_history[-10:]
\ No newline at end of file
+        return result
+
+    def _update_history(self, user_input: str, result: Dict[str, Any],
+                        session_id: Optional[str] = None, prompt: str = "",
+                        code_hash: str = ""):
+        """Record the exchange in the session's bounded history.
+
+        prompt is the user message of a conversation turn. Failed turns
+        (result["error"]) are not recorded: a truncated or error reply must
+        not be replayed to the model or summarized.
+        """
+        if "error" in result:
+            return
+        ref = result["context"]
+        entry = HistoryEntry(
+            user_input=user_input,
+            task_type=result["task_type"],
+            response=result["response"],
+            file_path=ref.file_path,
+            content_hash=ref.content_hash,
+            timestamp=result["timestamp"],
+            prompt=prompt,
+            code_hash=code_hash
+        )
+        if prompt:
+            self.conversation.record(session_id, entry)
+        else:
+            self.sessions.get(session_id).append(entry)
@@ -0,0 +1,195 @@
+import asyncio
+import fnmatch
+import json
+import os
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set
+from assistant import AICodeAssistant, TaskType, CodeContext, serialize_result
+from ollama_client import measure_usage
+from request_queue import AdmissionQueue, Overloaded
+
+@dataclass
+class BatchReport:
+    total: int
+    succeeded: int = 0
+    failed: int = 0
+    skipped: int = 0
+    resumed: int = 0
+    elapsed: float = 0.0
+    prompt_tokens: int = 0
+    # Generated tokens and generation time as Ollama reports them (eval_count, eval_duration)
+    response_tokens: int = 0
+    eval_seconds: float = 0.0
+
+    @property
+    def files_per_sec(self) -> float:
+        return (self.succeeded + self.failed) / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def tokens_per_sec(self) -> float:
+        return self.response_tokens / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def eval_tokens_per_sec(self) -> float:
+        """Generation speed of the model itself, without queueing or prompt processing"""
+        return self.response_tokens / self.eval_seconds if self.eval_seconds else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        report = asdict(self)
+        report["files_per_sec"] = round(self.files_per_sec, 3)
+        report["tokens_per_sec"] = round(self.tokens_per_sec, 3)
+        report["eval_tokens_per_sec"] = round(self.eval_tokens_per_sec, 3)
+        return report
+
+class BatchRunner:
+    """Fan process_request out over many files with a bounded worker pool.
+
+    Each finished file is appended to a JSONL checkpoint as soon as it
+    completes; re-running with the same checkpoint skips files that already
+    succeeded, so an interrupted run resumes where it stopped. With an
+    admission queue every file waits in its batch lane, behind interactive
+    requests for the same model.
+    """
+
+    def __init__(self, assistant: AICodeAssistant, concurrency: int = 4,
+                 checkpoint_path: Optional[str] = None,
+                 progress: Optional[Callable[[int, int, str, str], None]] = None,
+                 admission: Optional[AdmissionQueue] = None):
+        self.assistant = assistant
+        self.admission = admission
+        self.context_manager = assistant.context_manager
+        self.concurrency = max(1, concurrency)
+        self.checkpoint_path = Path(checkpoint_path) if checkpoint_path else None
+        self.progress = progress
+
+    def collect_files(self, target: str) -> List[str]:
+        """Files under a directory, or matching a glob, from the project structure"""
+        root = self.context_manager.project_root
+        structure = self.context_manager.get_project_structure()
+        all_files = [os.path.normpath(os.path.join(rel_dir, name))
+                     for rel_dir, names in structure.items() for name in names]
+
+        target_path = Path(target)
+        if any(ch in target for ch in '*?['):
+            pattern = os.path.normpath(os.path.relpath(target, root)) \
+                if target_path.is_absolute() else os.path.normpath(target)
+            selected = [f for f in all_files if fnmatch.fnmatch(f, pattern)]
+        else:
+            rel_target = os.path.normpath(os.path.relpath(target_path.resolve(), Path(root).resolve()))
+            if rel_target == '.':
+                selected = all_files
+            elif Path(root, rel_target).is_file():
+                selected = [rel_target]
+            else:
+                selected = [f for f in all_files if f.startswith(rel_target + os.sep)]
+
+        return [str(Path(root) / f) for f in sorted(selected)]
+
+    def _completed(self, task_type: TaskType) -> Set[str]:
+        """Files already finished successfully according to the checkpoint"""
+        done: Set[str] = set()
+        if self.checkpoint_path is None or not self.checkpoint_path.exists():
+            return done
+        with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn write from an interrupted run
+                if record.get("status") == "ok" and record.get("task_type") == task_type.value:
+                    done.add(record.get("file_path"))
+        return done
+
+    async def run(self, task_type: TaskType, files: List[str],
+                  user_input: str) -> BatchReport:
+        completed = self._completed(task_type)
+        pending = [f for f in files if f not in completed]
+        report = BatchReport(total=len(files), resumed=len(files) - len(pending))
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for file_path in pending:
+            queue.put_nowait(file_path)
+
+        checkpoint = None
+        if self.checkpoint_path is not None:
+            self.checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+            checkpoint = open(self.checkpoint_path, 'a', encoding='utf-8')
+
+        started = time.perf_counter()
+        done_count = report.resumed
+
+        async def worker():
+            nonlocal done_count
+            while True:
+                try:
+                    file_path = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                record = await self._process_file(task_type, file_path, user_input, report)
+                if checkpoint is not None:
+                    checkpoint.write(json.dumps(record) + '\n')
+                    checkpoint.flush()
+                done_count += 1
+                if self.progress:
+                    self.progress(done_count, report.total, file_path, record["status"])
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(pending)))))
+        finally:
+            report.elapsed = time.perf_counter() - started
+            if checkpoint is not None:
+                checkpoint.close()
+        return report
+
+    async def _process_file(self, task_type: TaskType, file_path: str,
+                            user_input: str, report: BatchReport) -> Dict[str, Any]:
+        record = {"file_path": file_path, "task_type": task_type.value}
+        content = self.context_manager.read_file(file_path)
+        if content is None:
+            report.skipped += 1
+            record["status"] = "skipped"
+            return record
+
+        context = CodeContext(
+            file_path=file_path,
+            content=content,
+            language=self.context_manager._detect_language(file_path),
+            cursor_position=0
+        )
+        started = time.perf_counter()
+        try:
+            with measure_usage() as usage:
+                result = await self._process(task_type, context, user_input)
+        except Exception as e:
+            report.failed += 1
+            record.update(status="error", error=str(e))
+            return record
+        finally:
+            # Tokens generated before a failure were still generated
+            report.response_tokens += usage.eval_count
+            report.eval_seconds += usage.eval_duration / 1e9
+
+        if "error" in result:
+            report.failed += 1
+            record.update(status="error", error=result["error"])
+            return record
+
+        report.succeeded += 1
+        report.prompt_tokens += result.get("context_tokens", 0)
+        record.update(serialize_result(result))
+        record.update(status="ok", elapsed=round(time.perf_counter() - started, 3))
+        return record
+
+    async def _process(self, task_type: TaskType, context: CodeContext,
+                       user_input: str) -> Dict[str, Any]:
+        if self.admission is None:
+            return await self.assistant.process_request(task_type, context, user_input)
+        model = self.assistant.model_for(task_type)
+        while True:
+            try:
+                async with self.admission.slot(model, "batch"):
+                    return await self.assistant.process_request(task_type, context, user_input)
+            except Overloaded as e:
+                await asyncio.sleep(e.retry_after)
@@ -1,9 +1,18 @@
 import re
-from typing import Dict, List, Optional, Tuple
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
 from pathlib import Path
+from line_index import LineIndex
+from syntax_tree import SyntaxTree, SyntaxTreeCache, load_language
 
 class CodeParser:
-    def __init__(self):
+    def __init__(self, use_tree_sitter: bool = True, max_trees: int = 64):
+        self.use_tree_sitter = use_tree_sitter
+        self.trees = SyntaxTreeCache(max_trees)
+        # Keyed by file path (patched as the file is edited) or, without one, by
+        # the text itself: str hashes are cached, so repeat lookups are O(1)
+        self._line_indexes: "OrderedDict[str, LineIndex]" = OrderedDict()
+        self.max_line_indexes = 8
         self.language_extensions = {
             '.py': 'python',
             '.js': 'javascript',
@@ -25,8 +34,46 @@ class CodeParser:
         ext = Path(file_path).suffix.lower()
         return self.language_extensions.get(ext, 'text')
     
-    def parse_functions(self, code: str, language: str) -> List[Dict[str, Any]]:
+    def get_tree(self, code: str, language: str,
+                 file_path: Optional[str] = None) -> Optional[SyntaxTree]:
+        """Syntax tree for code, or None if no grammar is available.
+
+        With a file_path the tree is cached and re-parsed incrementally
+        as the file's content changes.
+        """
+        if not self.use_tree_sitter or load_language(language) is None:
+            return None
+        source = code.encode('utf-8')
+        if file_path:
+            return self.trees.get(file_path, source, language)
+        return SyntaxTree(language, source)
+
+    def _with_char_offsets(self, tree: SyntaxTree, code: str,
+                           entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Add 'start'/'end' character offsets (of the signature) to tree entries"""
+        to_char = {}
+        if len(tree.source) != len(code):
+            # One pass over the source: decode only the bytes between consecutive entries
+            byte_offset = char_offset = 0
+            for offset in sorted({entry['start_byte'] for entry in entries}):
+                char_offset += len(tree.source[byte_offset:offset].decode('utf-8', errors='ignore'))
+                byte_offset = offset
+                to_char[offset] = char_offset
+        results = []
+        for entry in entries:
+            entry = dict(entry)
+            entry['start'] = to_char.get(entry['start_byte'], entry['start_byte'])
+            entry['end'] = entry['start'] + len(entry['signature'])
+            results.append(entry)
+        return results
+
+    def parse_functions(self, code: str, language: str,
+                        file_path: Optional[str] = None) -> List[Dict[str, Any]]:
         """Parse functions from code"""
+        tree = self.get_tree(code, language, file_path)
+        if tree is not None:
+            return self._with_char_offsets(tree, code, tree.outline()['functions'])
+
         functions = []
         
         patterns = {
@@ -53,35 +100,75 @@ class CodeParser:
         
         return functions
     
+    def line_index(self, code: str, file_path: Optional[str] = None) -> LineIndex:
+        """Line-start index for code, reused while the same text is queried.
+
+        With a file_path the file's index is patched in place as its content
+        changes, so a keystroke doesn't re-scan the whole file.
+        """
+        key = file_path or code
+        index = self._line_indexes.get(key)
+        if index is None:
+            index = LineIndex(code)
+            self._line_indexes[key] = index
+            while len(self._line_indexes) > self.max_line_indexes:
+                self._line_indexes.popitem(last=False)
+        else:
+            self._line_indexes.move_to_end(key)
+            if file_path:
+                index.update(code)
+        return index
+    
     def find_context_around_cursor(self, code: str, cursor_position: int, 
-                                 context_lines: int = 10) -> Tuple[str, int, int]:
-        """Find context around cursor position"""
-        lines = code.split('\n')
-        
-        # Find line number of cursor
-        char_count = 0
-        cursor_line = 0
-        
-        for i, line in enumerate(lines):
-            if char_count + len(line) >= cursor_position:
-                cursor_line = i
-                break
-            char_count += len(line) + 1  # +1 for newline
-        
-        # Get context lines
-        start_line = max(0, cursor_line - context_lines)
-        end_line = min(len(lines), cursor_line + context_lines + 1)
-        
-        context_code = '\n'.join(lines[start_line:end_line])
-        
-        return context_code, start_line, end_line
+                                 context_lines: int = 10,
+                                 file_path: Optional[str] = None) -> Tuple[str, int, int]:
+        """Find context around cursor position.
+
+        Returns (context_code, start_line, end_line) with end_line exclusive.
+        A cursor on a newline belongs to the line that newline ends; one past
+        the end of the text belongs to the last line.
+        """
+        return self.line_index(code, file_path).context_around(cursor_position, context_lines)
     
-    def extract_imports(self, code: str, language: str) -> List[str]:
+    def parse_classes(self, code: str, language: str,
+                      file_path: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Parse classes (and structs, interfaces, impls) from code"""
+        tree = self.get_tree(code, language, file_path)
+        if tree is not None:
+            return self._with_char_offsets(tree, code, tree.outline()['classes'])
+
+        classes = []
+        if language in ('python', 'javascript', 'typescript', 'java', 'cpp', 'php', 'ruby'):
+            for match in re.finditer(r'^\s*(?:export\s+)?(?:public\s+)?class\s+(\w+)', code, re.MULTILINE):
+                classes.append({
+                    'name': match.group(1),
+                    'start': match.start(),
+                    'end': match.end(),
+                    'signature': match.group(0).strip(),
+                    'kind': 'class'
+                })
+        return classes
+
+    def scopes_at(self, code: str, language: str, cursor_position: int,
+                  file_path: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Classes and functions enclosing the cursor, outermost first"""
+        tree = self.get_tree(code, language, file_path)
+        if tree is None:
+            return []
+        byte_offset = len(code[:cursor_position].encode('utf-8'))
+        return self._with_char_offsets(tree, code, tree.scopes_at(byte_offset))
+
+    def extract_imports(self, code: str, language: str,
+                        file_path: Optional[str] = None) -> List[str]:
         """Extract import statements"""
+        tree = self.get_tree(code, language, file_path)
+        if tree is not None:
+            return [entry['signature'] for entry in tree.outline()['imports']]
+
         imports = []
         
         patterns = {
-            'python': r'(import\s+\w+|from\s+\w+\s+import\s+.*)',
+            'python': r'^\s*(import\s+[\w.]+(?:\s*,\s*[\w.]+)*|from\s+[\w.]+\s+import\s+.*)',
             'javascript': r'(import\s+.*\s+from\s+[\'"].*[\'"]|const\s+.*\s+=\s+require\([\'"].*[\'"]\))',
             'java': r'import\s+[\w.]+;',
             'cpp': r'#include\s*[<"][^>"]*[>"]',
@@ -0,0 +1,124 @@
+import asyncio
+from typing import Any, Dict, Optional, Tuple
+from assistant import AICodeAssistant, TaskType, CodeContext
+
+class RequestSuperseded(Exception):
+    """A newer completion request for the same session and file replaced this one"""
+
+class _Pending:
+    def __init__(self, task: asyncio.Task, prefix: str, suffix: str):
+        self.task = task
+        self.prefix = prefix
+        self.suffix = suffix
+
+class CompletionScheduler:
+    """Keystroke-driven completion with supersession.
+
+    Only the newest request per (session, file) is allowed to run: a new
+    one cancels the older generation, which closes its HTTP request to
+    Ollama. If the new text before the cursor merely extends the old one
+    (the user typed ahead) the running generation is reused and its
+    completion trimmed by what was typed. An optional debounce delays the
+    start so bursts of keystrokes collapse into one request.
+    """
+
+    def __init__(self, assistant: AICodeAssistant, debounce: float = 0.0,
+                 reuse_prefix: bool = True):
+        self.assistant = assistant
+        self.debounce = debounce
+        self.reuse_prefix = reuse_prefix
+        self._pending: Dict[Tuple[str, str], _Pending] = {}
+        self._latest: Dict[Tuple[str, str], object] = {}
+        self.stats = {"requests": 0, "started": 0, "superseded": 0,
+                      "cancelled": 0, "reused": 0}
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], assistant: AICodeAssistant) -> "CompletionScheduler":
+        completion = config.get("completion") or {}
+        return cls(assistant,
+                   debounce=completion.get("debounce_ms", 0) / 1000.0,
+                   reuse_prefix=completion.get("reuse_prefix", True))
+
+    async def complete(self, session_id: str, context: CodeContext,
+                       user_input: str = "Complete this code") -> Dict[str, Any]:
+        """Run a completion, raising RequestSuperseded if a newer one replaces it"""
+        key = (session_id, context.file_path)
+        prefix = context.content[:context.cursor_position]
+        suffix = context.content[context.cursor_position:]
+        self.stats["requests"] += 1
+
+        ticket = object()
+        self._latest[key] = ticket
+        try:
+            return await self._run(key, ticket, context, user_input, prefix, suffix)
+        finally:
+            # Whichever way this request ends, it no longer needs its ticket;
+            # a newer request's ticket is left for that request to drop
+            if self._latest.get(key) is ticket:
+                del self._latest[key]
+
+    async def _run(self, key: Tuple[str, str], ticket: object, context: CodeContext,
+                   user_input: str, prefix: str, suffix: str) -> Dict[str, Any]:
+        previous = self._pending.get(key)
+        if previous is not None and not previous.task.done():
+            if (self.reuse_prefix and suffix == previous.suffix
+                    and prefix.startswith(previous.prefix)):
+                result = await self._reuse(previous, prefix[len(previous.prefix):])
+                if result is not None:
+                    return result
+                if self._latest.get(key) is not ticket:
+                    raise RequestSuperseded()
+            else:
+                previous.task.cancel()
+                self.stats["cancelled"] += 1
+
+        if self.debounce:
+            await asyncio.sleep(self.debounce)
+        if self._latest.get(key) is not ticket:
+            self.stats["superseded"] += 1
+            raise RequestSuperseded()
+
+        task = asyncio.ensure_future(self.assistant.process_request(
+            TaskType.CODE_COMPLETION, context, user_input))
+        pending = _Pending(task, prefix, suffix)
+        self._pending[key] = pending
+        self.stats["started"] += 1
+
+        try:
+            return await task
+        except asyncio.CancelledError:
+            # Superseded only if a newer request cancelled the task and nobody cancelled us
+            if (task.cancelled() and self._latest.get(key) is not ticket
+                    and not asyncio.current_task().cancelling()):
+                self.stats["superseded"] += 1
+                raise RequestSuperseded()
+            task.cancel()  # our caller went away: stop generating
+            raise
+        finally:
+            if self._pending.get(key) is pending:
+                del self._pending[key]
+
+    async def _reuse(self, previous: _Pending, typed: str) -> Optional[Dict[str, Any]]:
+        """Wait for a still-running generation; None if it failed or no longer fits"""
+        try:
+            result = await asyncio.shield(previous.task)
+        except asyncio.CancelledError:
+            if previous.task.cancelled():
+                return None
+            raise
+
+        if result.get("error"):
+            return None
+        completion = result.get("completion", result["response"])
+        if not completion.startswith(typed):
+            return None
+        self.stats["reused"] += 1
+        return dict(result, completion=completion[len(typed):], reused=True)
+
+    def cancel_session(self, session_id: str):
+        """Cancel every in-flight completion for a session (e.g. editor closed)"""
+        for key, pending in list(self._pending.items()):
+            if key[0] == session_id and not pending.task.done():
+                pending.task.cancel()
+                self.stats["cancelled"] += 1
+            self._latest.pop(key, None)
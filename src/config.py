@@ -0,0 +1,20 @@
+import os
+import yaml
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+DEFAULT_CONFIG_PATH = Path(__file__).resolve().parent.parent / "config" / "config.yaml"
+
+def load_config(config_path: Optional[str] = None) -> Dict[str, Any]:
+    """Load YAML configuration, falling back to an empty config if missing"""
+    path = Path(config_path or os.environ.get("AI_ASSISTANT_CONFIG", DEFAULT_CONFIG_PATH))
+
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f) or {}
+    except FileNotFoundError:
+        return {}
+
+def get_section(config: Dict[str, Any], name: str) -> Dict[str, Any]:
+    """Return a config section as a dict, even if it is absent"""
+    return config.get(name) or {}
@@ -0,0 +1,260 @@
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+from code_parser import CodeParser
+from line_index import LineIndex
+from symbol_index import KEYWORDS
+
+IDENTIFIER = re.compile(r'[A-Za-z_][A-Za-z0-9_]*')
+
+DEFAULT_BUDGETS = {
+    "code_completion": 1024,
+    "code_review": 3072,
+    "debugging": 3072,
+    "explanation": 2048,
+    "refactoring": 3072,
+    "documentation": 2048,
+}
+
+@dataclass
+class AssembledContext:
+    code: str
+    start_line: int
+    end_line: int
+    total_lines: int
+    imports: List[str] = field(default_factory=list)
+    signatures: List[str] = field(default_factory=list)
+    definitions: List[Tuple[str, str]] = field(default_factory=list)
+    related: List[Tuple[str, str]] = field(default_factory=list)
+    retrieved: List[Tuple[str, str]] = field(default_factory=list)
+    tokens: int = 0
+    budget: int = 0
+
+    @property
+    def truncated(self) -> bool:
+        return self.start_line > 0 or self.end_line < self.total_lines
+
+    def render(self, language: str) -> str:
+        """Format the sections for inclusion in a prompt"""
+        if self.truncated:
+            header = f"Current code (lines {self.start_line + 1}-{self.end_line} of {self.total_lines}):"
+        else:
+            header = "Current code:"
+        parts = [f"{header}\n```{language}\n{self.code}\n```"]
+
+        if self.imports:
+            parts.append(f"Imports:\n```{language}\n" + '\n'.join(self.imports) + "\n```")
+        if self.signatures:
+            parts.append(f"Definitions elsewhere in this file:\n```{language}\n"
+                         + '\n'.join(self.signatures) + "\n```")
+        if self.definitions:
+            parts.append("Definitions of symbols used near the cursor:\n```\n"
+                         + '\n'.join(f"{where}: {signature}" for where, signature in self.definitions)
+                         + "\n```")
+        for path, snippet in self.related:
+            parts.append(f"Related file {path}:\n```\n{snippet}\n```")
+        parts.extend(self.render_retrieved())
+        return '\n'.join(parts)
+
+    def render_retrieved(self) -> List[str]:
+        return [f"Relevant code from {label}:\n```\n{snippet}\n```"
+                for label, snippet in self.retrieved]
+
+class ContextAssembler:
+    """Select what code goes into a prompt, within a per-task token budget.
+
+    Small files are sent whole. Larger ones are reduced to a window around
+    the cursor plus the file's imports and definition signatures. For
+    completions, definitions of symbols used just before the cursor are
+    looked up in the project's symbol index; signatures from related files
+    fill whatever budget is left. The symbol index and import graph are only
+    consulted once built (see ContextManager.symbol_index_ready), so a
+    request never waits for the project to be parsed.
+    """
+
+    def __init__(self, context_manager=None, parser: Optional[CodeParser] = None,
+                 budgets: Optional[Dict[str, int]] = None, context_lines: int = 20,
+                 chars_per_token: float = 4.0, max_related_files: int = 3,
+                 definition_lines: int = 10, max_definitions: int = 8):
+        self.context_manager = context_manager
+        self.parser = parser or CodeParser()
+        self.budgets = dict(DEFAULT_BUDGETS, **(budgets or {}))
+        self.context_lines = context_lines
+        self.chars_per_token = chars_per_token
+        self.max_related_files = max_related_files
+        self.definition_lines = definition_lines
+        self.max_definitions = max_definitions
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], context_manager=None) -> "ContextAssembler":
+        processing = config.get("code_processing") or {}
+        return cls(
+            context_manager,
+            budgets=config.get("context_budget") or {},
+            context_lines=processing.get("context_lines", 20),
+            chars_per_token=processing.get("chars_per_token", 4.0),
+            definition_lines=processing.get("definition_lines", 10),
+            max_definitions=processing.get("max_definitions", 8)
+        )
+
+    def estimate_tokens(self, text: str) -> int:
+        """Rough token count; good enough for budgeting without a tokenizer"""
+        return math.ceil(len(text) / self.chars_per_token) if text else 0
+
+    def assemble(self, task_type: str, file_path: str, content: str, language: str,
+                 cursor_position: int, selected_text: Optional[str] = None) -> AssembledContext:
+        budget = self.budgets.get(task_type, max(self.budgets.values()))
+        lines = self.parser.line_index(content, file_path)
+
+        # Everything fits: send the file as-is
+        if self.estimate_tokens(content) <= budget:
+            assembled = AssembledContext(content, 0, len(lines), len(lines), budget=budget)
+            assembled.tokens = self.estimate_tokens(content)
+            if task_type == "code_completion":
+                self._add_definitions(assembled, file_path, content, lines, cursor_position)
+            self._add_related(assembled, file_path, budget)
+            return assembled
+
+        # Reserve room for imports and signatures, give the rest to the code window
+        imports = self.parser.extract_imports(content, language, file_path)
+        functions = self.parser.parse_functions(content, language, file_path)
+        window_budget = int(budget * 0.6)
+
+        if selected_text and self.estimate_tokens(selected_text) <= window_budget:
+            anchor = content.find(selected_text)
+            cursor_position = anchor if anchor >= 0 else cursor_position
+        cursor_line = lines.line_of(cursor_position)
+        start, end = self._window(lines, cursor_line, window_budget)
+        code = lines.slice_lines(start, end)
+
+        assembled = AssembledContext(code, start, end, len(lines), budget=budget)
+        assembled.tokens = self.estimate_tokens(code)
+
+        window_start = lines.line_start(start)
+        window_end = window_start + len(code)
+        for statement in imports:
+            if not self._fits(assembled, statement):
+                break
+            assembled.imports.append(statement)
+            assembled.tokens += self.estimate_tokens(statement)
+
+        # Nearest preceding definitions first: most likely to enclose the cursor
+        outside = [f for f in functions if not window_start <= f['start'] < window_end]
+        outside.sort(key=lambda f: (f['start'] > cursor_position, abs(cursor_position - f['start'])))
+        for function in outside:
+            signature = function['signature'].strip()
+            if not self._fits(assembled, signature):
+                break
+            assembled.signatures.append(signature)
+            assembled.tokens += self.estimate_tokens(signature)
+
+        if task_type == "code_completion":
+            self._add_definitions(assembled, file_path, content, lines, cursor_position)
+        self._add_related(assembled, file_path, budget)
+        return assembled
+
+    def _fits(self, assembled: AssembledContext, text: str) -> bool:
+        return assembled.tokens + self.estimate_tokens(text) <= assembled.budget
+
+    def _line_tokens(self, lines: LineIndex, line: int) -> int:
+        return math.ceil(lines.line_length(line) / self.chars_per_token) + 1
+
+    def _window(self, lines: LineIndex, cursor_line: int, budget: int) -> Tuple[int, int]:
+        """Grow a line window around the cursor until the budget is spent"""
+        start = end = min(cursor_line, len(lines) - 1)
+        end += 1
+        used = self._line_tokens(lines, start)
+        # Completion needs what precedes the cursor more than what follows
+        while start > 0 or end < len(lines):
+            grew = False
+            for _ in range(2):
+                if start > 0:
+                    cost = self._line_tokens(lines, start - 1)
+                    if used + cost > budget:
+                        return start, end
+                    start -= 1
+                    used += cost
+                    grew = True
+            if end < len(lines):
+                cost = self._line_tokens(lines, end)
+                if used + cost > budget:
+                    return start, end
+                end += 1
+                used += cost
+                grew = True
+            if not grew:
+                break
+        return start, end
+
+    def _add_definitions(self, assembled: AssembledContext, file_path: str, content: str,
+                         lines: LineIndex, cursor_position: int):
+        """Add signatures of project symbols referenced just before the cursor"""
+        if (self.context_manager is None or not file_path or not self.max_definitions
+                or not self.context_manager.symbol_index_ready()):
+            return
+        current = self.context_manager.index.relative(file_path)
+        cursor_position = min(cursor_position, len(content))
+        start_line = max(0, lines.line_of(cursor_position) - self.definition_lines)
+        text = content[lines.line_start(start_line):cursor_position]
+
+        # Closest to the cursor first; name -> whether it was used as an attribute
+        names = {}
+        for match in reversed(list(IDENTIFIER.finditer(text))):
+            name = match.group(0)
+            if len(name) > 1 and name not in KEYWORDS:
+                attribute = match.start() > 0 and text[match.start() - 1] == '.'
+                names[name] = names.get(name, False) or attribute
+
+        found_by_name = self.context_manager.find_definitions_many(list(names))
+        added = 0
+        for name, attribute in names.items():
+            found = found_by_name[name]
+            if any(d['path'] == current for d in found):
+                continue  # defined in this file and covered above
+            if not attribute:
+                # A bare name is a local, a global or a class, never a method
+                found = [d for d in found if not d['scope']]
+            if not found:
+                continue
+            for definition in found[:2]:
+                where = f"{definition['path']}:{definition['line'] + 1}"
+                entry = f"{where}: {definition['signature']}"
+                if not self._fits(assembled, entry):
+                    return
+                assembled.definitions.append((where, definition['signature']))
+                assembled.tokens += self.estimate_tokens(entry)
+            added += 1
+            if added >= self.max_definitions:
+                return
+
+    def _add_related(self, assembled: AssembledContext, file_path: str, budget: int):
+        """Fill leftover budget with definition signatures from related files"""
+        if self.context_manager is None or not file_path:
+            return
+        symbols = self.context_manager.symbol_index if self.context_manager.symbol_index_ready() else None
+        for related_path in self.context_manager.get_related_files(file_path)[:self.max_related_files]:
+            if assembled.tokens >= budget:
+                break
+            definitions = None
+            rel_path = self.context_manager.index.relative(related_path)
+            if symbols is not None and rel_path is not None:
+                # Outlines recorded by the symbol index; only a file edited since is re-parsed
+                definitions = symbols.stored_definitions(rel_path)
+            if definitions is not None:
+                signatures = [d[5] for d in definitions]
+            else:
+                related_content = self.context_manager.read_file(related_path)
+                if not related_content:
+                    continue
+                language = self.parser.detect_language(related_path)
+                signatures = [f['signature'].strip()
+                              for f in self.parser.parse_functions(related_content, language)]
+            snippet_lines = []
+            for signature in signatures:
+                if not self._fits(assembled, signature):
+                    break
+                snippet_lines.append(signature)
+                assembled.tokens += self.estimate_tokens(signature)
+            if snippet_lines:
+                assembled.related.append((related_path, '\n'.join(snippet_lines)))
@@ -1,64 +1,233 @@
 import os
-from typing import Dict, List, Optional
+import threading
+from typing import Any, Callable, Dict, List, Optional
 from pathlib import Path
+from file_cache import FileCache
+from project_index import ProjectIndex, is_code_file
+from import_graph import ImportGraph
+from symbol_index import SymbolIndex
+from project_scanner import ProjectScanner
 
 class ContextManager:
-    def __init__(self, project_root: str = None):
+    def __init__(self, project_root: str = None, max_file_size: int = 1024 * 1024,
+                 cache_max_bytes: int = 64 * 1024 * 1024,
+                 mmap_threshold: int = 256 * 1024,
+                 index_path: Optional[str] = None,
+                 index_refresh_interval: float = 2.0,
+                 index_restat_interval: float = 30.0,
+                 scan_workers: int = 0, scan_chunk_size: int = 256,
+                 background_builds: bool = True):
         self.project_root = Path(project_root) if project_root else Path.cwd()
-        self.file_cache = {}
+        self.index_path = index_path
+        self.index_refresh_interval = index_refresh_interval
+        self.index_restat_interval = index_restat_interval
+        self.max_file_size = max_file_size
+        self.scan_workers = scan_workers
+        self.scan_chunk_size = scan_chunk_size
+        self._index: Optional[ProjectIndex] = None
+        self._import_graph: Optional[ImportGraph] = None
+        self._symbol_index: Optional[SymbolIndex] = None
+        self._scanner: Optional[ProjectScanner] = None
+        # Long-lived processes build the indexes off the request path; one-shot runs don't
+        self.background_builds = background_builds
+        self._build_thread: Optional[threading.Thread] = None
+        self._build_lock = threading.Lock()
+        self._builds_running = 0
+        self.file_cache = FileCache(max_bytes=cache_max_bytes,
+                                    max_file_size=max_file_size,
+                                    mmap_threshold=mmap_threshold)
         self.context_history = []
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], project_root: str = None) -> "ContextManager":
+        """Build a context manager using the `code_processing:` settings"""
+        processing = config.get("code_processing") or {}
+        index = config.get("index") or {}
+        root = Path(project_root) if project_root else Path.cwd()
+        index_path = None
+        if index.get("persist", True):
+            index_path = Path(index.get("path", ".ai-assistant/index.json"))
+            if not index_path.is_absolute():
+                index_path = root / index_path
+        return cls(
+            project_root,
+            max_file_size=processing.get("max_file_size", 1024 * 1024),
+            cache_max_bytes=processing.get("file_cache_max_bytes", 64 * 1024 * 1024),
+            mmap_threshold=processing.get("mmap_threshold", 256 * 1024),
+            index_path=str(index_path) if index_path else None,
+            index_refresh_interval=index.get("refresh_interval", 2.0),
+            index_restat_interval=index.get("restat_interval", 30.0),
+            scan_workers=index.get("workers", 0),
+            scan_chunk_size=index.get("chunk_size", 256)
+        )
+
+    @property
+    def index(self) -> ProjectIndex:
+        """Project file index, rebuilt if project_root has been changed"""
+        if self._index is None or self._index.project_root != self.project_root.resolve():
+            self._index = ProjectIndex(self.project_root, self.index_path,
+                                       refresh_interval=self.index_refresh_interval,
+                                       restat_interval=self.index_restat_interval)
+        return self._index
+
+    @property
+    def import_graph(self) -> ImportGraph:
+        """Import graph over the indexed files, stored beside the index"""
+        index = self.index
+        if self._import_graph is None or self._import_graph.index is not index:
+            graph_path = None
+            if self.index_path:
+                graph_path = str(Path(self.index_path).with_name("imports.json"))
+            self._import_graph = ImportGraph(index, graph_path=graph_path,
+                                             max_file_size=self.max_file_size)
+        return self._import_graph
+
+    @property
+    def symbol_index(self) -> SymbolIndex:
+        """Identifier and definition index over the indexed files, stored beside the index"""
+        index = self.index
+        if self._symbol_index is None or self._symbol_index.index is not index:
+            symbols_path = None
+            if self.index_path:
+                symbols_path = str(Path(self.index_path).with_name("symbols.json"))
+            self._symbol_index = SymbolIndex(index, symbols_path=symbols_path,
+                                             max_file_size=self.max_file_size)
+        return self._symbol_index
+
+    @property
+    def scanner(self) -> ProjectScanner:
+        """Process-pool scanner feeding the import graph and symbol index"""
+        graph, symbols = self.import_graph, self.symbol_index
+        if (self._scanner is None or self._scanner.import_graph is not graph
+                or self._scanner.symbol_index is not symbols):
+            self._scanner = ProjectScanner(self.index, graph, symbols,
+                                           workers=self.scan_workers,
+                                           chunk_size=self.scan_chunk_size,
+                                           max_file_size=self.max_file_size)
+        return self._scanner
+
+    def build_indexes(self, progress: Optional[Callable[[int, int], None]] = None) -> int:
+        """Parse new and changed files into the import graph and symbol index,
+        in parallel when there are many; returns the number of files parsed.
+
+        Safe to call from a worker thread; prompt assembly leaves the indexes
+        alone until it returns (see indexes_building).
+        """
+        with self._build_lock:
+            self._builds_running += 1
+        try:
+            return self.scanner.scan(progress)
+        finally:
+            with self._build_lock:
+                self._builds_running -= 1
+
+    def build_indexes_in_background(self) -> bool:
+        """Run build_indexes on a background thread unless one is running; True if started"""
+        with self._build_lock:
+            if self.indexes_building:
+                return False
+            self._build_thread = threading.Thread(target=self.build_indexes,
+                                                  name="index-build", daemon=True)
+            self._build_thread.start()
+            return True
+
+    @property
+    def indexes_building(self) -> bool:
+        return self._builds_running > 0 or (self._build_thread is not None
+                                            and self._build_thread.is_alive())
+
+    def import_graph_ready(self) -> bool:
+        """Whether the import graph can be queried without a full build"""
+        return self._index_ready(lambda: self.import_graph)
+
+    def symbol_index_ready(self) -> bool:
+        """Whether the symbol index can be queried without a full build"""
+        return self._index_ready(lambda: self.symbol_index)
+
+    def _index_ready(self, get_index: Callable[[], Any]) -> bool:
+        # Prompt assembly uses the indexes only when this holds, so a request
+        # never waits for the project to be parsed
+        if self.indexes_building:
+            return False
+        if not self.background_builds:
+            # One-shot: use what an earlier run built, syncing only the files edited since
+            index = get_index()
+            return index._synced_generation >= 0 or index.stats["loaded_from_disk"]
+        self.index.refresh()
+        # In-place edits bump the generation once the periodic re-stat sees them
+        self.index.restat_in_background()
+        if self.scanner.is_current():
+            return True
+        self.build_indexes_in_background()
+        return False
+
+    def find_definitions(self, symbol: str) -> List[Dict[str, Any]]:
+        """Definitions of a symbol, each with project-relative path, line and byte range.
+
+        Files changed since the last sync are re-parsed in process; call
+        build_indexes() first when the index may be cold.
+        """
+        return self.symbol_index.definitions(symbol)
+
+    def find_definitions_many(self, symbols: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """find_definitions for several symbols with a single index sync"""
+        return self.symbol_index.definitions_many(symbols)
+
+    def find_references(self, symbol: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """Whole-identifier occurrences of a symbol across the project"""
+        return self.symbol_index.references(symbol, limit=limit)
+
+    def notify_file_changed(self, file_path: str):
+        """Update the index, import graph and symbols for one edited, added or removed file"""
+        self.file_cache.invalidate(file_path)
+        rel_path = self.index.relative(file_path)
+        if rel_path is not None:
+            self.index.update_file(file_path)
+            self.import_graph.update_file(rel_path)
+            self.symbol_index.update_file(rel_path)
         
     def get_project_structure(self) -> Dict[str, List[str]]:
         """Get project file structure"""
-        structure = {}
-        
-        for root, dirs, files in os.walk(self.project_root):
-            # Skip hidden directories and common build directories
-            dirs[:] = [d for d in dirs if not d.startswith('.') and d not in ['node_modules', '__pycache__', 'build', 'dist']]
-            
-            rel_root = os.path.relpath(root, self.project_root)
-            structure[rel_root] = []
-            
-            for file in files:
-                if not file.startswith('.') and self._is_code_file(file):
-                    structure[rel_root].append(file)
-        
-        return structure
+        return self.index.structure()
     
     def get_related_files(self, current_file: str) -> List[str]:
         """Find files related to current file"""
         related = []
+        index = self.index
+        rel_path = index.relative(current_file)
         current_path = Path(current_file)
         
-        # Same directory files
-        if current_path.parent.exists():
-            for file in current_path.parent.iterdir():
-                if file.is_file() and self._is_code_file(file.name) and file != current_path:
-                    related.append(str(file))
+        if rel_path is None:
+            # Outside the project: fall back to listing the file's own directory
+            if current_path.parent.exists():
+                for file in current_path.parent.iterdir():
+                    if file.is_file() and self._is_code_file(file.name) and file != current_path:
+                        related.append(str(file))
+            return related[:10]
+        
+        # Import-graph neighbours first (once the graph is built), then same
+        # directory files and similar names
+        candidates = self.import_graph.related(rel_path, limit=10) if self.import_graph_ready() else []
+        candidates += index.files_in_dir(os.path.dirname(rel_path) or '.')
+        candidates += index.files_with_stem_containing(current_path.stem)
         
-        # Files with similar names
-        base_name = current_path.stem
-        for root, dirs, files in os.walk(self.project_root):
-            for file in files:
-                if base_name in file and file != current_path.name:
-                    related.append(os.path.join(root, file))
+        seen = {rel_path}
+        for candidate in candidates:
+            if candidate not in seen:
+                seen.add(candidate)
+                related.append(str(index.project_root / candidate))
+                if len(related) >= 10:  # Limit to 10 related files
+                    break
         
-        return related[:10]  # Limit to 10 related files
+        return related
     
     def read_file(self, file_path: str) -> Optional[str]:
-        """Read file content with caching"""
-        abs_path = os.path.abspath(file_path)
-        
-        if abs_path in self.file_cache:
-            return self.file_cache[abs_path]
-        
-        try:
-            with open(abs_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                self.file_cache[abs_path] = content
-                return content
-        except (IOError, UnicodeDecodeError):
-            return None
+        """Read file content with caching, revalidated against the file's stat"""
+        return self.file_cache.read(file_path)
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """File cache hit/miss counters and memory usage"""
+        return self.file_cache.get_stats()
     
     def get_file_context(self, file_path: str) -> Dict[str, any]:
         """Get comprehensive context for a file"""
@@ -76,13 +245,7 @@ class ContextManager:
     
     def _is_code_file(self, filename: str) -> bool:
         """Check if file is a code file"""
-        code_extensions = {
-            '.py', '.js', '.ts', '.java', '.cpp', '.c', '.h', '.hpp',
-            '.go', '.rs', '.rb', '.php', '.cs', '.swift', '.kt', '.scala',
-            '.html', '.css', '.scss', '.less', '.xml', '.json', '.yaml', '.yml'
-        }
-        
-        return Path(filename).suffix.lower() in code_extensions
+        return is_code_file(filename)
     
     def _detect_language(self, file_path: str) -> str:
         """Detect programming language"""
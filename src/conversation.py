@@ -0,0 +1,137 @@
+import asyncio
+import math
+from typing import Any, Dict, List, Optional
+from ollama_client import ErrorText
+from sessions import HistoryEntry, SessionHistory, SessionStore
+
+SYSTEM_PROMPT = ("You are an AI coding assistant helping a developer with their code. "
+                 "Later messages may refer to code shown earlier in the conversation.")
+
+SUMMARY_PROMPT = """Update the running summary of a conversation between a developer and a coding assistant.
+Keep files discussed, findings, decisions and open questions; leave out code listings.
+Reply with the updated summary only, in at most {words} words.
+
+Current summary:
+{summary}
+
+New exchanges:
+{exchanges}
+"""
+
+# Per-exchange cap on assistant text sent for summarization
+SUMMARY_RESPONSE_CHARS = 2000
+
+class ConversationManager:
+    """Multi-turn chat messages for sessions, with incremental summarization.
+
+    Each turn is sent as [system, summary?, earlier turns verbatim, new
+    turn], so consecutive requests share a byte-identical prefix and Ollama
+    only evaluates the new turn's tokens. Once the kept turns exceed
+    token_budget the oldest are folded into the summary by a background
+    model call; that changes the prefix once, after which it is stable
+    again. Only the folded turns and the previous summary are sent for
+    summarization, never the whole history.
+    """
+
+    def __init__(self, model_client, sessions: SessionStore, enabled: bool = True,
+                 token_budget: int = 4096, keep_recent: int = 2,
+                 summary_max_tokens: int = 256, chars_per_token: float = 4.0):
+        self.model_client = model_client
+        self.sessions = sessions
+        self.enabled = enabled
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+        self.summary_max_tokens = summary_max_tokens
+        self.chars_per_token = chars_per_token
+        self.stats = {"turns": 0, "followups_without_code": 0, "summaries": 0,
+                      "summary_failures": 0, "folded_turns": 0}
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], model_client,
+                    sessions: SessionStore) -> "ConversationManager":
+        settings = config.get("sessions") or {}
+        processing = config.get("code_processing") or {}
+        return cls(
+            model_client, sessions,
+            enabled=settings.get("conversation", True),
+            token_budget=settings.get("history_token_budget", 4096),
+            keep_recent=settings.get("keep_recent_turns", 2),
+            summary_max_tokens=settings.get("summary_max_tokens", 256),
+            chars_per_token=processing.get("chars_per_token", 4.0)
+        )
+
+    def estimate_tokens(self, text: str) -> int:
+        return math.ceil(len(text) / self.chars_per_token) if text else 0
+
+    async def history(self, session_id: str) -> List[Dict[str, str]]:
+        """Messages preceding the next user turn of a session"""
+        history = self.sessions.get(session_id)
+        if history.summarizing is not None:
+            # Build on the updated summary rather than on turns being folded away
+            await asyncio.gather(asyncio.shield(history.summarizing), return_exceptions=True)
+
+        messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+        if history.summary:
+            messages.append({"role": "system",
+                             "content": f"Summary of the earlier conversation:\n{history.summary}"})
+        for entry in history:
+            if entry.prompt:
+                messages.append({"role": "user", "content": entry.prompt})
+                messages.append({"role": "assistant", "content": entry.response})
+        self.stats["turns"] += 1
+        return messages
+
+    def has_code(self, session_id: str, file_path: str, code_hash: str) -> bool:
+        """Whether this exact code window and selection is in the session's kept turns"""
+        history = self.sessions.peek(session_id)
+        if history is None or not file_path:
+            return False
+        shown = any(entry.code_hash == code_hash and entry.file_path == file_path
+                    for entry in history)
+        if shown:
+            self.stats["followups_without_code"] += 1
+        return shown
+
+    def record(self, session_id: str, entry: HistoryEntry):
+        """Append a turn, folding old turns into the summary when over budget"""
+        history = self.sessions.get(session_id)
+        fold = [e for e in history.append(entry) if e.prompt]
+        tokens = sum(self.estimate_tokens(e.prompt) + self.estimate_tokens(e.response)
+                     for e in history)
+        while len(history) > self.keep_recent and tokens > self.token_budget:
+            oldest = history.popleft()
+            tokens -= self.estimate_tokens(oldest.prompt) + self.estimate_tokens(oldest.response)
+            fold.append(oldest)
+        if fold:
+            task = asyncio.ensure_future(self._fold(history, fold, history.summarizing))
+            history.summarizing = task
+            task.add_done_callback(lambda _: self._folded(history, task))
+
+    @staticmethod
+    def _folded(history: SessionHistory, task: asyncio.Future):
+        if history.summarizing is task:
+            history.summarizing = None
+
+    async def _fold(self, history: SessionHistory, entries: List[HistoryEntry],
+                    previous: Optional[asyncio.Future]):
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        exchanges = '\n'.join(
+            f"[{e.task_type}] {e.file_path or '(no file)'}\n"
+            f"Developer: {e.user_input}\n"
+            f"Assistant: {e.response[:SUMMARY_RESPONSE_CHARS]}\n"
+            for e in entries)
+        prompt = SUMMARY_PROMPT.format(words=int(self.summary_max_tokens * 0.75),
+                                       summary=history.summary or "(none yet)",
+                                       exchanges=exchanges)
+        summary = await self.model_client.generate_response(
+            prompt, temperature=0.2, max_tokens=self.summary_max_tokens)
+        self.stats["folded_turns"] += len(entries)
+        if summary and not isinstance(summary, ErrorText):
+            history.summary = summary.strip()
+            self.stats["summaries"] += 1
+        else:
+            self.stats["summary_failures"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(self.stats)
@@ -0,0 +1,182 @@
+import asyncio
+import contextvars
+import json
+import os
+import sys
+from typing import Any, Dict, Optional, TextIO
+from daemon_client import connect, socket_path
+
+# Where print() output of the command running in the current task should go
+_sink: contextvars.ContextVar[Optional["_SocketSink"]] = contextvars.ContextVar("sink", default=None)
+
+class _SocketSink:
+    """File-like target that forwards writes to a client as {"out": ...} lines"""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+
+    def write(self, text: str) -> int:
+        if text and not self.writer.is_closing():
+            self.writer.write(json.dumps({"out": text}).encode() + b"\n")
+        return len(text)
+
+class _StdoutRouter:
+    """sys.stdout replacement sending each task's output to its own client.
+
+    CLI handlers just print(); the router looks up the client connection of
+    the task doing the printing, so concurrent commands don't interleave.
+    """
+
+    def __init__(self, default: TextIO):
+        self.default = default
+
+    def write(self, text: str) -> int:
+        sink = _sink.get()
+        return (sink or self.default).write(text)
+
+    def flush(self):
+        if _sink.get() is None:
+            self.default.flush()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.default, name)
+
+class AssistantDaemon:
+    """Keeps one warm CLIInterface per project behind a Unix domain socket.
+
+    The context manager's file cache and project index, parsed syntax trees,
+    response cache and pooled model connections all survive between CLI
+    invocations, which then only pay for a socket round trip.
+    """
+
+    def __init__(self, cli, path: Optional[str] = None):
+        self.cli = cli
+        self.path = path or socket_path(str(cli.context_manager.project_root))
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._stopped: Optional[asyncio.Event] = None
+        self._preload: Optional[asyncio.Future] = None
+        self.stats = {"commands": 0, "failed": 0, "cancelled": 0}
+
+    async def serve(self):
+        if self.is_running(self.path):
+            raise RuntimeError(f"A daemon is already listening on {self.path}")
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # stale socket
+
+        # Build the assistant, project index, import graph and symbols before taking requests
+        assistant = self.cli.assistant
+        await self.cli.build_indexes(out=sys.stderr)
+        if assistant.semantic_index is not None:
+            assistant.semantic_index.start_build()  # embeds in the background
+        # The first completion should not wait for Ollama to load the model
+        self._preload = asyncio.ensure_future(assistant.preload())
+
+        self._stopped = asyncio.Event()
+        # Owner-only from the moment it is bound, not just after the chmod
+        umask = os.umask(0o177)
+        try:
+            self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+        finally:
+            os.umask(umask)
+        os.chmod(self.path, 0o600)
+        stdout = sys.stdout
+        sys.stdout = _StdoutRouter(stdout)
+        print(f"Assistant daemon listening on {self.path}", file=sys.stderr)
+        try:
+            await self._stopped.wait()
+        finally:
+            sys.stdout = stdout
+            self._server.close()
+            await self._server.wait_closed()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            await self.cli.aclose()
+
+    def stop(self):
+        if self._stopped is not None:
+            self._stopped.set()
+
+    @staticmethod
+    def is_running(path: str) -> bool:
+        sock = connect(path, timeout=0.5)
+        if sock is None:
+            return False
+        sock.close()
+        return True
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            message = json.loads(await reader.readline() or b"{}")
+        except ValueError:
+            message = {}
+        op = message.get("op")
+
+        try:
+            if op == "run":
+                code = await self._run(message.get("command", ""), reader, writer)
+                self._reply(writer, {"exit": code})
+            elif op == "status":
+                self._reply(writer, {"out": json.dumps(self.get_stats(), indent=2) + "\n"})
+                self._reply(writer, {"exit": 0})
+            elif op == "stop":
+                self._reply(writer, {"out": "Daemon stopping\n"})
+                self._reply(writer, {"exit": 0})
+                self.stop()
+            else:
+                self._reply(writer, {"out": f"Unknown request: {op}\n"})
+                self._reply(writer, {"exit": 2})
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _reply(writer: asyncio.StreamWriter, message: Dict[str, Any]):
+        if not writer.is_closing():
+            writer.write(json.dumps(message).encode() + b"\n")
+
+    async def _run(self, command_line: str, reader: asyncio.StreamReader,
+                   writer: asyncio.StreamWriter) -> int:
+        """Run one command with its output sent to this client.
+
+        If the client disconnects (e.g. a hook is interrupted) the command is
+        cancelled, which also closes its request to Ollama.
+        """
+        self.stats["commands"] += 1
+        token = _sink.set(_SocketSink(writer))
+        try:
+            command = asyncio.ensure_future(self.cli.run_command(command_line))
+        finally:
+            _sink.reset(token)
+        hangup = asyncio.ensure_future(reader.read())
+
+        await asyncio.wait({command, hangup}, return_when=asyncio.FIRST_COMPLETED)
+        if not command.done():
+            command.cancel()
+            self.stats["cancelled"] += 1
+            await asyncio.gather(command, return_exceptions=True)
+            return 130
+        hangup.cancel()
+
+        error = command.exception()
+        if error is not None:
+            self.stats["failed"] += 1
+            self._reply(writer, {"out": f"Error: {error}\n"})
+            return 1
+        return 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["pid"] = os.getpid()
+        stats["project_root"] = str(self.cli.context_manager.project_root)
+        stats["file_cache"] = self.cli.context_manager.get_cache_stats()
+        stats["symbol_index"] = self.cli.context_manager.symbol_index.get_stats()
+        stats["scanner"] = self.cli.context_manager.scanner.get_stats()
+        assistant = self.cli._assistant
+        if assistant is not None and assistant.response_cache is not None:
+            stats["response_cache"] = assistant.response_cache.get_stats()
+        if assistant is not None and assistant.semantic_index is not None:
+            stats["semantic_index"] = assistant.semantic_index.get_stats()
+        return stats
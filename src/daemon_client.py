@@ -0,0 +1,57 @@
+import hashlib
+import json
+import os
+import socket
+import sys
+from typing import Optional, TextIO
+
+# Thin client for the assistant daemon. Standard library only, so a CLI
+# invocation that finds a daemon running never imports asyncio, httpx or
+# the assistant itself.
+
+# Unix socket paths are limited to ~108 bytes
+MAX_SOCKET_PATH = 100
+
+def socket_path(project_root: str) -> str:
+    """Where the daemon for a project listens: beside its index and cache"""
+    root = os.path.abspath(project_root)
+    path = os.path.join(root, ".ai-assistant", "daemon.sock")
+    if len(path.encode()) > MAX_SOCKET_PATH:
+        digest = hashlib.sha1(root.encode()).hexdigest()[:12]
+        path = os.path.join(os.environ.get("TMPDIR", "/tmp"), f"ai-assistant-{digest}.sock")
+    return path
+
+def connect(path: str, timeout: float) -> Optional[socket.socket]:
+    if not os.path.exists(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()  # stale socket left by a daemon that died
+        return None
+    sock.settimeout(None)
+    return sock
+
+def request(project_root: str, message: dict, out: TextIO = sys.stdout,
+            connect_timeout: float = 0.5) -> Optional[int]:
+    """Send one request and relay its output; None if no daemon is listening"""
+    sock = connect(socket_path(project_root), connect_timeout)
+    if sock is None:
+        return None
+    with sock:
+        sock.sendall(json.dumps(message).encode() + b"\n")
+        for line in sock.makefile("r", encoding="utf-8"):
+            reply = json.loads(line)
+            if "out" in reply:
+                out.write(reply["out"])
+                out.flush()
+            elif "exit" in reply:
+                return reply["exit"]
+    print("Error: daemon closed the connection", file=sys.stderr)
+    return 1
+
+def run_command(project_root: str, command: str, out: TextIO = sys.stdout) -> Optional[int]:
+    """Run a CLI command line (e.g. "review /abs/path.py") in the project's daemon"""
+    return request(project_root, {"op": "run", "command": command}, out)
@@ -0,0 +1,125 @@
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# (st_mtime_ns, st_size, st_ino) - changes whenever the file is rewritten
+StatKey = Tuple[int, int, int]
+
+class FileCache:
+    """Byte-bounded LRU cache of decoded file contents.
+
+    Every lookup re-stats the file and reloads it if its mtime, size or inode
+    changed, so edits are picked up without explicit invalidation.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024,
+                 max_file_size: int = 1024 * 1024,
+                 mmap_threshold: int = 256 * 1024):
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self.mmap_threshold = mmap_threshold
+        self._entries: "OrderedDict[str, Tuple[StatKey, str, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "stale": 0,
+                      "evictions": 0, "too_large": 0, "errors": 0}
+
+    def __contains__(self, path: str) -> bool:
+        return os.path.abspath(path) in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def read(self, file_path: str) -> Optional[str]:
+        """Return the file's text, or None if unreadable or over max_file_size"""
+        abs_path = os.path.abspath(file_path)
+
+        try:
+            st = os.stat(abs_path)
+        except OSError:
+            self.invalidate(abs_path)
+            self.stats["errors"] += 1
+            return None
+
+        key = (st.st_mtime_ns, st.st_size, st.st_ino)
+
+        with self._lock:
+            entry = self._entries.get(abs_path)
+            if entry is not None:
+                if entry[0] == key:
+                    self._entries.move_to_end(abs_path)
+                    self.stats["hits"] += 1
+                    return entry[1]
+                self._remove(abs_path)
+                self.stats["stale"] += 1
+            self.stats["misses"] += 1
+
+        if self.max_file_size and st.st_size > self.max_file_size:
+            self.stats["too_large"] += 1
+            return None
+
+        try:
+            content = self._load(abs_path, st.st_size)
+        except (OSError, UnicodeDecodeError, ValueError):
+            self.stats["errors"] += 1
+            return None
+
+        with self._lock:
+            self._store(abs_path, key, content, st.st_size)
+        return content
+
+    def _load(self, abs_path: str, size: int) -> str:
+        """Read and decode a file, memory-mapping large ones"""
+        with open(abs_path, 'rb') as f:
+            if size >= self.mmap_threshold:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    content = str(mapped, 'utf-8')
+            else:
+                content = f.read().decode('utf-8')
+
+        # Match text-mode reads: universal newlines
+        if '\r' in content:
+            content = content.replace('\r\n', '\n').replace('\r', '\n')
+        return content
+
+    def _store(self, abs_path: str, key: StatKey, content: str, size: int):
+        if self.max_bytes and size > self.max_bytes:
+            return
+        if abs_path in self._entries:
+            self._remove(abs_path)
+        self._entries[abs_path] = (key, content, size)
+        self.total_bytes += size
+
+        while self.max_bytes and self.total_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats["evictions"] += 1
+
+    def _remove(self, abs_path: str):
+        _, _, size = self._entries.pop(abs_path)
+        self.total_bytes -= size
+
+    def invalidate(self, file_path: str):
+        """Forget a single file"""
+        abs_path = os.path.abspath(file_path)
+        with self._lock:
+            if abs_path in self._entries:
+                self._remove(abs_path)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Counters plus current occupancy, for sizing max_bytes"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+            stats["bytes"] = self.total_bytes
+            stats["max_bytes"] = self.max_bytes
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+            return stats
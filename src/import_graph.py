@@ -0,0 +1,260 @@
+import json
+import os
+import re
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+from code_parser import CodeParser
+from project_index import ProjectIndex
+
+GRAPH_VERSION = 1
+
+class ImportGraph:
+    """Project-wide file dependency graph built from CodeParser.extract_imports.
+
+    Each node remembers the (mtime_ns, size) it was parsed at; a node is
+    re-parsed only when that changes, so a single edit costs one parse.
+    """
+
+    def __init__(self, index: ProjectIndex, parser: Optional[CodeParser] = None,
+                 graph_path: Optional[str] = None, max_file_size: int = 1024 * 1024):
+        self.index = index
+        self.parser = parser or CodeParser()
+        self.graph_path = Path(graph_path) if graph_path else None
+        self.max_file_size = max_file_size
+        # rel_path -> (mtime_ns, size, imported rel_paths)
+        self.nodes: Dict[str, Tuple[int, int, List[str]]] = {}
+        self.importers: Dict[str, Set[str]] = {}
+        self._synced_generation = -1
+        self._lock = threading.RLock()
+        self.stats = {"parsed": 0, "loaded_from_disk": False}
+
+        if self.graph_path is not None:
+            self._load()
+
+    def ensure_built(self):
+        """Sync the graph with the index, parsing only new or changed files"""
+        with self._lock:
+            self.index.refresh()
+            if self._synced_generation == self.index.generation:
+                return
+            current = set()
+            for rel_path in self.index.all_files():
+                if self.parser.detect_language(rel_path) == 'text':
+                    continue
+                current.add(rel_path)
+                if self.is_stale(rel_path):
+                    self.update_file(rel_path)
+            for rel_path in set(self.nodes) - current:
+                self._remove(rel_path)
+            self._synced_generation = self.index.generation
+            self.save()
+
+    def is_stale(self, rel_path: str) -> bool:
+        """Whether the file is new or changed since it was parsed, per the index"""
+        info = self.index.file_info(rel_path)
+        node = self.nodes.get(rel_path)
+        return node is None or info is None or (node[0], node[1]) != info
+
+    def update_file(self, rel_path: str) -> bool:
+        """Re-parse one file if it changed on disk; returns True if it did"""
+        with self._lock:
+            try:
+                st = os.stat(self.index.project_root / rel_path)
+            except OSError:
+                if rel_path in self.nodes:
+                    self._remove(rel_path)
+                    return True
+                return False
+            node = self.nodes.get(rel_path)
+            if node is not None and (node[0], node[1]) == (st.st_mtime_ns, st.st_size):
+                return False
+            self._parse(rel_path, st)
+            return True
+
+    def _parse(self, rel_path: str, st: Optional[os.stat_result] = None):
+        abs_path = self.index.project_root / rel_path
+        try:
+            st = st or os.stat(abs_path)
+            if st.st_size > self.max_file_size:
+                code = ''
+            else:
+                with open(abs_path, 'r', encoding='utf-8', errors='replace') as f:
+                    code = f.read()
+        except OSError:
+            self._remove(rel_path)
+            return
+
+        language = self.parser.detect_language(rel_path)
+        self.set_imports(rel_path, st.st_mtime_ns, st.st_size,
+                         self.parser.extract_imports(code, language))
+
+    def set_imports(self, rel_path: str, mtime_ns: int, size: int, statements: List[str]):
+        """Record a file's import statements, parsed here or by ProjectScanner"""
+        with self._lock:
+            language = self.parser.detect_language(rel_path)
+            deps = []
+            for statement in statements:
+                for target in self._resolve(rel_path, statement, language):
+                    if target != rel_path and target not in deps:
+                        deps.append(target)
+
+            self._unlink(rel_path)
+            self.nodes[rel_path] = (mtime_ns, size, deps)
+            for dep in deps:
+                self.importers.setdefault(dep, set()).add(rel_path)
+            self.stats["parsed"] += 1
+
+    def _unlink(self, rel_path: str):
+        node = self.nodes.get(rel_path)
+        if node is not None:
+            for dep in node[2]:
+                importers = self.importers.get(dep)
+                if importers is not None:
+                    importers.discard(rel_path)
+
+    def _remove(self, rel_path: str):
+        self._unlink(rel_path)
+        self.nodes.pop(rel_path, None)
+
+    def _resolve(self, rel_path: str, statement: str, language: str) -> List[str]:
+        """Map one import statement to indexed project files"""
+        base_dir = os.path.dirname(rel_path)
+
+        if language == 'python':
+            return self._resolve_python(base_dir, statement)
+        if language in ('javascript', 'typescript'):
+            match = re.search(r'[\'"]([^\'"]+)[\'"]', statement)
+            if match and match.group(1).startswith('.'):
+                target = os.path.normpath(os.path.join(base_dir, match.group(1)))
+                return self._existing([target] + [target + ext for ext in ('.ts', '.js')]
+                                      + [os.path.join(target, 'index' + ext) for ext in ('.ts', '.js')])
+            return []
+        if language == 'java':
+            match = re.search(r'import\s+([\w.]+);', statement)
+            return self._by_suffix(match.group(1).replace('.', '/') + '.java') if match else []
+        if language in ('cpp', 'c'):
+            match = re.search(r'[<"]([^>"]+)[>"]', statement)
+            if not match:
+                return []
+            local = self._existing([os.path.normpath(os.path.join(base_dir, match.group(1)))])
+            return local or self._by_suffix(match.group(1))
+        if language == 'go':
+            targets = []
+            for package in re.findall(r'"([^"]+)"', statement):
+                targets.extend(self._go_package(package))
+            return targets
+        return []
+
+    def _resolve_python(self, base_dir: str, statement: str) -> List[str]:
+        modules = []
+        match = re.match(r'\s*from\s+([\w.]+)\s+import\s+(.*)', statement, re.DOTALL)
+        if match:
+            module, names = match.groups()
+            names = [n.split()[0] for n in re.sub(r'[()\\\s]+', ' ', names).split(',')
+                     if n.strip() and n.strip()[0].isalpha()]
+            if module.strip('.') == '':
+                modules = [module + name for name in names]
+            else:
+                modules = [module] + [f"{module}.{name}" for name in names]
+        else:
+            match = re.match(r'\s*import\s+(.*)', statement)
+            if match:
+                modules = [m.strip() for m in match.group(1).split(',') if m.strip()]
+
+        targets = []
+        for module in modules:
+            dots = len(module) - len(module.lstrip('.'))
+            parts = module.lstrip('.').split('.')
+            if dots:
+                anchor = base_dir
+                for _ in range(dots - 1):
+                    anchor = os.path.dirname(anchor)
+                target = os.path.join(anchor, *parts)
+                found = self._existing([target + '.py', os.path.join(target, '__init__.py')])
+            else:
+                found = self._by_suffix('/'.join(parts) + '.py') \
+                    or self._by_suffix('/'.join(parts) + '/__init__.py')
+            for path in found:
+                if path not in targets:
+                    targets.append(path)
+        return targets
+
+    def _existing(self, candidates: List[str]) -> List[str]:
+        """Candidates that are indexed files"""
+        for candidate in candidates:
+            candidate = os.path.normpath(candidate)
+            if self.index.file_info(candidate) is not None:
+                return [candidate]
+        return []
+
+    def _by_suffix(self, suffix: str) -> List[str]:
+        """Indexed files whose path ends with suffix (looked up via the stem)"""
+        stem = os.path.splitext(os.path.basename(suffix))[0]
+        suffix = os.path.normpath(suffix)
+        return [path for path in self.index.by_stem.get(stem, ())
+                if path == suffix or path.endswith(os.sep + suffix)]
+
+    def _go_package(self, package: str) -> List[str]:
+        suffix = os.path.normpath(package)
+        for rel_dir, entry in self.index.dirs.items():
+            if rel_dir == suffix or rel_dir.endswith(os.sep + suffix):
+                return [ProjectIndex._join(rel_dir, name) for name in entry["files"]
+                        if name.endswith('.go')]
+        return []
+
+    def neighbours(self, rel_path: str) -> Set[str]:
+        """Files this file imports plus files importing it"""
+        node = self.nodes.get(rel_path)
+        neighbours = set(node[2]) if node else set()
+        neighbours.update(self.importers.get(rel_path, ()))
+        return neighbours
+
+    def related(self, rel_path: str, limit: int = 10, max_depth: int = 3) -> List[str]:
+        """Rank files by graph distance, breaking ties by most recently modified"""
+        self.ensure_built()
+        with self._lock:
+            self.update_file(rel_path)
+            distances = {rel_path: 0}
+            queue = deque([rel_path])
+            while queue:
+                current = queue.popleft()
+                if distances[current] >= max_depth:
+                    continue
+                for neighbour in self.neighbours(current):
+                    if neighbour not in distances:
+                        self.update_file(neighbour)
+                        distances[neighbour] = distances[current] + 1
+                        queue.append(neighbour)
+
+            del distances[rel_path]
+            ranked = sorted(distances, key=lambda path: (
+                distances[path], -self.nodes.get(path, (0,))[0]))
+            return ranked[:limit]
+
+    def _load(self):
+        try:
+            with open(self.graph_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != GRAPH_VERSION or data.get("root") != str(self.index.project_root):
+            return
+        for rel_path, (mtime, size, deps) in data.get("nodes", {}).items():
+            self.nodes[rel_path] = (mtime, size, deps)
+            for dep in deps:
+                self.importers.setdefault(dep, set()).add(rel_path)
+        self.stats["loaded_from_disk"] = True
+
+    def save(self):
+        """Persist the graph next to the project index"""
+        if self.graph_path is None:
+            return
+        with self._lock:
+            self.graph_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.graph_path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"version": GRAPH_VERSION, "root": str(self.index.project_root),
+                           "nodes": self.nodes}, f, separators=(',', ':'))
+            os.replace(tmp_path, self.graph_path)
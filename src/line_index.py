@@ -0,0 +1,109 @@
+import re
+from bisect import bisect_right
+from typing import List, Tuple
+
+_NEWLINE = re.compile('\n')
+
+def common_prefix(a, b, limit: int, block: int = 4096) -> int:
+    """Length of the common prefix of two str or bytes, compared a block at a time"""
+    offset = 0
+    while offset + block <= limit and a[offset:offset + block] == b[offset:offset + block]:
+        offset += block
+    while offset < limit and a[offset] == b[offset]:
+        offset += 1
+    return offset
+
+def common_suffix(a, b, limit: int, block: int = 4096) -> int:
+    """Length of the common suffix (at most limit), compared backwards a block at a time"""
+    end_a, end_b = len(a), len(b)
+    offset = 0
+    while (offset + block <= limit
+           and a[end_a - offset - block:end_a - offset] == b[end_b - offset - block:end_b - offset]):
+        offset += block
+    while offset < limit and a[end_a - offset - 1] == b[end_b - offset - 1]:
+        offset += 1
+    return offset
+
+class LineIndex:
+    """Start offset of every line in a text, for bisect-based lookups.
+
+    An offset on a newline belongs to the line that newline ends; offsets
+    past the end of the text clamp to the last line.
+    """
+
+    __slots__ = ('text', 'starts')
+
+    def __init__(self, text: str):
+        self.text = text
+        self.starts: List[int] = [0]
+        self.starts.extend(match.end() for match in _NEWLINE.finditer(text))
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @property
+    def line_count(self) -> int:
+        return len(self.starts)
+
+    def line_of(self, offset: int) -> int:
+        """0-based line containing a character offset"""
+        if offset <= 0:
+            return 0
+        return bisect_right(self.starts, offset) - 1
+
+    def line_start(self, line: int) -> int:
+        return self.starts[line]
+
+    def line_end(self, line: int) -> int:
+        """Offset just past the line's last character (excluding its newline)"""
+        if line + 1 < len(self.starts):
+            return self.starts[line + 1] - 1
+        return len(self.text)
+
+    def line_length(self, line: int) -> int:
+        return self.line_end(line) - self.starts[line]
+
+    def line(self, line: int) -> str:
+        return self.text[self.starts[line]:self.line_end(line)]
+
+    def slice_lines(self, start_line: int, end_line: int) -> str:
+        """Text of lines [start_line, end_line), sliced from the original buffer"""
+        start_line = max(0, start_line)
+        end_line = min(len(self.starts), end_line)
+        if start_line >= end_line:
+            return ''
+        return self.text[self.starts[start_line]:self.line_end(end_line - 1)]
+
+    def context_around(self, offset: int, context_lines: int) -> Tuple[str, int, int]:
+        """(text, start_line, end_line) for context_lines either side of offset"""
+        cursor_line = self.line_of(offset)
+        start_line = max(0, cursor_line - context_lines)
+        end_line = min(len(self.starts), cursor_line + context_lines + 1)
+        return self.slice_lines(start_line, end_line), start_line, end_line
+
+    def update(self, new_text: str) -> bool:
+        """Bring the index up to date with new text; False if it is unchanged.
+
+        Like SyntaxTree.update, the changed span is found by trimming the
+        common prefix and suffix, so a keystroke only re-scans what it touched.
+        """
+        old_text = self.text
+        if new_text == old_text:
+            return False
+        limit = min(len(old_text), len(new_text))
+        prefix = common_prefix(old_text, new_text, limit)
+        suffix = common_suffix(old_text, new_text, limit - prefix)
+        self._splice(prefix, len(old_text) - suffix, new_text[prefix:len(new_text) - suffix])
+        self.text = new_text
+        return True
+
+    def _splice(self, start: int, old_end: int, new_text: str):
+        """Patch the line starts for text[start:old_end] being replaced by new_text"""
+        delta = len(new_text) - (old_end - start)
+        first = bisect_right(self.starts, start)
+        last = bisect_right(self.starts, old_end)
+        inserted = [start + match.end() for match in _NEWLINE.finditer(new_text)]
+        tail = self.starts[last:]
+        if delta:
+            tail = [offset + delta for offset in tail]
+        self.starts[first:] = inserted + tail
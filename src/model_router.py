@@ -0,0 +1,276 @@
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+import httpx
+from ollama_client import ErrorText, FallbackText, OllamaClient, StreamError
+
+class Backend:
+    """One Ollama endpoint and what the router knows about it"""
+
+    def __init__(self, client: OllamaClient):
+        self.client = client
+        self.outstanding = 0
+        self.healthy = True
+        self.models: Optional[Set[str]] = None  # None until the first health check
+        self.failures = 0
+        self.last_checked = 0.0
+        self.down_since: Optional[float] = None
+
+    @property
+    def base_url(self) -> str:
+        return self.client.base_url
+
+    def serves(self, model: str) -> bool:
+        return self.models is None or model in self.models
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "failures": self.failures,
+            "models": sorted(self.models) if self.models is not None else None,
+        }
+
+class ModelRouter:
+    """Spread requests over several Ollama endpoints.
+
+    Each request goes to the healthy endpoint serving the model with the
+    fewest outstanding requests. Timeouts, transport errors and 5xx replies
+    mark the endpoint down and the request fails over to the next one, then
+    to the fallback models; replies from a fallback model come back as
+    FallbackText. Raw prompts are written in one model's template and never
+    cross to another model. A request Ollama rejects (4xx) fails at once.
+    Down endpoints are re-probed via /api/tags after retry_after seconds.
+    Exposes the same interface as OllamaClient.
+    """
+
+    def __init__(self, clients: List[OllamaClient], model: str = "codellama:7b",
+                 fallback_models: Optional[List[str]] = None,
+                 health_interval: float = 30.0, retry_after: float = 5.0):
+        if not clients:
+            raise ValueError("ModelRouter needs at least one endpoint")
+        self.backends = [Backend(client) for client in clients]
+        self.model = model
+        self.fallback_models = list(fallback_models or [])
+        self.health_interval = health_interval
+        self.retry_after = retry_after
+        self._health_task: Optional[asyncio.Task] = None
+        self.stats = {"requests": 0, "failovers": 0, "failed": 0}
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "ModelRouter":
+        ollama = config.get("ollama") or {}
+        models = config.get("models") or {}
+        endpoints = ollama.get("endpoints") or [ollama.get("base_url", "http://localhost:11434")]
+        clients = []
+        for endpoint in endpoints:
+            client_config = dict(config, ollama=dict(ollama, base_url=endpoint))
+            clients.append(OllamaClient.from_config(client_config))
+        return cls(
+            clients,
+            model=models.get("primary", "codellama:7b"),
+            fallback_models=models.get("alternatives", []),
+            health_interval=ollama.get("health_interval", 30.0),
+            retry_after=ollama.get("retry_after", 5.0)
+        )
+
+    async def check_health(self):
+        """Probe every endpoint's /api/tags, recording health and models"""
+        await asyncio.gather(*(self._probe(backend) for backend in self.backends))
+
+    async def _probe(self, backend: Backend):
+        try:
+            models = await backend.client.fetch_models(timeout=min(backend.client.timeout, 5))
+        except httpx.HTTPError:
+            self._mark_down(backend)
+        else:
+            backend.models = set(models)
+            backend.healthy = True
+            backend.down_since = None
+            backend.failures = 0
+        backend.last_checked = time.monotonic()
+
+    def _mark_down(self, backend: Backend):
+        backend.failures += 1
+        if backend.healthy:
+            backend.healthy = False
+            backend.down_since = time.monotonic()
+
+    def _schedule_health_check(self):
+        """Re-probe in the background when results are stale or a backend is down"""
+        if self._health_task is not None and not self._health_task.done():
+            return
+        now = time.monotonic()
+        stale = any(now - b.last_checked > (self.retry_after if not b.healthy else self.health_interval)
+                    for b in self.backends)
+        if stale:
+            self._health_task = asyncio.ensure_future(self.check_health())
+
+    def _candidates(self, model: str) -> List[Backend]:
+        """Healthy backends serving model, least outstanding requests first"""
+        self._schedule_health_check()
+        candidates = [b for b in self.backends if b.healthy and b.serves(model)]
+        if not candidates:
+            # Everything looks down: try anything that might serve the model
+            candidates = [b for b in self.backends if b.serves(model)]
+        return sorted(candidates, key=lambda b: b.outstanding)
+
+    def _models_to_try(self, model: Optional[str], raw: bool = False) -> List[str]:
+        primary = model or self.model
+        if raw:
+            return [primary]
+        return [primary] + [m for m in self.fallback_models if m != primary]
+
+    def _note_failure(self, backend: Backend, model: str, error: httpx.HTTPError) -> bool:
+        """Record a failed call; False if Ollama rejected the request itself,
+        which no other endpoint or model will accept either"""
+        if not isinstance(error, httpx.HTTPStatusError):
+            self._mark_down(backend)  # timeout or transport error
+            return True
+        status = error.response.status_code
+        if status >= 500:
+            self._mark_down(backend)
+        elif status == 404:
+            # Model missing on this host
+            if backend.models is not None:
+                backend.models.discard(model)
+        elif status != 429:
+            return False
+        return True
+
+    async def generate_response(self, prompt: str, temperature: float = 0.7,
+                                max_tokens: int = 2000, timeout: Optional[float] = None,
+                                model: Optional[str] = None,
+                                history: Optional[List[Dict[str, str]]] = None,
+                                options: Optional[Dict[str, Any]] = None,
+                                raw: bool = False) -> str:
+        """Generate on the least-loaded endpoint, failing over on error"""
+        self.stats["requests"] += 1
+        last_error = "no endpoint serves the requested model"
+        attempt = 0
+
+        models = self._models_to_try(model, raw)
+        for candidate_model in models:
+            for backend in self._candidates(candidate_model):
+                if attempt:
+                    self.stats["failovers"] += 1
+                attempt += 1
+                backend.outstanding += 1
+                try:
+                    result = await backend.client.generate(
+                        prompt, temperature, max_tokens, model=candidate_model, timeout=timeout,
+                        history=history, options=options, raw=raw)
+                    text = result.get("response", "")
+                    return text if candidate_model == models[0] else FallbackText(text, candidate_model)
+                except httpx.HTTPError as e:
+                    last_error = str(e)
+                    if not self._note_failure(backend, candidate_model, e):
+                        self.stats["failed"] += 1
+                        return ErrorText(f"Error communicating with Ollama: {last_error}")
+                finally:
+                    backend.outstanding -= 1
+
+        self.stats["failed"] += 1
+        return ErrorText(f"Error communicating with Ollama: {last_error}")
+
+    async def stream_response(self, prompt: str, timeout: Optional[float] = None,
+                              model: Optional[str] = None,
+                              history: Optional[List[Dict[str, str]]] = None,
+                              options: Optional[Dict[str, Any]] = None,
+                              raw: bool = False) -> AsyncIterator[str]:
+        """Stream from the least-loaded endpoint; fails over only before the first token"""
+        self.stats["requests"] += 1
+        last_error = "no endpoint serves the requested model"
+        attempt = 0
+
+        models = self._models_to_try(model, raw)
+        for candidate_model in models:
+            for backend in self._candidates(candidate_model):
+                if attempt:
+                    self.stats["failovers"] += 1
+                attempt += 1
+                backend.outstanding += 1
+                started = False
+                stream = backend.client.stream(prompt, model=candidate_model, timeout=timeout,
+                                               history=history, options=options, raw=raw)
+                try:
+                    async for token in stream:
+                        if not started and candidate_model != models[0]:
+                            token = FallbackText(token, candidate_model)
+                        started = True
+                        yield token
+                    return
+                except httpx.HTTPError as e:
+                    last_error = str(e)
+                    retry = self._note_failure(backend, candidate_model, e)
+                    if started or not retry:
+                        if not started:
+                            self.stats["failed"] += 1
+                        yield StreamError(f"Error: {last_error}")
+                        return
+                finally:
+                    backend.outstanding -= 1
+                    await stream.aclose()
+
+        self.stats["failed"] += 1
+        yield StreamError(f"Error: {last_error}")
+
+    async def embed(self, texts: List[str], model: str,
+                    timeout: Optional[float] = None) -> List[List[float]]:
+        """Embed on the least-loaded endpoint serving model; raises httpx.HTTPError"""
+        last_error: Optional[httpx.HTTPError] = None
+        for backend in self._candidates(model):
+            backend.outstanding += 1
+            try:
+                return await backend.client.embed(texts, model, timeout=timeout)
+            except httpx.HTTPError as e:
+                if not self._note_failure(backend, model, e):
+                    raise
+                last_error = e
+            finally:
+                backend.outstanding -= 1
+        raise last_error or httpx.HTTPError(f"no endpoint serves {model}")
+
+    async def preload(self, model: Optional[str] = None, timeout: Optional[float] = None):
+        """Load a model on every endpoint serving it; raises httpx.HTTPError if none could"""
+        model = model or self.model
+        backends = self._candidates(model)
+        results = await asyncio.gather(*(b.client.preload(model, timeout) for b in backends),
+                                       return_exceptions=True)
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors and len(errors) == len(results):
+            raise errors[0]
+
+    def list_models(self) -> List[str]:
+        """Models available on any endpoint"""
+        models: Set[str] = set()
+        for backend in self.backends:
+            models.update(backend.client.list_models())
+        return sorted(models)
+
+    def switch_model(self, model_name: str) -> bool:
+        if model_name in self.list_models():
+            self.model = model_name
+            return True
+        return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["backends"] = [backend.to_dict() for backend in self.backends]
+        return stats
+
+    async def aclose(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+        for backend in self.backends:
+            await backend.client.aclose()
+
+def create_model_client(config: Dict[str, Any]):
+    """A plain OllamaClient for one endpoint, a ModelRouter for several"""
+    endpoints = (config.get("ollama") or {}).get("endpoints") or []
+    if len(endpoints) > 1:
+        return ModelRouter.from_config(config)
+    if endpoints:
+        config = dict(config, ollama=dict(config.get("ollama") or {}, base_url=endpoints[0]))
+    return OllamaClient.from_config(config)
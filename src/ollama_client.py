@@ -1,79 +1,379 @@
+import contextlib
+import contextvars
 import json
-import requests
+import time
+import httpx
 import asyncio
-from typing import Dict, Optional, List
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, List
+from tracing import current_trace
+
+class ErrorText(str):
+    """What generate_response returns when the request failed.
+
+    It is the error message; check isinstance(reply, ErrorText), never the
+    text, since a model may well answer "Error: ..." itself.
+    """
+
+class FallbackText(str):
+    """A reply, or the first token of a stream, produced by a fallback model
+    after the requested one failed; .model names the model that answered."""
+
+    model: str
+
+    def __new__(cls, text: str, model: str) -> "FallbackText":
+        reply = super().__new__(cls, text)
+        reply.model = model
+        return reply
+
+class StreamError(ErrorText):
+    """Last token of a stream that failed, possibly after other tokens.
+
+    It is the error message, so consumers that only display tokens need
+    nothing special; check isinstance(token, StreamError) to tell a
+    truncated response from a complete one.
+    """
+
+class Usage:
+    """Tokens Ollama reports generating (eval_count) and the time it took
+    (eval_duration, nanoseconds), summed over the requests made under
+    measure_usage(), including those it starts in other tasks"""
+
+    __slots__ = ("prompt_eval_count", "eval_count", "eval_duration")
+
+    def __init__(self):
+        self.prompt_eval_count = 0
+        self.eval_count = 0
+        self.eval_duration = 0
+
+    def record(self, reply: Dict[str, Any]):
+        self.prompt_eval_count += reply.get("prompt_eval_count", 0)
+        self.eval_count += reply.get("eval_count", 0)
+        self.eval_duration += reply.get("eval_duration", 0)
+
+_usage: contextvars.ContextVar[Optional[Usage]] = contextvars.ContextVar("usage", default=None)
+
+@contextlib.contextmanager
+def measure_usage() -> Iterator[Usage]:
+    """Collect the token counts of the generations made inside the block"""
+    usage = Usage()
+    token = _usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage.reset(token)
+
+def _record(reply: Dict[str, Any]):
+    """Hand the counts in a final reply to the current trace and usage"""
+    current_trace().record_ollama(reply)
+    usage = _usage.get()
+    if usage is not None:
+        usage.record(reply)
 
 class OllamaClient:
-    def __init__(self, base_url: str = "http://localhost:11434", 
-                 model: str = "codellama:7b"):
-        self.base_url = base_url
+    def __init__(self, base_url: str = "http://localhost:11434",
+                 model: str = "codellama:7b",
+                 timeout: float = 30,
+                 max_connections: int = 32,
+                 max_keepalive_connections: int = 16,
+                 keepalive_expiry: float = 60,
+                 pool_timeout: Optional[float] = None,
+                 keep_alive: Optional[str] = None):
+        self.base_url = base_url.rstrip('/')
         self.model = model
-        self.session = requests.Session()
-        
-    async def generate_response(self, prompt: str, 
+        self.timeout = timeout
+        # How long Ollama keeps the model loaded after a request (e.g. "30m", -1 = forever)
+        self.keep_alive = keep_alive
+        self.max_connections = max_connections
+        self.pool_timeout = pool_timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        # Created lazily so they bind to the event loop that first uses them
+        self._client: Optional[httpx.AsyncClient] = None
+        self._sync_client: Optional[httpx.Client] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.in_flight = 0
+        self.waiting = 0
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "OllamaClient":
+        """Build a client from the parsed config.yaml"""
+        ollama = config.get("ollama") or {}
+        models = config.get("models") or {}
+        return cls(
+            base_url=ollama.get("base_url", "http://localhost:11434"),
+            model=models.get("primary", "codellama:7b"),
+            timeout=ollama.get("timeout", 30),
+            max_connections=ollama.get("max_connections", 32),
+            max_keepalive_connections=ollama.get("max_keepalive_connections", 16),
+            keepalive_expiry=ollama.get("keepalive_expiry", 60),
+            pool_timeout=ollama.get("pool_timeout"),
+            keep_alive=ollama.get("keep_alive")
+        )
+
+    def _timeout(self, timeout: Optional[float] = None) -> httpx.Timeout:
+        """Per-request timeout; pool waits are bounded separately"""
+        return httpx.Timeout(timeout if timeout is not None else self.timeout,
+                             pool=self.pool_timeout)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Pooled connections and slots cannot be shared across event loops
+            self._loop = loop
+            self._client = None
+            self._slots = None
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=self.limits,
+                timeout=self._timeout(),
+                verify=self._verify()
+            )
+        return self._client
+
+    def _get_sync_client(self) -> httpx.Client:
+        if self._sync_client is None or self._sync_client.is_closed:
+            self._sync_client = httpx.Client(base_url=self.base_url,
+                                             timeout=self._timeout(),
+                                             verify=self._verify())
+        return self._sync_client
+
+    def _verify(self) -> bool:
+        """Only build an SSL context (and load the CA bundle) for https endpoints.
+
+        Loading the CA bundle costs tens of milliseconds per process, which
+        plain-http local Ollama never uses.
+        """
+        return self.base_url.startswith("https://")
+
+    async def _acquire(self):
+        """Wait for a free connection slot (backpressure when the pool is full)"""
+        self._get_client()
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_connections)
+        self.waiting += 1
+        try:
+            if self.pool_timeout is None:
+                await self._slots.acquire()
+            else:
+                await asyncio.wait_for(self._slots.acquire(), self.pool_timeout)
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+
+    def _release(self):
+        self.in_flight -= 1
+        self._slots.release()
+
+    def _request(self, prompt: str, model: Optional[str], stream: bool,
+                 history: Optional[List[Dict[str, str]]],
+                 options: Optional[Dict[str, Any]] = None, raw: bool = False):
+        """Endpoint and payload: /api/generate, or /api/chat when there is history.
+
+        With history, prompt becomes the final user message after the
+        earlier messages, which Ollama renders into the same token prefix
+        each turn so the model can reuse its KV cache. Sampling settings
+        (temperature, num_predict, stop...) go in options; raw sends the
+        prompt without the model's template, as fill-in-the-middle needs.
+        """
+        if history is None:
+            endpoint = "/api/generate"
+            payload = {"model": model or self.model, "prompt": prompt, "stream": stream}
+            if raw:
+                payload["raw"] = True
+        else:
+            endpoint = "/api/chat"
+            payload = {"model": model or self.model, "stream": stream,
+                       "messages": history + [{"role": "user", "content": prompt}]}
+        if options:
+            payload["options"] = options
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        return endpoint, payload
+
+    async def generate(self, prompt: str, temperature: float = 0.7,
+                       max_tokens: int = 2000, model: Optional[str] = None,
+                       timeout: Optional[float] = None,
+                       history: Optional[List[Dict[str, str]]] = None,
+                       options: Optional[Dict[str, Any]] = None,
+                       raw: bool = False) -> Dict[str, Any]:
+        """Call /api/generate (or /api/chat) and return the decoded reply; raises httpx.HTTPError.
+
+        Entries in options override temperature and max_tokens (num_predict).
+        """
+        options = dict({"temperature": temperature, "num_predict": max_tokens}, **(options or {}))
+        endpoint, payload = self._request(prompt, model, False, history, options, raw)
+
+        try:
+            await self._acquire()
+        except asyncio.TimeoutError:
+            raise httpx.PoolTimeout("connection pool exhausted")
+
+        try:
+            response = await self._get_client().post(
+                endpoint, json=payload, timeout=self._timeout(timeout)
+            )
+            response.raise_for_status()
+            reply = response.json()
+            if "message" in reply:
+                reply["response"] = reply["message"].get("content", "")
+            _record(reply)
+            return reply
+        finally:
+            self._release()
+
+    async def stream(self, prompt: str, model: Optional[str] = None,
+                     timeout: Optional[float] = None,
+                     history: Optional[List[Dict[str, str]]] = None,
+                     options: Optional[Dict[str, Any]] = None,
+                     raw: bool = False) -> AsyncIterator[str]:
+        """Yield response tokens from /api/generate (or /api/chat); raises httpx.HTTPError"""
+        endpoint, payload = self._request(prompt, model, True, history, options, raw)
+
+        try:
+            await self._acquire()
+        except asyncio.TimeoutError:
+            raise httpx.PoolTimeout("connection pool exhausted")
+
+        received, first_token, done = 0, 0.0, False
+        try:
+            async with self._get_client().stream(
+                "POST", endpoint, json=payload, timeout=self._timeout(timeout)
+            ) as response:
+                response.raise_for_status()
+
+                async for line in response.aiter_lines():
+                    if line:
+                        data = json.loads(line)
+                        if data.get('done'):
+                            done = True
+                            _record(data)
+                        elif not received:
+                            first_token = time.perf_counter()
+                        received += 1
+                        if 'response' in data:
+                            yield data['response']
+                        elif 'message' in data:
+                            yield data['message'].get('content', '')
+                        if done:
+                            break
+        finally:
+            self._release()
+            usage = _usage.get()
+            if not done and received and usage is not None:
+                # Closed early (e.g. at the end of a completion's code block), so
+                # Ollama's counts never arrive: each streamed line is one token
+                usage.record({"eval_count": received,
+                              "eval_duration": int((time.perf_counter() - first_token) * 1e9)})
+
+    async def generate_response(self, prompt: str,
                               temperature: float = 0.7,
-                              max_tokens: int = 2000) -> str:
+                              max_tokens: int = 2000,
+                              timeout: Optional[float] = None,
+                              model: Optional[str] = None,
+                              history: Optional[List[Dict[str, str]]] = None,
+                              options: Optional[Dict[str, Any]] = None,
+                              raw: bool = False) -> str:
         """Generate response using Ollama"""
-        
-        url = f"{self.base_url}/api/generate"
-        
-        payload = {
-            "model": self.model,
-            "prompt": prompt,
-            "temperature": temperature,
-            "max_tokens": max_tokens,
-            "stream": False
-        }
-        
         try:
-            response = self.session.post(url, json=payload, timeout=30)
-            response.raise_for_status()
-            
-            result = response.json()
+            result = await self.generate(prompt, temperature, max_tokens,
+                                         model=model, timeout=timeout, history=history,
+                                         options=options, raw=raw)
             return result.get("response", "")
-            
-        except requests.exceptions.RequestException as e:
-            return f"Error communicating with Ollama: {str(e)}"
-    
-    async def stream_response(self, prompt: str) -> asyncio.Generator[str, None, None]:
+        except httpx.HTTPError as e:
+            return ErrorText(f"Error communicating with Ollama: {str(e)}")
+
+    async def stream_response(self, prompt: str,
+                              timeout: Optional[float] = None,
+                              model: Optional[str] = None,
+                              history: Optional[List[Dict[str, str]]] = None,
+                              options: Optional[Dict[str, Any]] = None,
+                              raw: bool = False) -> AsyncIterator[str]:
         """Stream response from Ollama"""
-        url = f"{self.base_url}/api/generate"
-        
-        payload = {
-            "model": self.model,
-            "prompt": prompt,
-            "stream": True
-        }
-        
+        stream = self.stream(prompt, model=model, timeout=timeout, history=history,
+                             options=options, raw=raw)
         try:
-            response = self.session.post(url, json=payload, stream=True)
+            async for token in stream:
+                yield token
+        except httpx.HTTPError as e:
+            yield StreamError(f"Error: {str(e)}")
+        finally:
+            await stream.aclose()
+
+    async def embed(self, texts: List[str], model: str,
+                    timeout: Optional[float] = None) -> List[List[float]]:
+        """Embed a batch of texts with /api/embed; raises httpx.HTTPError"""
+        try:
+            await self._acquire()
+        except asyncio.TimeoutError:
+            raise httpx.PoolTimeout("connection pool exhausted")
+
+        try:
+            payload = {"model": model, "input": texts}
+            if self.keep_alive is not None:
+                payload["keep_alive"] = self.keep_alive
+            response = await self._get_client().post(
+                "/api/embed", json=payload, timeout=self._timeout(timeout)
+            )
             response.raise_for_status()
-            
-            for line in response.iter_lines():
-                if line:
-                    data = json.loads(line.decode('utf-8'))
-                    if 'response' in data:
-                        yield data['response']
-                        
-        except requests.exceptions.RequestException as e:
-            yield f"Error: {str(e)}"
-    
+            return response.json()["embeddings"]
+        finally:
+            self._release()
+
+    async def preload(self, model: Optional[str] = None, timeout: Optional[float] = None):
+        """Load a model into memory ahead of the first request; raises httpx.HTTPError.
+
+        A generate call without a prompt only loads the model, and
+        keep_alive then keeps it resident.
+        """
+        payload = {"model": model or self.model}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        response = await self._get_client().post("/api/generate", json=payload,
+                                                 timeout=self._timeout(timeout))
+        response.raise_for_status()
+
+    async def fetch_models(self, timeout: Optional[float] = None) -> List[str]:
+        """List models via the async client; raises httpx.HTTPError"""
+        response = await self._get_client().get("/api/tags", timeout=self._timeout(timeout))
+        response.raise_for_status()
+        return [model["name"] for model in response.json().get("models", [])]
+
     def list_models(self) -> List[str]:
         """List available models"""
         try:
-            response = self.session.get(f"{self.base_url}/api/tags")
+            response = self._get_sync_client().get("/api/tags")
             response.raise_for_status()
-            
+
             models = response.json().get("models", [])
             return [model["name"] for model in models]
-            
-        except requests.exceptions.RequestException:
+
+        except httpx.HTTPError:
             return []
-    
+
     def switch_model(self, model_name: str) -> bool:
         """Switch to a different model"""
         available_models = self.list_models()
         if model_name in available_models:
             self.model = model_name
             return True
-        return False
\ No newline at end of file
+        return False
+
+    async def aclose(self):
+        """Close pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._sync_client is not None:
+            self._sync_client.close()
+            self._sync_client = None
+
+    async def __aenter__(self) -> "OllamaClient":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
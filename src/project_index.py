@@ -0,0 +1,310 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+CODE_EXTENSIONS = {
+    '.py', '.js', '.ts', '.java', '.cpp', '.c', '.h', '.hpp',
+    '.go', '.rs', '.rb', '.php', '.cs', '.swift', '.kt', '.scala',
+    '.html', '.css', '.scss', '.less', '.xml', '.json', '.yaml', '.yml'
+}
+
+IGNORED_DIRS = {'node_modules', '__pycache__', 'build', 'dist'}
+
+INDEX_VERSION = 1
+
+def is_code_file(filename: str) -> bool:
+    """Check if file is a code file"""
+    return os.path.splitext(filename)[1].lower() in CODE_EXTENSIONS
+
+def is_ignored_dir(dirname: str) -> bool:
+    """Hidden and build/dependency directories are never indexed"""
+    return dirname.startswith('.') or dirname in IGNORED_DIRS
+
+class ProjectIndex:
+    """Persistent index of the code files under a project root.
+
+    Directories are stored with their mtime and files with their
+    (mtime_ns, size). A refresh only re-lists directories whose mtime
+    changed (a file was added, removed or renamed): one stat per directory,
+    cheap enough for the request path. Editing a file in place leaves its
+    directory's mtime alone, so restat() re-stats every file; index builds
+    run it, and long-lived processes run it every restat_interval seconds
+    on a background thread (restat_in_background). Any change bumps
+    generation, which the import graph and symbol index sync on. Lookups by
+    stem, directory and extension are dict lookups.
+    """
+
+    def __init__(self, project_root: str, index_path: Optional[str] = None,
+                 refresh_interval: float = 2.0, restat_interval: float = 30.0):
+        self.project_root = Path(project_root).resolve()
+        self.index_path = Path(index_path) if index_path else None
+        self.refresh_interval = refresh_interval
+        self.restat_interval = restat_interval
+        # rel_dir -> {"mtime": int, "files": {name: [mtime_ns, size]}, "subdirs": [name]}
+        self.dirs: Dict[str, Dict[str, Any]] = {}
+        self.by_stem: Dict[str, Set[str]] = {}
+        self.by_ext: Dict[str, Set[str]] = {}
+        self.generation = 0
+        self._stem_matches: Dict[str, List[str]] = {}
+        self._last_refresh = 0.0
+        self._last_restat = 0.0
+        self._restat_thread: Optional[threading.Thread] = None
+        self._dirty = False
+        self._lock = threading.RLock()
+        self.stats = {"refreshes": 0, "dirs_rescanned": 0, "files_changed": 0,
+                      "loaded_from_disk": False}
+
+        if self.index_path is not None:
+            self._load()
+
+    def refresh(self, force: bool = False) -> int:
+        """Revalidate directory mtimes; returns the number of dirs re-listed"""
+        with self._lock:
+            now = time.monotonic()
+            if not force and self.dirs and now - self._last_refresh < self.refresh_interval:
+                return 0
+
+            seen: Set[str] = set()
+            changed = self._refresh_dir('.', seen)
+
+            for rel_dir in set(self.dirs) - seen:
+                self._drop_dir(rel_dir)
+                self.stats["dirs_rescanned"] += 1
+                changed += 1
+
+            self._last_refresh = time.monotonic()
+            self.stats["refreshes"] += 1
+            self._changed(changed)
+            return changed
+
+    def restat(self) -> int:
+        """Re-stat every indexed file to catch in-place edits; returns how many changed.
+
+        The stats are taken outside the lock, so refreshes and lookups on
+        the request path are not held up meanwhile.
+        """
+        with self._lock:
+            files = [(rel_dir, name, info) for rel_dir, entry in self.dirs.items()
+                     for name, info in entry["files"].items()]
+        updates = []
+        for rel_dir, name, info in files:
+            try:
+                st = os.stat(self.project_root / rel_dir / name)
+            except OSError:
+                continue  # removed: the directory's mtime changed too
+            if info[0] != st.st_mtime_ns or info[1] != st.st_size:
+                updates.append((rel_dir, name, [st.st_mtime_ns, st.st_size]))
+
+        with self._lock:
+            changed = 0
+            for rel_dir, name, info in updates:
+                entry = self.dirs.get(rel_dir)
+                if entry is not None and name in entry["files"]:
+                    entry["files"][name] = info
+                    changed += 1
+            self._last_restat = time.monotonic()
+            self.stats["files_changed"] += changed
+            self._changed(changed)
+            return changed
+
+    def restat_in_background(self) -> bool:
+        """Start restat() on a daemon thread if one is due and none is running"""
+        with self._lock:
+            if ((self._restat_thread is not None and self._restat_thread.is_alive())
+                    or time.monotonic() - self._last_restat < self.restat_interval):
+                return False
+            self._last_restat = time.monotonic()
+            self._restat_thread = threading.Thread(target=self.restat, name="index-restat",
+                                                   daemon=True)
+            self._restat_thread.start()
+            return True
+
+    def _changed(self, changed: int):
+        if changed:
+            self.generation += 1
+            self._stem_matches.clear()
+            self._dirty = True
+        if self._dirty:
+            self.save()
+
+    def _refresh_dir(self, rel_dir: str, seen: Set[str]) -> int:
+        """Revalidate one directory and recurse into its subdirectories;
+        returns the number of dirs re-listed"""
+        abs_dir = self.project_root / rel_dir
+        try:
+            mtime = os.stat(abs_dir).st_mtime_ns
+        except OSError:
+            return 0
+        seen.add(rel_dir)
+
+        entry = self.dirs.get(rel_dir)
+        changed = 0
+        if entry is None or entry["mtime"] != mtime:
+            entry = self._scan_dir(rel_dir, abs_dir, mtime)
+            self.stats["dirs_rescanned"] += 1
+            changed = 1
+
+        for subdir in entry["subdirs"]:
+            child = subdir if rel_dir == '.' else os.path.join(rel_dir, subdir)
+            changed += self._refresh_dir(child, seen)
+        return changed
+
+    def _scan_dir(self, rel_dir: str, abs_dir: Path, mtime: int) -> Dict[str, Any]:
+        files: Dict[str, List[int]] = {}
+        subdirs: List[str] = []
+        try:
+            with os.scandir(abs_dir) as it:
+                for item in it:
+                    try:
+                        if item.is_dir(follow_symlinks=False):
+                            if not is_ignored_dir(item.name):
+                                subdirs.append(item.name)
+                        elif (item.is_file() and not item.name.startswith('.')
+                              and is_code_file(item.name)):
+                            st = item.stat()
+                            files[item.name] = [st.st_mtime_ns, st.st_size]
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+
+        if rel_dir in self.dirs:
+            self._unlink_files(rel_dir, self.dirs[rel_dir]["files"])
+        entry = {"mtime": mtime, "files": files, "subdirs": sorted(subdirs)}
+        self.dirs[rel_dir] = entry
+        self._link_files(rel_dir, files)
+        return entry
+
+    def _drop_dir(self, rel_dir: str):
+        entry = self.dirs.pop(rel_dir, None)
+        if entry is not None:
+            self._unlink_files(rel_dir, entry["files"])
+
+    def _link_files(self, rel_dir: str, files: Dict[str, Any]):
+        for name in files:
+            rel_path = self._join(rel_dir, name)
+            stem, ext = os.path.splitext(name)
+            self.by_stem.setdefault(stem, set()).add(rel_path)
+            self.by_ext.setdefault(ext.lower(), set()).add(rel_path)
+
+    def _unlink_files(self, rel_dir: str, files: Dict[str, Any]):
+        for name in files:
+            rel_path = self._join(rel_dir, name)
+            stem, ext = os.path.splitext(name)
+            for table, key in ((self.by_stem, stem), (self.by_ext, ext.lower())):
+                paths = table.get(key)
+                if paths is not None:
+                    paths.discard(rel_path)
+                    if not paths:
+                        del table[key]
+
+    @staticmethod
+    def _join(rel_dir: str, name: str) -> str:
+        return name if rel_dir == '.' else os.path.join(rel_dir, name)
+
+    def update_file(self, file_path: str):
+        """Record a single changed/added/removed file without a refresh"""
+        rel_path = self.relative(file_path)
+        if rel_path is None:
+            return
+        rel_dir, name = os.path.split(rel_path)
+        rel_dir = rel_dir or '.'
+        with self._lock:
+            entry = self.dirs.get(rel_dir)
+            if entry is None:
+                return
+            self._unlink_files(rel_dir, {name: None} if name in entry["files"] else {})
+            entry["files"].pop(name, None)
+            try:
+                st = os.stat(self.project_root / rel_path)
+                if is_code_file(name) and not name.startswith('.'):
+                    entry["files"][name] = [st.st_mtime_ns, st.st_size]
+                    self._link_files(rel_dir, {name: None})
+            except OSError:
+                pass
+            self.generation += 1
+            self._stem_matches.clear()
+            self._dirty = True
+
+    def _load(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != INDEX_VERSION or data.get("root") != str(self.project_root):
+            return
+        self.dirs = data.get("dirs", {})
+        for rel_dir, entry in self.dirs.items():
+            self._link_files(rel_dir, entry["files"])
+        self.stats["loaded_from_disk"] = True
+
+    def save(self):
+        """Write the index to disk if it has a path"""
+        if self.index_path is None:
+            return
+        with self._lock:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.index_path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"version": INDEX_VERSION, "root": str(self.project_root),
+                           "dirs": self.dirs}, f, separators=(',', ':'))
+            os.replace(tmp_path, self.index_path)
+            self._dirty = False
+
+    def relative(self, file_path: str) -> Optional[str]:
+        """Path relative to the project root, or None if outside it"""
+        try:
+            resolved = Path(file_path).resolve()
+        except OSError:
+            return None
+        if not resolved.is_relative_to(self.project_root):
+            return None
+        return str(resolved.relative_to(self.project_root))
+
+    def structure(self) -> Dict[str, List[str]]:
+        """Directory -> code files, in the shape of get_project_structure"""
+        self.refresh()
+        return {rel_dir: sorted(entry["files"]) for rel_dir, entry in self.dirs.items()}
+
+    def files_in_dir(self, rel_dir: str) -> List[str]:
+        self.refresh()
+        entry = self.dirs.get(rel_dir or '.')
+        return [self._join(rel_dir or '.', name) for name in sorted(entry["files"])] if entry else []
+
+    def files_with_stem(self, stem: str) -> List[str]:
+        self.refresh()
+        return sorted(self.by_stem.get(stem, ()))
+
+    def files_with_extension(self, ext: str) -> List[str]:
+        self.refresh()
+        return sorted(self.by_ext.get(ext.lower(), ()))
+
+    def files_with_stem_containing(self, fragment: str) -> List[str]:
+        """Files whose stem contains fragment; memoised until the index changes"""
+        self.refresh()
+        with self._lock:
+            matches = self._stem_matches.get(fragment)
+            if matches is None:
+                matches = sorted(path for stem, paths in self.by_stem.items()
+                                 if fragment in stem for path in paths)
+                self._stem_matches[fragment] = matches
+            return matches
+
+    def file_info(self, rel_path: str) -> Optional[Tuple[int, int]]:
+        """(mtime_ns, size) recorded for a file"""
+        rel_dir, name = os.path.split(rel_path)
+        entry = self.dirs.get(rel_dir or '.')
+        info = entry["files"].get(name) if entry else None
+        return tuple(info) if info else None
+
+    def all_files(self) -> List[str]:
+        self.refresh()
+        return [self._join(rel_dir, name)
+                for rel_dir, entry in self.dirs.items() for name in entry["files"]]
+
+    def __len__(self) -> int:
+        return sum(len(entry["files"]) for entry in self.dirs.values())
@@ -0,0 +1,156 @@
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+class _SharedGeneration:
+    """One in-flight generate_response call and the callers waiting on it"""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+class _SharedStream:
+    """One upstream token stream replayed to every subscriber.
+
+    Tokens are buffered so a subscriber that joins late still receives the
+    whole response from the first token.
+    """
+
+    def __init__(self):
+        self.tokens: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.changed = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+
+    async def produce(self, source: AsyncIterator[str]):
+        try:
+            async for token in source:
+                async with self.changed:
+                    self.tokens.append(token)
+                    self.changed.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            # Closing the generator closes the HTTP stream to Ollama
+            await source.aclose()
+            async with self.changed:
+                self.done = True
+                self.changed.notify_all()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        position = 0
+        while True:
+            async with self.changed:
+                while position >= len(self.tokens) and not self.done:
+                    await self.changed.wait()
+                pending = self.tokens[position:]
+                finished = self.done
+            for token in pending:
+                yield token
+            position += len(pending)
+            if finished and position >= len(self.tokens):
+                if self.error is not None:
+                    raise self.error
+                return
+
+class CoalescingClient:
+    """Wraps a model client so identical concurrent requests share one generation.
+
+    Requests are identical when model, prompt and sampling parameters match.
+    Duplicates attach to the in-flight call instead of starting another;
+    streaming duplicates are fanned out from the single upstream stream.
+    The upstream call is cancelled once every caller has gone away.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._generations: Dict[Tuple, _SharedGeneration] = {}
+        self._streams: Dict[Tuple, _SharedStream] = {}
+        self.stats = {"requests": 0, "coalesced": 0, "upstream_calls": 0, "cancelled": 0}
+
+    def __getattr__(self, name: str) -> Any:
+        # Everything not coalesced (list_models, aclose, base_url...) goes to the client
+        return getattr(self.client, name)
+
+    @property
+    def model(self) -> str:
+        return self.client.model
+
+    @model.setter
+    def model(self, value: str):
+        self.client.model = value
+
+    async def generate_response(self, prompt: str, temperature: float = 0.7,
+                                max_tokens: int = 2000, **kwargs) -> str:
+        key = (self.client.model, prompt, temperature, max_tokens, self._freeze(kwargs))
+        self.stats["requests"] += 1
+
+        shared = self._generations.get(key)
+        if shared is None:
+            task = asyncio.ensure_future(self.client.generate_response(
+                prompt, temperature=temperature, max_tokens=max_tokens, **kwargs))
+            shared = _SharedGeneration(task)
+            self._generations[key] = shared
+            task.add_done_callback(lambda _, key=key, shared=shared: self._forget(
+                self._generations, key, shared))
+            self.stats["upstream_calls"] += 1
+        else:
+            self.stats["coalesced"] += 1
+
+        shared.waiters += 1
+        try:
+            return await asyncio.shield(shared.task)
+        except asyncio.CancelledError:
+            if shared.waiters == 1 and not shared.task.done():
+                self._forget(self._generations, key, shared)
+                shared.task.cancel()
+                self.stats["cancelled"] += 1
+            raise
+        finally:
+            shared.waiters -= 1
+
+    async def stream_response(self, prompt: str, **kwargs) -> AsyncIterator[str]:
+        key = (self.client.model, prompt, self._freeze(kwargs))
+        self.stats["requests"] += 1
+
+        shared = self._streams.get(key)
+        if shared is None:
+            shared = _SharedStream()
+            shared.task = asyncio.ensure_future(
+                shared.produce(self.client.stream_response(prompt, **kwargs)))
+            self._streams[key] = shared
+            shared.task.add_done_callback(lambda _, key=key, shared=shared: self._forget(
+                self._streams, key, shared))
+            self.stats["upstream_calls"] += 1
+        else:
+            self.stats["coalesced"] += 1
+
+        shared.subscribers += 1
+        try:
+            async for token in shared.subscribe():
+                yield token
+        finally:
+            shared.subscribers -= 1
+            if shared.subscribers == 0 and not shared.task.done():
+                self._forget(self._streams, key, shared)
+                shared.task.cancel()
+                self.stats["cancelled"] += 1
+
+    @staticmethod
+    def _freeze(kwargs: Dict[str, Any]) -> Tuple:
+        """Hashable form of keyword arguments (chat history is a list of dicts, options a dict)"""
+        return tuple((name, json.dumps(value, sort_keys=True)
+                      if isinstance(value, (list, dict)) else value)
+                     for name, value in sorted(kwargs.items()))
+
+    @staticmethod
+    def _forget(table: Dict[Tuple, Any], key: Tuple, shared: Any):
+        if table.get(key) is shared:
+            del table[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["in_flight"] = len(self._generations) + len(self._streams)
+        return stats
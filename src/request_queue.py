@@ -0,0 +1,162 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+# Priority order: a free slot always goes to the first lane with a waiter
+LANES = ("interactive", "batch")
+
+class Overloaded(Exception):
+    """The lane's queue is full; retry after retry_after seconds"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Server busy, retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+class _ModelSlots:
+    """Running count and per-lane waiters for one model"""
+
+    def __init__(self):
+        self.active = 0
+        self.waiters: Dict[str, Deque[asyncio.Future]] = {lane: deque() for lane in LANES}
+        self.service_time = 0.0  # moving average of seconds per request
+
+    def queued(self) -> int:
+        return sum(len(waiters) for waiters in self.waiters.values())
+
+class _LaneStats:
+    def __init__(self, samples: int = 1000):
+        self.admitted = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.recent_waits: Deque[float] = deque(maxlen=samples)
+
+    def record_wait(self, wait: float):
+        self.admitted += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.recent_waits.append(wait)
+
+    def to_dict(self) -> Dict[str, Any]:
+        waits = sorted(self.recent_waits)
+        return {
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "mean_wait": self.total_wait / self.admitted if self.admitted else 0.0,
+            "max_wait": self.max_wait,
+            "p50_wait": waits[len(waits) // 2] if waits else 0.0,
+            "p95_wait": waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0,
+        }
+
+class AdmissionQueue:
+    """Per-model concurrency limit with priority lanes and bounded queues.
+
+    At most `concurrency` requests run against each model at once. Waiters
+    in the interactive lane are always admitted before batch waiters, so a
+    large batch job cannot starve interactive users. When a lane's queue is
+    full new requests are rejected with Overloaded instead of piling up.
+    """
+
+    def __init__(self, concurrency: int = 2, max_queue: Optional[Dict[str, int]] = None,
+                 retry_after: float = 1.0):
+        self.concurrency = max(1, concurrency)
+        self.max_queue = {"interactive": 32, "batch": 256}
+        self.max_queue.update(max_queue or {})
+        self.retry_after = retry_after
+        self._models: Dict[str, _ModelSlots] = {}
+        self._lanes = {lane: _LaneStats() for lane in LANES}
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "AdmissionQueue":
+        web = config.get("web") or {}
+        return cls(
+            concurrency=web.get("concurrency_per_model", 2),
+            max_queue={"interactive": web.get("max_queue_interactive", 32),
+                       "batch": web.get("max_queue_batch", 256)},
+            retry_after=web.get("retry_after", 1.0)
+        )
+
+    @asynccontextmanager
+    async def slot(self, model: str, lane: str = "interactive") -> AsyncIterator[None]:
+        """Hold one of the model's slots for the duration of the block"""
+        slots = self._models.setdefault(model, _ModelSlots())
+        await self._acquire(slots, lane)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            slots.service_time = elapsed if not slots.service_time else \
+                0.8 * slots.service_time + 0.2 * elapsed
+            self._release(slots)
+
+    async def _acquire(self, slots: _ModelSlots, lane: str):
+        if lane not in slots.waiters:
+            raise ValueError(f"Unknown lane: {lane}")
+        stats = self._lanes[lane]
+
+        if slots.active < self.concurrency and not self._ahead_of(slots, lane):
+            slots.active += 1
+            stats.record_wait(0.0)
+            return
+
+        if len(slots.waiters[lane]) >= self.max_queue[lane]:
+            stats.rejected += 1
+            raise Overloaded(self._estimate_retry(slots))
+
+        waiter = asyncio.get_running_loop().create_future()
+        slots.waiters[lane].append(waiter)
+        queued_at = time.monotonic()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release(slots)  # the slot was handed over just as we left
+            elif waiter in slots.waiters[lane]:
+                slots.waiters[lane].remove(waiter)
+            raise
+        stats.record_wait(time.monotonic() - queued_at)
+
+    @staticmethod
+    def _ahead_of(slots: _ModelSlots, lane: str) -> bool:
+        """Whether anyone of equal or higher priority is already waiting"""
+        for other in LANES:
+            if slots.waiters[other]:
+                return True
+            if other == lane:
+                return False
+        return False
+
+    def _release(self, slots: _ModelSlots):
+        # Hand the slot straight to the next waiter so nobody can jump the queue
+        for lane in LANES:
+            waiters = slots.waiters[lane]
+            while waiters:
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    waiter.set_result(None)
+                    return
+        slots.active -= 1
+
+    def _estimate_retry(self, slots: _ModelSlots) -> float:
+        """Rough time for the current queue to drain"""
+        if not slots.service_time:
+            return self.retry_after
+        drain = slots.service_time * (slots.queued() + 1) / self.concurrency
+        return max(self.retry_after, drain)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency_per_model": self.concurrency,
+            "models": {
+                model: {
+                    "active": slots.active,
+                    "queued": {lane: len(waiters) for lane, waiters in slots.waiters.items()},
+                    "service_time": slots.service_time,
+                }
+                for model, slots in self._models.items()
+            },
+            "lanes": {lane: stats.to_dict() for lane, stats in self._lanes.items()},
+        }
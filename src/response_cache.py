@@ -0,0 +1,159 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+class ResponseCache:
+    """Content-addressed cache of model responses.
+
+    Entries are keyed by a hash of everything that determines the output
+    (model, prompt, sampling parameters). A bounded in-memory LRU sits in
+    front of an optional SQLite tier so results survive restarts.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: Optional[float] = 86400,
+                 db_path: Optional[str] = None, max_disk_entries: int = 10000,
+                 cache_nonzero_temperature: Iterable[str] = ()):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_entries = max_disk_entries
+        self.cache_nonzero_temperature = set(cache_nonzero_temperature)
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.stats = {"hits": 0, "memory_hits": 0, "disk_hits": 0,
+                      "misses": 0, "stores": 0, "evictions": 0}
+
+        if db_path:
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, created REAL NOT NULL, "
+                "accessed REAL NOT NULL, response TEXT NOT NULL)"
+            )
+            self._db.commit()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], project_root: Path) -> Optional["ResponseCache"]:
+        """Build the cache from the `cache:` section, or None if disabled"""
+        cache_config = config.get("cache") or {}
+        if not cache_config.get("enabled", False):
+            return None
+
+        db_path = None
+        if cache_config.get("persist", False):
+            db_path = Path(cache_config.get("path", ".ai-assistant/cache.sqlite3"))
+            if not db_path.is_absolute():
+                db_path = Path(project_root) / db_path
+
+        return cls(
+            max_entries=cache_config.get("max_entries", 512),
+            ttl_seconds=cache_config.get("ttl_seconds", 86400),
+            db_path=str(db_path) if db_path else None,
+            max_disk_entries=cache_config.get("max_disk_entries", 10000),
+            cache_nonzero_temperature=cache_config.get("cache_nonzero_temperature", [])
+        )
+
+    @staticmethod
+    def make_key(model: str, prompt: str, options: Dict[str, Any], raw: bool = False) -> str:
+        """Hash the inputs that determine a response: every Ollama option sent
+        (sampling, stop tokens, context size...) and whether the prompt is raw"""
+        material = json.dumps([model, prompt, options, raw], ensure_ascii=False,
+                              sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def is_cacheable(self, task_type: str, temperature: float) -> bool:
+        """Deterministic calls are always cached; sampled ones only if opted in"""
+        return temperature == 0 or task_type in self.cache_nonzero_temperature
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[str]:
+        """Look up a response, promoting disk hits into memory"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, response = entry
+                if not self._expired(created):
+                    self._memory.move_to_end(key)
+                    self.stats["hits"] += 1
+                    self.stats["memory_hits"] += 1
+                    return response
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT created, response FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    created, response = row
+                    if not self._expired(created):
+                        self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?",
+                                         (time.time(), key))
+                        self._db.commit()
+                        self._put_memory(key, created, response)
+                        self.stats["hits"] += 1
+                        self.stats["disk_hits"] += 1
+                        return response
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: str, response: str):
+        """Store a response in both tiers"""
+        now = time.time()
+        with self._lock:
+            self._put_memory(key, now, response)
+            self.stats["stores"] += 1
+
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, created, accessed, response) "
+                    "VALUES (?, ?, ?, ?)", (key, now, now, response)
+                )
+                # Trim the least recently used rows beyond the disk limit
+                self._db.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses "
+                    "ORDER BY accessed DESC LIMIT -1 OFFSET ?)", (self.max_disk_entries,)
+                )
+                self._db.commit()
+
+    def _put_memory(self, key: str, created: float, response: str):
+        self._memory[key] = (created, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        """Drop every cached response"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters plus current sizes"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+            if self._db is not None:
+                stats["disk_entries"] = self._db.execute(
+                    "SELECT COUNT(*) FROM responses").fetchone()[0]
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+            return stats
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,186 @@
+import re
+from typing import Any, Dict, List, Optional
+
+FENCE = re.compile(r'^\s*(`{3,}|~{3,})\s*([\w+#.-]*)')
+LIST_ITEM = re.compile(r'^(\s*)(?:[-*+]|\d+[.)])\s+(.*)')
+HEADING = re.compile(r'^\s*(?:#{1,6}\s+(.+?)\s*#*|\*\*([^*]+?)\*\*:?|([A-Z][^.!?`]{0,60}):)\s*$')
+
+SEVERITIES = {
+    'critical': 'critical', 'blocker': 'critical', 'security': 'critical',
+    'high': 'high', 'major': 'high', 'error': 'high', 'bug': 'high',
+    'medium': 'medium', 'moderate': 'medium', 'warning': 'medium',
+    'low': 'low', 'minor': 'low', 'nit': 'low', 'style': 'low', 'suggestion': 'low',
+    'info': 'info', 'note': 'info',
+}
+# "Severity: high" anywhere, or a tag opening the item: "**High**:", "[minor]", "(low) -"
+SEVERITY_FIELD = re.compile(r'severity\W{0,3}(\w+)', re.IGNORECASE)
+SEVERITY_TAG = re.compile(r'^(?:\[\s*(\w+)\s*\]|\(\s*(\w+)\s*\)|\*\*\s*(\w+)\s*:?\s*\*\*'
+                          r'|(\w+)\s*[:\-–—|])')
+LINE_REF = re.compile(r'\b(?:lines?|L)\s*(\d+)', re.IGNORECASE)
+
+# Sections of a review whose heading implies a severity for items without one
+SECTION_SEVERITIES = (('bug', 'high'), ('error', 'high'), ('security', 'critical'),
+                      ('performance', 'medium'), ('practice', 'low'), ('quality', 'low'),
+                      ('style', 'low'), ('readab', 'low'))
+FIX_SECTIONS = ('fix', 'solution', 'suggest', 'change')
+
+class ResponseParser:
+    """Incremental parser turning a streamed model response into structure.
+
+    feed() takes chunks as they arrive and returns the elements each chunk
+    completed; close() flushes the rest. Elements are dicts with a "type":
+
+      code_block  {"language", "code"}          on the closing fence
+      issue       {"issue", "severity", "line"} review list items, when the item ends
+      fix         {"fix", "code", "language", "confidence"}
+                  debugging: a code block with the prose that introduced it,
+                  or an item under a "Fixes"/"Solution" heading with no code
+
+    Only the unfinished last line is buffered, so the cost of a response is
+    one pass over its lines however it was chunked.
+    """
+
+    def __init__(self, task_type: str):
+        self.task_type = task_type
+        self.code_blocks: List[Dict[str, Any]] = []
+        self.issues: List[Dict[str, Any]] = []
+        self.fixes: List[Dict[str, Any]] = []
+        self._buffer = ''
+        self._fence: Optional[str] = None  # opening fence while inside a code block
+        self._language = ''
+        self._code: List[str] = []
+        self._unit: List[str] = []  # lines of the list item or paragraph being read
+        self._unit_is_item = False
+        self._section = ''
+        self._description = ''  # last finished prose, introducing the next code block
+        self._pending_fix = False  # _description is a fix item not yet emitted
+
+    @classmethod
+    def parse(cls, task_type: str, response: str) -> "ResponseParser":
+        """Parser that has consumed a complete response"""
+        parser = cls(task_type)
+        parser.feed(response)
+        parser.close()
+        return parser
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        if '\n' not in text:
+            self._buffer += text
+            return self._closing_fence()
+        lines = (self._buffer + text).split('\n')
+        self._buffer = lines.pop()
+        elements = []
+        for line in lines:
+            elements.extend(self._line(line))
+        return elements + self._closing_fence()
+
+    def close(self) -> List[Dict[str, Any]]:
+        """Flush the last line and any unterminated item or code block"""
+        elements = self._line(self._buffer) if self._buffer else []
+        self._buffer = ''
+        if self._fence is not None:
+            elements.extend(self._end_code())
+        elements.extend(self._end_unit())
+        elements.extend(self._flush_pending_fix())
+        return elements
+
+    def _closing_fence(self) -> List[Dict[str, Any]]:
+        # A bare fence is unambiguous inside a block; don't wait for its newline
+        if self._fence is not None and self._buffer.strip() == self._fence:
+            self._buffer = ''
+            return self._end_code()
+        return []
+
+    def _line(self, line: str) -> List[Dict[str, Any]]:
+        if self._fence is not None:
+            stripped = line.strip()
+            if stripped.startswith(self._fence) and stripped == self._fence[0] * len(stripped):
+                return self._end_code()
+            self._code.append(line)
+            return []
+
+        fence = FENCE.match(line)
+        if fence:
+            elements = self._end_unit()
+            self._fence, self._language, self._code = fence.group(1), fence.group(2).lower(), []
+            return elements
+
+        if not line.strip():
+            return self._end_unit()
+
+        item = LIST_ITEM.match(line)
+        if item and not (self._unit_is_item and len(item.group(1)) >= 2):
+            elements = self._end_unit() + self._flush_pending_fix()
+            self._unit, self._unit_is_item = [item.group(2).strip()], True
+            return elements
+
+        heading = HEADING.match(line)
+        # Bold and "Title:" lines inside an item are part of it; "## Title" never is
+        if heading and (heading.group(1) or not self._unit_is_item):
+            elements = self._end_unit() + self._flush_pending_fix()
+            self._section = next(g for g in heading.groups() if g)
+            self._description = ''
+            return elements
+
+        # Continuation of the current item/paragraph, or a new paragraph
+        if not self._unit:
+            elements = self._flush_pending_fix()
+            self._unit, self._unit_is_item = [line.strip()], False
+            return elements
+        self._unit.append(line.strip())
+        return []
+
+    def _end_code(self) -> List[Dict[str, Any]]:
+        block = {"type": "code_block", "language": self._language, "code": '\n'.join(self._code)}
+        self._fence, self._code = None, []
+        self.code_blocks.append(block)
+        elements = [block]
+        if self.task_type == "debugging":
+            fix = {"type": "fix", "fix": self._description or self._section,
+                   "code": block["code"], "language": block["language"], "confidence": "medium"}
+            self.fixes.append(fix)
+            elements.append(fix)
+            self._description, self._pending_fix = '', False
+        return elements
+
+    def _end_unit(self) -> List[Dict[str, Any]]:
+        if not self._unit:
+            return []
+        text = '\n'.join(self._unit)
+        is_item = self._unit_is_item
+        self._unit, self._unit_is_item = [], False
+        if self.task_type == "code_review" and is_item:
+            issue = {"type": "issue", "issue": text, "severity": self._severity(text),
+                     "line": self._line_ref(text)}
+            self.issues.append(issue)
+            return [issue]
+        if self.task_type == "debugging":
+            # Emitted with the code block that usually follows, else on the next prose
+            self._description = text
+            self._pending_fix = is_item and any(word in self._section.lower() for word in FIX_SECTIONS)
+        return []
+
+    def _flush_pending_fix(self) -> List[Dict[str, Any]]:
+        if not self._pending_fix:
+            return []
+        self._pending_fix = False
+        fix = {"type": "fix", "fix": self._description, "code": "", "language": "",
+               "confidence": "medium"}
+        self.fixes.append(fix)
+        return [fix]
+
+    def _severity(self, text: str) -> str:
+        for match in (SEVERITY_FIELD.search(text), SEVERITY_TAG.match(text)):
+            word = match.group(match.lastindex).lower() if match else ''
+            if word in SEVERITIES:
+                return SEVERITIES[word]
+        section = self._section.lower()
+        for word, severity in SECTION_SEVERITIES:
+            if word in section:
+                return severity
+        return "medium"
+
+    @staticmethod
+    def _line_ref(text: str) -> Optional[int]:
+        match = LINE_REF.search(text)
+        return int(match.group(1)) if match else None
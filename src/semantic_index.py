@@ -0,0 +1,494 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import httpx
+import numpy as np
+from code_parser import CodeParser
+from line_index import LineIndex
+
+STORE_VERSION = 1
+
+# Characters of a chunk sent for embedding (embedding models truncate anyway)
+MAX_EMBED_CHARS = 6000
+
+# Files chunked (and their new chunks embedded) per step of a build
+FILES_PER_STEP = 64
+
+@dataclass(frozen=True, slots=True)
+class Chunk:
+    path: str
+    start_line: int  # 0-based, inclusive
+    end_line: int    # exclusive
+    text: str
+    content_hash: str
+
+@dataclass(frozen=True, slots=True)
+class SearchHit:
+    path: str
+    start_line: int
+    end_line: int
+    score: float
+
+def chunk_code(parser: CodeParser, rel_path: str, content: str, language: str,
+               max_lines: int = 60) -> List[Chunk]:
+    """Split a file along parse_functions boundaries.
+
+    Each top-level function or method becomes a chunk; code between them
+    (imports, class headers, module statements) forms chunks of its own,
+    with short gaps such as decorators joined to the definition after
+    them. Anything longer than max_lines is split.
+    """
+    lines = LineIndex(content)
+    total = len(lines)
+    functions = parser.parse_functions(content, language)
+    if functions and 'start_line' in functions[0]:
+        ranges = sorted((f['start_line'], f['end_line'] + 1) for f in functions)
+    else:
+        # Regex fallback only knows where definitions start
+        starts = sorted({lines.line_of(f['start']) for f in functions})
+        ranges = list(zip(starts, starts[1:] + [total]))
+
+    spans: List[Tuple[int, int]] = []
+    position = 0
+    for start, end in ranges:
+        if end <= position:
+            continue  # nested in the previous definition
+        start = max(start, position)
+        if start - position >= 3:
+            spans.append((position, start))
+        else:
+            start = position
+        spans.append((start, end))
+        position = end
+    if position < total:
+        spans.append((position, total))
+
+    chunks = []
+    for start, end in spans:
+        for first in range(start, end, max_lines):
+            last = min(end, first + max_lines)
+            text = lines.slice_lines(first, last)
+            if text.strip():
+                digest = hashlib.blake2b(f"{rel_path}\n{text}".encode('utf-8', 'surrogatepass'),
+                                         digest_size=16).hexdigest()
+                chunks.append(Chunk(rel_path, first, last, text, digest))
+    return chunks
+
+class VectorStore:
+    """Unit-length float32 vectors in one append-only file, memory-mapped.
+
+    Row metadata lives in a JSON file beside it. Replacing a file's chunks
+    appends new rows and marks the old ones dead; dead rows are compacted
+    away on save once they outnumber the live ones. Without a directory
+    everything is kept in memory.
+    """
+
+    def __init__(self, directory: Optional[str] = None, model: str = "",
+                 project_root: str = ""):
+        self.directory = Path(directory) if directory else None
+        self.model = model
+        self.project_root = project_root
+        self.dim = 0
+        # row -> (path, start_line, end_line, content_hash); None once dead
+        self.rows: List[Optional[Tuple[str, int, int, str]]] = []
+        # path -> (mtime_ns, size, rows)
+        self.files: Dict[str, Tuple[int, int, List[int]]] = {}
+        self.by_hash: Dict[str, int] = {}
+        self.live = 0
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._dead = np.zeros(0, dtype=bool)
+        if self.directory is not None and not self._load() and self.vectors_path.exists():
+            self.vectors_path.unlink()  # rows it holds are unaccounted for
+
+    @property
+    def vectors_path(self) -> Path:
+        return self.directory / "vectors.f32"
+
+    @property
+    def meta_path(self) -> Path:
+        return self.directory / "chunks.json"
+
+    def vector(self, row: int) -> np.ndarray:
+        return np.array(self._vectors[row])
+
+    def add_file(self, path: str, mtime_ns: int, size: int,
+                 chunks: List[Chunk], vectors: np.ndarray):
+        """Replace a file's rows with one row per chunk"""
+        self.remove_file(path)
+        first = len(self.rows)
+        self._append(vectors)
+        rows = list(range(first, first + len(chunks)))
+        for row, chunk in zip(rows, chunks):
+            self.rows.append((path, chunk.start_line, chunk.end_line, chunk.content_hash))
+            self.by_hash[chunk.content_hash] = row
+        self.live += len(rows)
+        self.files[path] = (mtime_ns, size, rows)
+
+    def remove_file(self, path: str):
+        entry = self.files.pop(path, None)
+        if entry is None:
+            return
+        for row in entry[2]:
+            content_hash = self.rows[row][3]
+            if self.by_hash.get(content_hash) == row:
+                del self.by_hash[content_hash]
+            self.rows[row] = None
+            self._dead[row] = True
+        self.live -= len(entry[2])
+
+    def _append(self, vectors: np.ndarray):
+        if not len(vectors):
+            return
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if not self.dim:
+            self.dim = vectors.shape[1]
+        if self.directory is None:
+            existing = self._vectors if len(self._vectors) else np.zeros((0, self.dim), np.float32)
+            self._vectors = np.concatenate([existing, vectors])
+        else:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(self.vectors_path, 'ab') as f:
+                f.write(vectors.tobytes())
+            self._map(len(self.rows) + len(vectors))
+        self._dead = np.concatenate([self._dead, np.zeros(len(vectors), dtype=bool)])
+
+    def _map(self, count: int):
+        if count and self.dim:
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r',
+                                      shape=(count, self.dim))
+        else:
+            self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+
+    def top_k(self, query: np.ndarray, k: int,
+              exclude: Optional[str] = None) -> List[SearchHit]:
+        """Live rows most similar to a unit-length query vector"""
+        if not self.live or query.shape[0] != self.dim:
+            return []
+        scores = np.asarray(self._vectors @ query, dtype=np.float32)
+        scores[self._dead] = -np.inf
+        if exclude is not None and exclude in self.files:
+            scores[self.files[exclude][2]] = -np.inf
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        hits = []
+        for row in best[np.argsort(-scores[best])]:
+            if not np.isfinite(scores[row]):
+                break
+            path, start, end, _ = self.rows[row]
+            hits.append(SearchHit(path, start, end, float(scores[row])))
+        return hits
+
+    def _load(self) -> bool:
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if (data.get("version") != STORE_VERSION or data.get("model") != self.model
+                or data.get("root") != self.project_root):
+            return False
+        self.dim = data["dim"]
+        rows = [tuple(row) if row else None for row in data["rows"]]
+        try:
+            stored = os.path.getsize(self.vectors_path) // (4 * self.dim) if self.dim else 0
+        except OSError:
+            stored = 0
+        if stored < len(rows):
+            return False  # vectors lost; start over
+        if stored > len(rows):
+            # Rows appended after the last save: drop them
+            with open(self.vectors_path, 'r+b') as f:
+                f.truncate(len(rows) * 4 * self.dim)
+        self.rows = rows
+        self.files = {path: (mtime, size, file_rows)
+                      for path, (mtime, size, file_rows) in data["files"].items()}
+        self._dead = np.array([row is None for row in rows], dtype=bool)
+        self.live = len(rows) - int(self._dead.sum())
+        self.by_hash = {row[3]: i for i, row in enumerate(rows) if row is not None}
+        self._map(len(rows))
+        return True
+
+    def save(self):
+        if self.directory is None:
+            return
+        if len(self.rows) - self.live > max(1024, self.live):
+            self._compact()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.meta_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": STORE_VERSION, "model": self.model, "root": self.project_root,
+                       "dim": self.dim, "rows": self.rows, "files": self.files},
+                      f, separators=(',', ':'))
+        os.replace(tmp_path, self.meta_path)
+
+    def _compact(self):
+        keep = np.flatnonzero(~self._dead)
+        remap = {int(old): new for new, old in enumerate(keep)}
+        vectors = np.array(self._vectors[keep], dtype=np.float32)
+        tmp_path = self.vectors_path.with_suffix('.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(vectors.tobytes())
+        self._vectors = np.zeros((0, self.dim), dtype=np.float32)  # release the old mapping
+        os.replace(tmp_path, self.vectors_path)
+        self.rows = [self.rows[old] for old in keep]
+        self.files = {path: (mtime, size, [remap[row] for row in rows])
+                      for path, (mtime, size, rows) in self.files.items()}
+        self.by_hash = {row[3]: i for i, row in enumerate(self.rows)}
+        self._dead = np.zeros(len(self.rows), dtype=bool)
+        self._map(len(self.rows))
+
+    def __len__(self) -> int:
+        return self.live
+
+class SemanticIndex:
+    """Embedding index over the project's code chunks, for retrieval.
+
+    Building syncs with the ProjectIndex like ImportGraph does: only files
+    whose (mtime_ns, size) changed are re-chunked, and only chunks whose
+    content hash is new are sent to the embeddings endpoint, in batches of
+    batch_size with at most `concurrency` requests in flight. Builds run
+    in the background; searches use whatever has been indexed so far.
+    """
+
+    def __init__(self, context_manager, client, model: str = "nomic-embed-text",
+                 store_dir: Optional[str] = None, parser: Optional[CodeParser] = None,
+                 batch_size: int = 32, concurrency: int = 2, max_chunk_lines: int = 60,
+                 query_prefix: str = "", document_prefix: str = "",
+                 top_k: int = 5, retrieval_budget: int = 1024,
+                 chars_per_token: float = 4.0, retry_after: float = 60.0):
+        self.context_manager = context_manager
+        self.client = client
+        self.model = model
+        self.parser = parser or CodeParser()
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_chunk_lines = max_chunk_lines
+        self.query_prefix = query_prefix
+        self.document_prefix = document_prefix
+        self.top_k = top_k
+        self.retrieval_budget = retrieval_budget
+        self.chars_per_token = chars_per_token
+        self.retry_after = retry_after
+        self.store = VectorStore(store_dir, model, str(context_manager.index.project_root))
+        self._synced_generation = -1
+        self._build_task: Optional[asyncio.Task] = None
+        self._failed_at: Optional[float] = None
+        self.stats = {"files_chunked": 0, "chunks_embedded": 0, "chunks_reused": 0,
+                      "embed_requests": 0, "embed_failures": 0, "searches": 0}
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], context_manager, client,
+                    parser: Optional[CodeParser] = None) -> Optional["SemanticIndex"]:
+        settings = config.get("semantic_index") or {}
+        processing = config.get("code_processing") or {}
+        if not settings.get("enabled", True):
+            return None
+        store_dir = Path(settings.get("path", ".ai-assistant/semantic"))
+        if not store_dir.is_absolute():
+            store_dir = context_manager.project_root / store_dir
+        return cls(
+            context_manager, client,
+            model=settings.get("model", "nomic-embed-text"),
+            parser=parser,
+            store_dir=str(store_dir) if settings.get("persist", True) else None,
+            batch_size=settings.get("batch_size", 32),
+            concurrency=settings.get("concurrency", 2),
+            max_chunk_lines=settings.get("max_chunk_lines", 60),
+            query_prefix=settings.get("query_prefix", ""),
+            document_prefix=settings.get("document_prefix", ""),
+            top_k=settings.get("top_k", 5),
+            retrieval_budget=settings.get("retrieval_budget", 1024),
+            chars_per_token=processing.get("chars_per_token", 4.0),
+            retry_after=settings.get("retry_after", 60.0)
+        )
+
+    @property
+    def available(self) -> bool:
+        """False for retry_after seconds after the embeddings endpoint failed"""
+        return self._failed_at is None or time.monotonic() - self._failed_at >= self.retry_after
+
+    def start_build(self) -> Optional[asyncio.Task]:
+        """Sync the index in the background unless a sync is running or due later"""
+        if self._build_task is None or self._build_task.done():
+            if not self.available:
+                return None
+            index = self.context_manager.index
+            index.refresh()
+            index.restat_in_background()  # edits in place show up in a later call
+            if self._synced_generation == index.generation:
+                return None
+            self._build_task = asyncio.ensure_future(self._build_in_background())
+        return self._build_task
+
+    async def _build_in_background(self):
+        try:
+            await self.ensure_built()
+        except httpx.HTTPError:
+            pass  # recorded in stats; retried after retry_after
+
+    async def ensure_built(self, progress: Optional[Callable[[int, int], None]] = None):
+        """Bring the index up to date with the project; raises httpx.HTTPError"""
+        index = self.context_manager.index
+        index.refresh()
+        generation = index.generation
+        current = {}
+        for rel_path in index.all_files():
+            if self.parser.detect_language(rel_path) != 'text':
+                current[rel_path] = index.file_info(rel_path)
+        for rel_path in set(self.store.files) - set(current):
+            self.store.remove_file(rel_path)
+        changed = [rel_path for rel_path, info in current.items()
+                   if info is not None and self.store.files.get(rel_path, (None, None))[:2] != info]
+
+        try:
+            for step in range(0, len(changed), FILES_PER_STEP):
+                files = changed[step:step + FILES_PER_STEP]
+                chunked = await asyncio.to_thread(self._chunk_files, files)
+                await self._index_chunks(chunked)
+                self.store.save()
+                if progress is not None:
+                    progress(min(step + FILES_PER_STEP, len(changed)), len(changed))
+        except httpx.HTTPError:
+            self._failed_at = time.monotonic()
+            self.stats["embed_failures"] += 1
+            self.store.save()
+            raise
+        self._failed_at = None
+        self._synced_generation = generation
+        self.store.save()
+
+    def _chunk_files(self, rel_paths: List[str]) -> List[Tuple[str, int, int, List[Chunk]]]:
+        """Runs on a worker thread, so it parses with a parser of its own: the
+        shared one's tree and line-index caches are for the event loop"""
+        root = self.context_manager.index.project_root
+        max_size = self.context_manager.max_file_size
+        parser = CodeParser()
+        chunked = []
+        for rel_path in rel_paths:
+            abs_path = root / rel_path
+            try:
+                st = os.stat(abs_path)
+                if st.st_size > max_size:
+                    continue
+                with open(abs_path, 'r', encoding='utf-8', errors='replace') as f:
+                    content = f.read()
+            except OSError:
+                continue
+            language = parser.detect_language(rel_path)
+            chunks = chunk_code(parser, rel_path, content, language, self.max_chunk_lines)
+            chunked.append((rel_path, st.st_mtime_ns, st.st_size, chunks))
+            self.stats["files_chunked"] += 1
+        return chunked
+
+    async def _index_chunks(self, chunked: List[Tuple[str, int, int, List[Chunk]]]):
+        """Embed the chunks not already in the store, then swap in each file's rows"""
+        known: Dict[str, np.ndarray] = {}
+        missing: Dict[str, Chunk] = {}
+        for _, _, _, chunks in chunked:
+            for chunk in chunks:
+                row = self.store.by_hash.get(chunk.content_hash)
+                if row is not None:
+                    known[chunk.content_hash] = self.store.vector(row)
+                else:
+                    missing.setdefault(chunk.content_hash, chunk)
+        self.stats["chunks_reused"] += sum(len(c) for *_, c in chunked) - len(missing)
+
+        if missing:
+            texts = [f"{self.document_prefix}{chunk.path}\n{chunk.text}"[:MAX_EMBED_CHARS]
+                     for chunk in missing.values()]
+            vectors = await self._embed_batches(texts)
+            known.update(zip(missing, vectors))
+            self.stats["chunks_embedded"] += len(missing)
+
+        for rel_path, mtime_ns, size, chunks in chunked:
+            if chunks:
+                vectors = np.stack([known[chunk.content_hash] for chunk in chunks])
+            else:
+                vectors = np.zeros((0, self.store.dim), dtype=np.float32)
+            self.store.add_file(rel_path, mtime_ns, size, chunks, vectors)
+
+    async def _embed_batches(self, texts: List[str]) -> np.ndarray:
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def embed(batch: List[str]) -> np.ndarray:
+            async with slots:
+                self.stats["embed_requests"] += 1
+                return self._normalize(await self.client.embed(batch, self.model))
+
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        return np.concatenate(await asyncio.gather(*(embed(batch) for batch in batches)))
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    async def search(self, query: str, k: int = 5,
+                     exclude: Optional[str] = None) -> List[SearchHit]:
+        """Chunks most similar to query; [] while the embeddings endpoint is failing.
+
+        Long-lived processes re-embed edited files in the background; one-shot
+        runs only search what is already stored.
+        """
+        if self.context_manager.background_builds:
+            self.start_build()
+        if not self.store.live or not self.available:
+            return []
+        self.stats["searches"] += 1
+        try:
+            vector = self._normalize(await self.client.embed(
+                [f"{self.query_prefix}{query}"], self.model))[0]
+        except httpx.HTTPError:
+            self._failed_at = time.monotonic()
+            self.stats["embed_failures"] += 1
+            return []
+        return self.store.top_k(vector, k, exclude)
+
+    async def retrieve(self, query: str, exclude_file: Optional[str] = None,
+                       budget_tokens: Optional[int] = None) -> List[Tuple[str, str]]:
+        """(label, code) snippets for the best hits that fit in the retrieval budget"""
+        if budget_tokens is None:
+            budget_tokens = self.retrieval_budget
+        exclude = self.context_manager.index.relative(exclude_file) if exclude_file else None
+        snippets = []
+        used = 0
+        root = self.context_manager.index.project_root
+        for hit in await self.search(query, self.top_k, exclude):
+            abs_path = str(root / hit.path)
+            embedded = self.store.files.get(hit.path)
+            try:
+                st = os.stat(abs_path)
+            except OSError:
+                continue
+            if embedded is None or (embedded[0], embedded[1]) != (st.st_mtime_ns, st.st_size):
+                continue  # edited since it was embedded: its line ranges no longer apply
+            content = self.context_manager.read_file(abs_path)
+            if content is None:
+                continue
+            lines = self.parser.line_index(content, abs_path)
+            code = lines.slice_lines(hit.start_line, min(hit.end_line, len(lines)))
+            tokens = math.ceil(len(code) / self.chars_per_token)
+            if used + tokens > budget_tokens:
+                continue
+            used += tokens
+            snippets.append((f"{hit.path} (lines {hit.start_line + 1}-{hit.end_line})", code))
+        return snippets
+
+    def close(self):
+        if self._build_task is not None:
+            self._build_task.cancel()
+        self.store.save()
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["chunks"] = self.store.live
+        stats["files"] = len(self.store.files)
+        stats["available"] = self.available
+        return stats
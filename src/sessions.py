@@ -0,0 +1,152 @@
+import time
+import asyncio
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional
+
+DEFAULT_SESSION = "default"
+
+@dataclass(frozen=True, slots=True)
+class HistoryEntry:
+    """One exchange. prompt is the user message exactly as sent in a
+    multi-turn conversation (so replaying it keeps the prefix stable), and
+    empty for stateless requests, which keep no file content. code_hash
+    identifies the code window and selection that prompt carried, if any."""
+    user_input: str
+    task_type: str
+    response: str
+    file_path: str
+    content_hash: str
+    timestamp: float
+    prompt: str = ""
+    code_hash: str = ""
+
+    @property
+    def size(self) -> int:
+        return len(self.user_input) + len(self.response) + len(self.prompt)
+
+class SessionHistory:
+    """Most recent exchanges, capped by count and by size.
+
+    Sizes are counted in characters, which for (mostly ASCII) code and
+    prose is the byte size CPython stores them in.
+    """
+
+    __slots__ = ("entries", "bytes", "max_entries", "max_bytes", "last_used",
+                 "summary", "summarizing")
+
+    def __init__(self, max_entries: int = 10, max_bytes: int = 64 * 1024):
+        self.entries: Deque[HistoryEntry] = deque()
+        self.bytes = 0
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.last_used = time.monotonic()
+        # Running summary of exchanges no longer kept verbatim, and the
+        # task updating it (see ConversationManager)
+        self.summary = ""
+        self.summarizing: Optional[asyncio.Future] = None
+
+    def append(self, entry: HistoryEntry) -> List[HistoryEntry]:
+        """Add an entry; returns the entries evicted to stay within limits"""
+        self.entries.append(entry)
+        self.bytes += entry.size
+        evicted = []
+        # Always keep the newest entry, even if it alone exceeds max_bytes
+        while len(self.entries) > 1 and (len(self.entries) > self.max_entries
+                                         or self.bytes > self.max_bytes):
+            evicted.append(self.popleft())
+        return evicted
+
+    def popleft(self) -> HistoryEntry:
+        entry = self.entries.popleft()
+        self.bytes -= entry.size
+        return entry
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+        self.summary = ""
+        if self.summarizing is not None:
+            self.summarizing.cancel()
+            self.summarizing = None
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+class SessionStore:
+    """Per-session histories with LRU and idle-time eviction.
+
+    Sessions idle for longer than idle_timeout seconds are dropped, and the
+    least recently used ones go first once max_sessions is reached, so a
+    long-running server holds a bounded amount of history.
+    """
+
+    def __init__(self, max_sessions: int = 10000, idle_timeout: float = 3600.0,
+                 max_entries: int = 10, max_bytes: int = 64 * 1024):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sessions: "OrderedDict[str, SessionHistory]" = OrderedDict()
+        self.stats = {"created": 0, "evicted_idle": 0, "evicted_lru": 0}
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "SessionStore":
+        sessions = config.get("sessions") or {}
+        return cls(
+            max_sessions=sessions.get("max_sessions", 10000),
+            idle_timeout=sessions.get("idle_timeout", 3600.0),
+            max_entries=sessions.get("history_max_entries", 10),
+            max_bytes=sessions.get("history_max_bytes", 64 * 1024)
+        )
+
+    def get(self, session_id: Optional[str] = None) -> SessionHistory:
+        """History for a session, created on first use"""
+        session_id = session_id or DEFAULT_SESSION
+        now = time.monotonic()
+        history = self._sessions.get(session_id)
+        if history is None:
+            self.evict_idle(now)
+            history = SessionHistory(self.max_entries, self.max_bytes)
+            self._sessions[session_id] = history
+            self.stats["created"] += 1
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.stats["evicted_lru"] += 1
+        else:
+            self._sessions.move_to_end(session_id)
+        history.last_used = now
+        return history
+
+    def peek(self, session_id: Optional[str] = None) -> Optional[SessionHistory]:
+        """History for a session without creating or touching it"""
+        return self._sessions.get(session_id or DEFAULT_SESSION)
+
+    def evict_idle(self, now: Optional[float] = None):
+        """Drop sessions idle longer than idle_timeout (oldest are at the front)"""
+        if not self.idle_timeout:
+            return
+        deadline = (now or time.monotonic()) - self.idle_timeout
+        while self._sessions:
+            session_id, history = next(iter(self._sessions.items()))
+            if history.last_used >= deadline:
+                break
+            del self._sessions[session_id]
+            self.stats["evicted_idle"] += 1
+
+    def discard(self, session_id: str):
+        history = self._sessions.pop(session_id, None)
+        if history is not None:
+            history.clear()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["sessions"] = len(self._sessions)
+        stats["history_bytes"] = sum(h.bytes + len(h.summary) for h in self._sessions.values())
+        return stats
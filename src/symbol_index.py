@@ -0,0 +1,250 @@
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+from code_parser import CodeParser
+from project_index import ProjectIndex
+
+SYMBOLS_VERSION = 2
+
+IDENTIFIER = re.compile(rb'[A-Za-z_][A-Za-z0-9_]*')
+
+# Keywords shared by the indexed languages; too common to be worth a posting
+KEYWORDS = frozenset({
+    'and', 'as', 'async', 'await', 'break', 'case', 'catch', 'class', 'const',
+    'continue', 'def', 'default', 'do', 'elif', 'else', 'enum', 'except', 'export',
+    'extends', 'false', 'False', 'finally', 'fn', 'for', 'from', 'func', 'function',
+    'if', 'impl', 'implements', 'import', 'in', 'interface', 'is', 'lambda', 'let',
+    'mut', 'new', 'nil', 'None', 'not', 'null', 'or', 'package', 'pass', 'private',
+    'protected', 'pub', 'public', 'raise', 'return', 'self', 'static', 'struct',
+    'super', 'switch', 'this', 'throw', 'true', 'True', 'try', 'type', 'use', 'var',
+    'void', 'while', 'with', 'yield',
+})
+
+def identifiers(data: bytes) -> Set[str]:
+    """Distinct identifier tokens in source bytes, keywords and 1-char names excluded"""
+    tokens = {token.decode('ascii') for token in IDENTIFIER.findall(data) if len(token) > 1}
+    return tokens - KEYWORDS
+
+def file_definitions(parser: CodeParser, code: str, language: str,
+                     outline: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> List[list]:
+    """[name, kind, start_byte, end_byte, line, signature, scope] for each class
+    and function, from a syntax tree outline or the parser's regex fallback.
+    Pass the outline if the caller has already parsed the code.
+    """
+    if outline is None:
+        # No file_path: the editor's tree cache is left alone
+        tree = parser.get_tree(code, language)
+        outline = tree.outline() if tree is not None else None
+    if outline is not None:
+        entries = outline['classes'] + outline['functions']
+    else:
+        entries = parser.parse_classes(code, language) + parser.parse_functions(code, language)
+    definitions = []
+    for entry in entries:
+        if not entry.get('name'):
+            continue
+        if 'start_byte' in entry:
+            start, end, line = entry['start_byte'], entry['end_byte'], entry['start_line']
+        else:
+            # Regex fallback reports character offsets of the header only
+            start = len(code[:entry['start']].encode('utf-8'))
+            end = start + len(entry['signature'].encode('utf-8'))
+            line = code.count('\n', 0, entry['start'])
+        definitions.append([entry['name'], entry.get('kind', 'function'), start, end, line,
+                            entry['signature'].strip(), entry.get('scope', '')])
+    return sorted(definitions, key=lambda d: d[2])
+
+class SymbolIndex:
+    """Inverted index from identifiers to the files using them, plus definitions.
+
+    Definitions come from CodeParser.parse_functions/parse_classes and are
+    stored with byte ranges. Usages are posted per file; byte ranges of the
+    occurrences are found on demand by scanning only the posted files, which
+    keeps the index to one entry per (identifier, file). Like ImportGraph,
+    each file remembers the (mtime_ns, size) it was indexed at and only
+    changed files are re-read.
+    """
+
+    def __init__(self, index: ProjectIndex, parser: Optional[CodeParser] = None,
+                 symbols_path: Optional[str] = None, max_file_size: int = 1024 * 1024):
+        self.index = index
+        self.parser = parser or CodeParser()
+        self.symbols_path = Path(symbols_path) if symbols_path else None
+        self.max_file_size = max_file_size
+        # rel_path -> (mtime_ns, size, definitions, tokens); a definition is
+        # [name, kind, start_byte, end_byte, line, signature, scope]
+        self.files: Dict[str, Tuple[int, int, List[list], List[str]]] = {}
+        self.postings: Dict[str, Set[str]] = {}
+        self.definitions_by_name: Dict[str, List[Tuple[str, list]]] = {}
+        self._synced_generation = -1
+        self._lock = threading.RLock()
+        self.stats = {"indexed": 0, "lookups": 0, "loaded_from_disk": False}
+
+        if self.symbols_path is not None:
+            self._load()
+
+    def ensure_built(self):
+        """Sync with the project index, re-reading only new or changed files"""
+        with self._lock:
+            self.index.refresh()
+            if self._synced_generation == self.index.generation:
+                return
+            current = set()
+            for rel_path in self.index.all_files():
+                if self.parser.detect_language(rel_path) == 'text':
+                    continue
+                current.add(rel_path)
+                if self.is_stale(rel_path):
+                    self.update_file(rel_path)
+            for rel_path in set(self.files) - current:
+                self._remove(rel_path)
+            self._synced_generation = self.index.generation
+            self.save()
+
+    def is_stale(self, rel_path: str) -> bool:
+        """Whether the file is new or changed since it was indexed, per the index"""
+        info = self.index.file_info(rel_path)
+        entry = self.files.get(rel_path)
+        return entry is None or info is None or (entry[0], entry[1]) != info
+
+    def update_file(self, rel_path: str) -> bool:
+        """Re-index one file if it changed on disk; returns True if it did"""
+        with self._lock:
+            abs_path = self.index.project_root / rel_path
+            try:
+                st = os.stat(abs_path)
+            except OSError:
+                if rel_path in self.files:
+                    self._remove(rel_path)
+                    return True
+                return False
+            entry = self.files.get(rel_path)
+            if entry is not None and (entry[0], entry[1]) == (st.st_mtime_ns, st.st_size):
+                return False
+            try:
+                data = b'' if st.st_size > self.max_file_size else abs_path.read_bytes()
+            except OSError:
+                self._remove(rel_path)
+                return True
+            code = data.decode('utf-8', errors='replace')
+            definitions = file_definitions(self.parser, code, self.parser.detect_language(rel_path))
+            self.set_file(rel_path, st.st_mtime_ns, st.st_size, definitions,
+                          sorted(identifiers(data)))
+            return True
+
+    def stored_definitions(self, rel_path: str) -> Optional[List[list]]:
+        """Recorded definitions of one file, re-indexing it first only if it changed"""
+        with self._lock:
+            self.update_file(rel_path)
+            entry = self.files.get(rel_path)
+            return entry[2] if entry is not None else None
+
+    def set_file(self, rel_path: str, mtime_ns: int, size: int,
+                 definitions: List[list], tokens: List[str]):
+        """Record a file's definitions and identifiers, extracted here or by ProjectScanner"""
+        with self._lock:
+            self._remove(rel_path)
+            self._add(rel_path, mtime_ns, size, definitions, tokens)
+            self.stats["indexed"] += 1
+
+    def _add(self, rel_path: str, mtime_ns: int, size: int,
+             definitions: List[list], tokens: List[str]):
+        self.files[rel_path] = (mtime_ns, size, definitions, tokens)
+        for token in tokens:
+            self.postings.setdefault(token, set()).add(rel_path)
+        for definition in definitions:
+            self.definitions_by_name.setdefault(definition[0], []).append((rel_path, definition))
+
+    def _remove(self, rel_path: str):
+        entry = self.files.pop(rel_path, None)
+        if entry is None:
+            return
+        for token in entry[3]:
+            paths = self.postings.get(token)
+            if paths is not None:
+                paths.discard(rel_path)
+                if not paths:
+                    del self.postings[token]
+        for definition in entry[2]:
+            found = self.definitions_by_name.get(definition[0])
+            if found is not None:
+                found[:] = [d for d in found if d[0] != rel_path]
+                if not found:
+                    del self.definitions_by_name[definition[0]]
+
+    def definitions(self, name: str) -> List[Dict[str, Any]]:
+        """Where name is defined: path, kind, byte range, 0-based line, signature and
+        enclosing scope ('' at top level, 'Class' for methods)"""
+        return self.definitions_many([name])[name]
+
+    def definitions_many(self, names: Iterable[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """definitions() of several names with one sync and one lock acquisition"""
+        self.ensure_built()
+        self.stats["lookups"] += 1
+        with self._lock:
+            return {name: [{"path": rel_path, "name": d[0], "kind": d[1], "start_byte": d[2],
+                            "end_byte": d[3], "line": d[4], "signature": d[5], "scope": d[6]}
+                           for rel_path, d in self.definitions_by_name.get(name, ())]
+                    for name in names}
+
+    def files_using(self, name: str) -> List[str]:
+        """Files containing the identifier, from the postings alone"""
+        self.ensure_built()
+        self.stats["lookups"] += 1
+        with self._lock:
+            return sorted(self.postings.get(name, ()))
+
+    def references(self, name: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """Occurrences of name as a whole identifier with their line text, scanning only files that use it"""
+        pattern = re.compile(rb'(?<![A-Za-z0-9_])' + re.escape(name.encode()) + rb'(?![A-Za-z0-9_])')
+        found = []
+        for rel_path in self.files_using(name):
+            try:
+                data = (self.index.project_root / rel_path).read_bytes()
+            except OSError:
+                continue
+            for match in pattern.finditer(data):
+                line_start = data.rfind(b'\n', 0, match.start()) + 1
+                line_end = data.find(b'\n', match.end())
+                text = data[line_start:line_end if line_end != -1 else len(data)]
+                found.append({"path": rel_path, "start_byte": match.start(),
+                              "end_byte": match.end(),
+                              "line": data.count(b'\n', 0, match.start()),
+                              "text": text.decode('utf-8', errors='replace').strip()})
+                if len(found) >= limit:
+                    return found
+        return found
+
+    def _load(self):
+        try:
+            with open(self.symbols_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != SYMBOLS_VERSION or data.get("root") != str(self.index.project_root):
+            return
+        for rel_path, (mtime, size, definitions, tokens) in data.get("files", {}).items():
+            self._add(rel_path, mtime, size, definitions, tokens)
+        self.stats["loaded_from_disk"] = True
+
+    def save(self):
+        """Persist the index next to the project index"""
+        if self.symbols_path is None:
+            return
+        with self._lock:
+            self.symbols_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.symbols_path.with_suffix('.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"version": SYMBOLS_VERSION, "root": str(self.index.project_root),
+                           "files": self.files}, f, separators=(',', ':'))
+            os.replace(tmp_path, self.symbols_path)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["files"] = len(self.files)
+        stats["identifiers"] = len(self.postings)
+        stats["definitions"] = sum(len(d) for d in self.definitions_by_name.values())
+        return stats
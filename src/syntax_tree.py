@@ -0,0 +1,226 @@
+import importlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from line_index import common_prefix, common_suffix
+
+# language -> (grammar module, function returning the language pointer)
+GRAMMARS = {
+    'python': ('tree_sitter_python', 'language'),
+    'javascript': ('tree_sitter_javascript', 'language'),
+    'typescript': ('tree_sitter_typescript', 'language_typescript'),
+    'go': ('tree_sitter_go', 'language'),
+    'rust': ('tree_sitter_rust', 'language'),
+    'java': ('tree_sitter_java', 'language'),
+    'cpp': ('tree_sitter_cpp', 'language'),
+    'c': ('tree_sitter_c', 'language'),
+}
+
+FUNCTION_NODES = {
+    'function_definition', 'function_declaration', 'generator_function_declaration',
+    'method_definition', 'method_declaration', 'constructor_declaration', 'function_item',
+}
+CLASS_NODES = {
+    'class_definition', 'class_declaration', 'interface_declaration', 'enum_declaration',
+    'class_specifier', 'struct_specifier', 'struct_item', 'enum_item', 'trait_item',
+    'impl_item', 'type_spec',
+}
+IMPORT_NODES = {
+    'import_statement', 'import_from_statement', 'import_declaration',
+    'use_declaration', 'preproc_include',
+}
+# Nodes whose children never contain definitions worth visiting
+LEAF_NODES = {'string', 'comment', 'string_literal', 'interpreted_string_literal'}
+
+_languages: Dict[str, Any] = {}
+_languages_lock = threading.Lock()
+_tree_sitter: Any = False  # not imported yet; None once known to be missing
+
+def _bindings():
+    """The tree_sitter module, imported on first use so CLI startup doesn't pay for it"""
+    global _tree_sitter
+    if _tree_sitter is False:
+        try:
+            import tree_sitter
+            _tree_sitter = tree_sitter
+        except ImportError:  # tree-sitter is optional; CodeParser falls back to regexes
+            _tree_sitter = None
+    return _tree_sitter
+
+def load_language(language: str):
+    """Return the tree-sitter Language for a language name, or None if unavailable"""
+    if language not in GRAMMARS:
+        return None
+    with _languages_lock:
+        if language not in _languages:
+            bindings = _bindings()
+            if bindings is None:
+                _languages[language] = None
+                return None
+            module_name, function_name = GRAMMARS[language]
+            try:
+                module = importlib.import_module(module_name)
+                _languages[language] = bindings.Language(getattr(module, function_name)())
+            except (ImportError, AttributeError, ValueError):
+                _languages[language] = None
+        return _languages[language]
+
+def _point(source: bytes, offset: int) -> Tuple[int, int]:
+    """(row, column) of a byte offset, as tree-sitter expects"""
+    row = source.count(b'\n', 0, offset)
+    line_start = source.rfind(b'\n', 0, offset) + 1
+    return row, offset - line_start
+
+class SyntaxTree:
+    """A tree-sitter tree for one file, kept current through incremental edits"""
+
+    def __init__(self, language: str, source: bytes):
+        self.language = language
+        self.parser = _bindings().Parser(load_language(language))
+        self.source = source
+        self.tree = self.parser.parse(source)
+        self._outline: Optional[Dict[str, List[Dict[str, Any]]]] = None
+
+    def edit(self, start_byte: int, old_end_byte: int, new_text: bytes):
+        """Apply one editor edit and re-parse only the affected region"""
+        old_source = self.source
+        new_source = old_source[:start_byte] + new_text + old_source[old_end_byte:]
+        new_end_byte = start_byte + len(new_text)
+
+        self.tree.edit(
+            start_byte=start_byte,
+            old_end_byte=old_end_byte,
+            new_end_byte=new_end_byte,
+            start_point=_point(old_source, start_byte),
+            old_end_point=_point(old_source, old_end_byte),
+            new_end_point=_point(new_source, new_end_byte),
+        )
+        self.source = new_source
+        self.tree = self.parser.parse(new_source, self.tree)
+        self._outline = None
+
+    def update(self, new_source: bytes) -> bool:
+        """Bring the tree up to date with new file contents.
+
+        The changed span is found by trimming the common prefix and suffix,
+        which turns a typical keystroke into a single small edit.
+        """
+        old_source = self.source
+        if new_source == old_source:
+            return False
+
+        limit = min(len(old_source), len(new_source))
+        prefix = common_prefix(old_source, new_source, limit)
+        suffix = common_suffix(old_source, new_source, limit - prefix)
+
+        self.edit(prefix, len(old_source) - suffix, new_source[prefix:len(new_source) - suffix])
+        return True
+
+    def outline(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Functions, classes and imports with byte ranges and enclosing scopes"""
+        if self._outline is None:
+            outline = {'functions': [], 'classes': [], 'imports': []}
+            self._collect(self.tree.root_node, [], outline)
+            self._outline = outline
+        return self._outline
+
+    def _collect(self, node, scope: List[str], outline: Dict[str, List[Dict[str, Any]]]):
+        for child in node.named_children:
+            node_type = child.type
+            if node_type in IMPORT_NODES:
+                outline['imports'].append(self._entry(child, None, scope))
+                continue
+            if node_type in LEAF_NODES:
+                continue
+
+            kind = None
+            if node_type in FUNCTION_NODES:
+                kind = 'method' if scope and scope[-1][0] == 'class' else 'function'
+            elif node_type in CLASS_NODES:
+                kind = 'class'
+            elif node_type == 'variable_declarator':
+                value = child.child_by_field_name('value')
+                if value is not None and value.type in ('arrow_function', 'function', 'function_expression'):
+                    kind = 'function'
+
+            if kind is None:
+                self._collect(child, scope, outline)
+                continue
+
+            name = self._name(child)
+            entry = self._entry(child, name, scope)
+            entry['kind'] = kind
+            outline['classes' if kind == 'class' else 'functions'].append(entry)
+            self._collect(child, scope + [('class' if kind == 'class' else 'function', name)], outline)
+
+    def _name(self, node) -> str:
+        target = node.child_by_field_name('name')
+        if target is None:
+            # C/C++ keep the name inside nested declarators; impl blocks use the type
+            target = node.child_by_field_name('declarator') or node.child_by_field_name('type')
+            while target is not None and target.child_by_field_name('declarator') is not None:
+                target = target.child_by_field_name('declarator')
+        if target is None:
+            return ''
+        return self.source[target.start_byte:target.end_byte].decode('utf-8', errors='replace')
+
+    def _entry(self, node, name: Optional[str], scope: List[str]) -> Dict[str, Any]:
+        body = node.child_by_field_name('body') or node.child_by_field_name('value')
+        if node.type == 'variable_declarator' and body is not None:
+            # f = (a, b) => ...: the signature runs through the function's parameters
+            body = body.child_by_field_name('body') or body
+        header_end = body.start_byte if body is not None and body.start_byte > node.start_byte else node.end_byte
+        if name is None:
+            header_end = node.end_byte
+        signature = self.source[node.start_byte:header_end].decode('utf-8', errors='replace').rstrip(' \t\n{')
+        return {
+            'name': name or '',
+            'signature': signature,
+            'start_byte': node.start_byte,
+            'end_byte': node.end_byte,
+            'header_end_byte': header_end,
+            'start_line': node.start_point[0],
+            'end_line': node.end_point[0],
+            'scope': '.'.join(part for _, part in scope),
+        }
+
+    def scopes_at(self, byte_offset: int) -> List[Dict[str, Any]]:
+        """Definitions enclosing a byte offset, outermost first"""
+        outline = self.outline()
+        enclosing = [entry for entry in outline['classes'] + outline['functions']
+                     if entry['start_byte'] <= byte_offset < entry['end_byte']]
+        return sorted(enclosing, key=lambda entry: entry['start_byte'])
+
+class SyntaxTreeCache:
+    """One SyntaxTree per open file, least recently used trees dropped first"""
+
+    def __init__(self, max_trees: int = 64):
+        self.max_trees = max_trees
+        self._trees: "OrderedDict[str, SyntaxTree]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"full_parses": 0, "incremental_parses": 0, "unchanged": 0}
+
+    def get(self, file_path: str, source: bytes, language: str) -> Optional[SyntaxTree]:
+        """Tree for file_path matching source, updating incrementally if needed"""
+        if load_language(language) is None:
+            return None
+        with self._lock:
+            tree = self._trees.get(file_path)
+            if tree is not None and tree.language == language:
+                self._trees.move_to_end(file_path)
+                if tree.update(source):
+                    self.stats["incremental_parses"] += 1
+                else:
+                    self.stats["unchanged"] += 1
+                return tree
+
+            tree = SyntaxTree(language, source)
+            self.stats["full_parses"] += 1
+            self._trees[file_path] = tree
+            while len(self._trees) > self.max_trees:
+                self._trees.popitem(last=False)
+            return tree
+
+    def discard(self, file_path: str):
+        with self._lock:
+            self._trees.pop(file_path, None)
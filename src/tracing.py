@@ -0,0 +1,235 @@
+import contextvars
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# Histogram buckets for stage durations, in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# The trace of the request running in the current task, so the model client
+# can attach Ollama's own timings without threading a trace through every call
+_current: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("trace", default=None)
+
+class _Span:
+    __slots__ = ("trace", "name", "started")
+
+    def __init__(self, trace: "Trace", name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add(self.name, time.perf_counter() - self.started)
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+class Trace:
+    """Stage durations (seconds) and counters for one request"""
+
+    enabled = True
+
+    def __init__(self, task_type: str):
+        self.task_type = task_type
+        self.started = time.perf_counter()
+        self.timestamp = time.time()
+        self.spans: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {}
+
+    def span(self, name: str) -> _Span:
+        return _Span(self, name)
+
+    def add(self, name: str, seconds: float):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def count(self, name: str, value: int):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def record_ollama(self, reply: Dict[str, Any]):
+        """Pick up the timings Ollama reports in its final /api/generate message"""
+        if "prompt_eval_duration" in reply:
+            self.add("prompt_eval", reply["prompt_eval_duration"] / 1e9)
+        if "eval_duration" in reply:
+            self.add("eval", reply["eval_duration"] / 1e9)
+        if "total_duration" in reply:
+            self.add("ollama_total", reply["total_duration"] / 1e9)
+        for field in ("prompt_eval_count", "eval_count"):
+            if field in reply:
+                self.count(field, reply[field])
+
+    def finish(self) -> float:
+        """Total wall time; derives network time as model time not spent in Ollama"""
+        total = time.perf_counter() - self.started
+        ollama_total = self.spans.pop("ollama_total", None)
+        if ollama_total is not None and "model" in self.spans:
+            self.spans["network"] = max(0.0, self.spans["model"] - ollama_total)
+        self.spans["total"] = total
+        return total
+
+    def to_dict(self) -> Dict[str, Any]:
+        timings = {f"{name}_ms": round(seconds * 1000, 3) for name, seconds in self.spans.items()}
+        timings.update(self.counters)
+        eval_seconds = self.spans.get("eval")
+        if eval_seconds and self.counters.get("eval_count"):
+            timings["eval_tokens_per_sec"] = round(self.counters["eval_count"] / eval_seconds, 1)
+        return timings
+
+class _NullTrace:
+    """Stand-in when tracing is disabled: every call is a cheap no-op"""
+
+    enabled = False
+    __slots__ = ()
+
+    def span(self, name: str) -> _NullSpan:
+        return _NULL_SPAN
+
+    def add(self, name: str, seconds: float):
+        pass
+
+    def count(self, name: str, value: int):
+        pass
+
+    def record_ollama(self, reply: Dict[str, Any]):
+        pass
+
+NULL_TRACE = _NullTrace()
+
+def current_trace():
+    """Trace of the request running in this task, or NULL_TRACE"""
+    return _current.get() or NULL_TRACE
+
+class _Histogram:
+    __slots__ = ("buckets", "count", "sum")
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+
+class Tracer:
+    """Per-request stage timing with Prometheus metrics and a JSONL trace log.
+
+    Disabled by default; when disabled start() hands out NULL_TRACE so the
+    hot path pays for a few no-op method calls and nothing else.
+    """
+
+    def __init__(self, enabled: bool = False, trace_path: Optional[str] = None):
+        self.enabled = enabled
+        self.trace_path = Path(trace_path) if trace_path else None
+        self._trace_file = None
+        self._histograms: Dict[Tuple[str, str], _Histogram] = {}
+        self._counters: Dict[Tuple[str, str], int] = {}
+        self.requests: Dict[str, int] = {}
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], project_root=None) -> "Tracer":
+        tracing = config.get("tracing") or {}
+        trace_path = tracing.get("trace_path")
+        if trace_path and project_root is not None and not Path(trace_path).is_absolute():
+            trace_path = str(Path(project_root) / trace_path)
+        return cls(enabled=tracing.get("enabled", False), trace_path=trace_path)
+
+    def start(self, task_type: str):
+        if not self.enabled:
+            return NULL_TRACE
+        return Trace(task_type)
+
+    def activate(self, trace) -> Optional[contextvars.Token]:
+        """Make trace visible to current_trace() in this task"""
+        if not trace.enabled:
+            return None
+        return _current.set(trace)
+
+    def deactivate(self, token: Optional[contextvars.Token]):
+        if token is None:
+            return
+        try:
+            _current.reset(token)
+        except ValueError:
+            # A streaming generator finalised from another context; the
+            # variable dies with that context anyway
+            pass
+
+    def finish(self, trace, result: Dict[str, Any]):
+        """Close the trace, attach its timings to result and export it"""
+        if not trace.enabled:
+            return
+        trace.finish()
+        timings = trace.to_dict()
+        result["timings"] = timings
+
+        task = trace.task_type
+        self.requests[task] = self.requests.get(task, 0) + 1
+        for stage, seconds in trace.spans.items():
+            key = (stage, task)
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram()
+            histogram.observe(seconds)
+        for name, value in trace.counters.items():
+            key = (name, task)
+            self._counters[key] = self._counters.get(key, 0) + value
+
+        if self.trace_path is not None:
+            self._write({"timestamp": trace.timestamp, "task_type": task, **timings})
+
+    def _write(self, record: Dict[str, Any]):
+        if self._trace_file is None:
+            self.trace_path.parent.mkdir(parents=True, exist_ok=True)
+            self._trace_file = open(self.trace_path, 'a', encoding='utf-8')
+        self._trace_file.write(json.dumps(record) + '\n')
+        self._trace_file.flush()
+
+    def prometheus(self) -> str:
+        """Metrics in the Prometheus text exposition format"""
+        lines: List[str] = [
+            "# HELP ai_assistant_requests_total Requests processed, by task type",
+            "# TYPE ai_assistant_requests_total counter",
+        ]
+        for task, count in sorted(self.requests.items()):
+            lines.append(f'ai_assistant_requests_total{{task_type="{task}"}} {count}')
+
+        lines += [
+            "# HELP ai_assistant_stage_seconds Time spent per request stage",
+            "# TYPE ai_assistant_stage_seconds histogram",
+        ]
+        for (stage, task), histogram in sorted(self._histograms.items()):
+            labels = f'stage="{stage}",task_type="{task}"'
+            for bound, count in zip(BUCKETS, histogram.buckets):
+                lines.append(f'ai_assistant_stage_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'ai_assistant_stage_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f"ai_assistant_stage_seconds_sum{{{labels}}} {histogram.sum:.6f}")
+            lines.append(f"ai_assistant_stage_seconds_count{{{labels}}} {histogram.count}")
+
+        lines += [
+            "# HELP ai_assistant_tokens_total Tokens reported by Ollama",
+            "# TYPE ai_assistant_tokens_total counter",
+        ]
+        for (name, task), value in sorted(self._counters.items()):
+            kind = "prompt" if name == "prompt_eval_count" else "generated"
+            lines.append(f'ai_assistant_tokens_total{{kind="{kind}",task_type="{task}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def close(self):
+        if self._trace_file is not None:
+            self._trace_file.close()
+            self._trace_file = None
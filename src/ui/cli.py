@@ -1,20 +1,116 @@
-import asyncio
 import argparse
+import os
+import shlex
+import sys
 from pathlib import Path
-from assistant import AICodeAssistant, TaskType, CodeContext
-from ollama_client import OllamaClient
-from context_manager import ContextManager
+
+# Everything beyond the standard library (asyncio included) is imported where
+# it is first needed: one-shot invocations from editor and git hooks run
+# thousands of times a day, and when a daemon is running they only need to
+# forward their arguments over a socket.
+
+# command -> (task type value, prompt, progress message, title); cursor at end for completion
+FILE_TASKS = {
+    'review': ("code_review", "Please review this code", "Reviewing code...", "Code Review Results"),
+    'complete': ("code_completion", "Complete this code", "Generating completion...", "Completion"),
+    'debug': ("debugging", "Help debug this code", "Debugging code...", "Debugging Results"),
+    'explain': ("explanation", "Explain this code", "Explaining code...", "Explanation"),
+}
+
+BATCH_TASKS = {
+    'review': ("code_review", "Please review this code"),
+    'explain': ("explanation", "Explain this code"),
+    'document': ("documentation", "Generate documentation for this code"),
+    'debug': ("debugging", "Help debug this code"),
+    'refactor': ("refactoring", "Suggest refactoring improvements"),
+}
+
+# Commands that can be run once from the shell: cli.py review FILE
+ONE_SHOT_COMMANDS = ('review', 'complete', 'debug', 'explain', 'batch', 'find', 'index', 'models')
+
+# References printed by `find` before truncating
+FIND_MAX_REFERENCES = 50
+
+# Session of the interactive prompt; follow-up questions see earlier turns
+INTERACTIVE_SESSION = "interactive"
 
 class CLIInterface:
-    def __init__(self):
-        self.client = OllamaClient()
-        self.context_manager = ContextManager()
-        self.assistant = AICodeAssistant(self.client, self.context_manager)
+    def __init__(self, config: dict = None, project_root: str = None, model: str = None):
+        if config is None:
+            from config import load_config
+            config = load_config()
+        self.config = config
+        self.project_root = project_root
+        self.model = model
+        # One-shot commands (and the daemon serving them) are stateless
+        self.session_id = None
+        self._client = None
+        self._context_manager = None
+        self._assistant = None
+        # Background index builds pay off in long-lived processes only
+        self.background_work = True
+
+    @property
+    def client(self):
+        if self._client is None:
+            from model_router import create_model_client
+            self._client = create_model_client(self.config)
+            if self.model:
+                self._client.model = self.model
+        return self._client
+
+    @property
+    def context_manager(self):
+        if self._context_manager is None:
+            from context_manager import ContextManager
+            self._context_manager = ContextManager.from_config(self.config, self.project_root)
+            self._context_manager.background_builds = self.background_work
+        return self._context_manager
+
+    @property
+    def assistant(self):
+        if self._assistant is None:
+            from assistant import AICodeAssistant
+            self._assistant = AICodeAssistant.from_config(self.config, self.client, self.context_manager)
+        return self._assistant
+
+    async def run_command(self, command: str):
+        """Dispatch one command line, as typed at the prompt"""
+        name = command.split(' ', 1)[0]
+        if name in FILE_TASKS:
+            await self.handle_file_task(command)
+        elif command.startswith('batch'):
+            await self.handle_batch(command)
+        elif name == 'find':
+            await self.handle_find(command)
+        elif command == 'index':
+            await self.build_indexes()
+        elif command.startswith('models'):
+            await self.show_models()
+        elif command == 'clear':
+            self.clear_conversation()
+        else:
+            await self.handle_general_query(command)
+
+    async def run_once(self, command: str):
+        """Run a single command and release connections (non-interactive mode)"""
+        self.background_work = False
+        try:
+            await self.run_command(command)
+        finally:
+            await self.aclose()
+
+    async def aclose(self):
+        if self._assistant is not None:
+            self._assistant.close()
+        if self._client is not None:
+            await self._client.aclose()
         
     async def run(self):
         """Main CLI loop"""
         print("AI Coding Assistant CLI")
         print("Type 'help' for commands, 'quit' to exit")
+        self.session_id = INTERACTIVE_SESSION
         
         while True:
             try:
@@ -24,24 +120,16 @@ class CLIInterface:
                     break
                 elif command.lower() == 'help':
                     self.show_help()
-                elif command.startswith('review'):
-                    await self.handle_review(command)
-                elif command.startswith('complete'):
-                    await self.handle_completion(command)
-                elif command.startswith('debug'):
-                    await self.handle_debug(command)
-                elif command.startswith('explain'):
-                    await self.handle_explain(command)
-                elif command.startswith('models'):
-                    self.show_models()
                 else:
-                    await self.handle_general_query(command)
+                    await self.run_command(command)
                     
             except KeyboardInterrupt:
                 print("\nExiting...")
                 break
             except Exception as e:
                 print(f"Error: {e}")
+
+        await self.aclose()
     
     def show_help(self):
         """Show help message"""
@@ -51,17 +139,39 @@ Available commands:
   complete <file>   - Code completion for file
   debug <file>      - Debug code in file
   explain <file>    - Explain code in file
+  batch <task> <dir|glob> [--jobs N] [--out results.jsonl]
+                    - Run review/explain/document/debug/refactor over many files
+  find <symbol>     - Show where a symbol is defined and used
+  index             - Parse new and changed project files (imports, symbols)
   models            - List available models
+  clear             - Forget the conversation so far
   help              - Show this help
   quit/exit         - Exit the assistant
         """
         print(help_text)
     
-    async def handle_review(self, command: str):
-        """Handle code review command"""
+    async def stream_to_console(self, task_type, context, user_input: str, title: str) -> dict:
+        """Print tokens as they arrive and return the final result"""
+        print(f"\n{title}:")
+        result = {}
+        async for event in self.assistant.stream_request(task_type, context, user_input,
+                                                         self.session_id):
+            if event["event"] == "token":
+                print(event["data"], end="", flush=True)
+            elif event["event"] == "result":
+                result = event["data"]
+        print()
+        return result
+    
+    async def handle_file_task(self, command: str):
+        """Handle review/complete/debug/explain <file>"""
+        from assistant import TaskType, CodeContext
+        
         parts = command.split(' ', 1)
+        name = parts[0]
+        task_value, user_input, progress, title = FILE_TASKS[name]
         if len(parts) < 2:
-            print("Usage: review <file>")
+            print(f"Usage: {name} <file>")
             return
         
         file_path = parts[1]
@@ -70,112 +180,136 @@ Available commands:
             return
         
         content = self.context_manager.read_file(file_path)
-        if not content:
+        if content is None:
             print(f"Could not read file: {file_path}")
             return
         
+        task_type = TaskType(task_value)
         context = CodeContext(
             file_path=file_path,
             content=content,
             language=self.context_manager._detect_language(file_path),
-            cursor_position=0
-        )
-        
-        print("Reviewing code...")
-        result = await self.assistant.process_request(
-            TaskType.CODE_REVIEW, context, "Please review this code"
+            # Completion continues from the end of the file
+            cursor_position=len(content) if task_type == TaskType.CODE_COMPLETION else 0
         )
         
-        print(f"\nCode Review Results:\n{result['response']}")
-    
-    async def handle_completion(self, command: str):
-        """Handle code completion command"""
-        parts = command.split(' ', 1)
-        if len(parts) < 2:
-            print("Usage: complete <file>")
+        print(progress)
+        if task_type == TaskType.CODE_COMPLETION:
+            # The reply's prose around the code is not part of the completion
+            result = await self.assistant.process_request(task_type, context, user_input,
+                                                          self.session_id)
+            print(f"\n{title}:\n{result.get('completion', result['response'])}")
             return
+        await self.stream_to_console(task_type, context, user_input, title)
+    
+    async def handle_batch(self, command: str):
+        """Handle batch command: fan a task out over a directory or glob"""
+        parts = shlex.split(command)[1:]
+        batch_config = self.config.get("batch") or {}
+        jobs = batch_config.get("concurrency", 4)
+        out = batch_config.get("checkpoint", "batch_results.jsonl")
         
-        file_path = parts[1]
-        if not Path(file_path).exists():
-            print(f"File not found: {file_path}")
-            return
+        positional = []
+        while parts:
+            part = parts.pop(0)
+            if part in ('--jobs', '-j') and parts:
+                jobs = int(parts.pop(0))
+            elif part in ('--out', '-o') and parts:
+                out = parts.pop(0)
+            else:
+                positional.append(part)
         
-        content = self.context_manager.read_file(file_path)
-        cursor_pos = len(content)  # Default to end of file
+        if len(positional) != 2 or positional[0] not in BATCH_TASKS:
+            print("Usage: batch <review|explain|document|debug|refactor> <dir|glob> [--jobs N] [--out results.jsonl]")
+            return
         
-        context = CodeContext(
-            file_path=file_path,
-            content=content,
-            language=self.context_manager._detect_language(file_path),
-            cursor_position=cursor_pos
-        )
+        from assistant import TaskType
+        task_value, user_input = BATCH_TASKS[positional[0]]
+        task_type = TaskType(task_value)
         
-        print("Generating completion...")
-        result = await self.assistant.process_request(
-            TaskType.CODE_COMPLETION, context, "Complete this code"
-        )
+        def progress(done: int, total: int, file_path: str, status: str):
+            print(f"[{done}/{total}] {status:7} {file_path}", flush=True)
         
-        print(f"\nCompletion:\n{result.get('completion', result['response'])}")
-    
-    async def handle_debug(self, command: str):
-        """Handle debugging command"""
-        parts = command.split(' ', 1)
-        if len(parts) < 2:
-            print("Usage: debug <file>")
+        from batch import BatchRunner
+        runner = BatchRunner(self.assistant, concurrency=jobs,
+                             checkpoint_path=out, progress=progress)
+        files = runner.collect_files(positional[1])
+        if not files:
+            print(f"No code files match: {positional[1]}")
             return
         
-        file_path = parts[1]
-        if not Path(file_path).exists():
-            print(f"File not found: {file_path}")
-            return
+        print(f"Processing {len(files)} files with {jobs} workers -> {out}")
+        report = await runner.run(task_type, files, user_input)
         
-        content = self.context_manager.read_file(file_path)
+        print(f"\nDone: {report.succeeded} ok, {report.failed} failed, "
+              f"{report.skipped} skipped, {report.resumed} already done")
+        print(f"{report.elapsed:.1f}s, {report.files_per_sec:.2f} files/sec, "
+              f"{report.tokens_per_sec:.1f} tokens/sec "
+              f"({report.eval_tokens_per_sec:.1f} while generating)")
+    
+    async def build_indexes(self, out=None):
+        """Bring the import graph and symbol index up to date, showing progress.
+
+        The scan runs on a worker thread so a daemon keeps serving other
+        clients meanwhile; progress is printed from the event loop.
+        """
+        import asyncio
+        out = out or sys.stdout
+        loop = asyncio.get_running_loop()
         
-        context = CodeContext(
-            file_path=file_path,
-            content=content,
-            language=self.context_manager._detect_language(file_path),
-            cursor_position=0
-        )
+        def show(done: int, total: int):
+            print(f"\rIndexing {done}/{total} files", end="\n" if done == total else "",
+                  file=out, flush=True)
         
-        print("Debugging code...")
-        result = await self.assistant.process_request(
-            TaskType.DEBUGGING, context, "Help debug this code"
-        )
+        def progress(done: int, total: int):
+            loop.call_soon_threadsafe(show, done, total)
         
-        print(f"\nDebugging Results:\n{result['response']}")
+        if await asyncio.to_thread(self.context_manager.build_indexes, progress):
+            print(f"Done in {self.context_manager.scanner.stats['last_scan_seconds']}s", file=out)
+        else:
+            print("Index is up to date", file=out)
     
-    async def handle_explain(self, command: str):
-        """Handle code explanation command"""
-        parts = command.split(' ', 1)
-        if len(parts) < 2:
-            print("Usage: explain <file>")
-            return
-        
-        file_path = parts[1]
-        if not Path(file_path).exists():
-            print(f"File not found: {file_path}")
+    async def handle_find(self, command: str):
+        """Handle find <symbol>: definitions and references from the symbol index"""
+        import asyncio
+        parts = command.split()
+        if len(parts) != 2:
+            print("Usage: find <symbol>")
             return
+        symbol = parts[1]
         
-        content = self.context_manager.read_file(file_path)
+        def lookup():
+            # One scan per command, in parallel on a cold index; the lookups then only sync edits
+            self.context_manager.build_indexes()
+            return (self.context_manager.find_definitions(symbol),
+                    self.context_manager.find_references(symbol, limit=FIND_MAX_REFERENCES + 1))
         
-        context = CodeContext(
-            file_path=file_path,
-            content=content,
-            language=self.context_manager._detect_language(file_path),
-            cursor_position=0
-        )
-        
-        print("Explaining code...")
-        result = await self.assistant.process_request(
-            TaskType.EXPLANATION, context, "Explain this code"
-        )
+        definitions, references = await asyncio.to_thread(lookup)
+        if not definitions and not references:
+            print(f"No matches for {symbol}")
+            return
         
-        print(f"\nExplanation:\n{result['response']}")
+        if definitions:
+            print("Definitions:")
+            for d in definitions:
+                print(f"  {d['path']}:{d['line'] + 1}  {d['kind']}  {d['signature']}")
+        if references:
+            print("References:")
+            for ref in references[:FIND_MAX_REFERENCES]:
+                print(f"  {ref['path']}:{ref['line'] + 1}  {ref['text']}")
+            if len(references) > FIND_MAX_REFERENCES:
+                print(f"  ... showing the first {FIND_MAX_REFERENCES}")
+    
+    def clear_conversation(self):
+        if self._assistant is not None and self.session_id is not None:
+            self._assistant.sessions.discard(self.session_id)
+        print("Conversation cleared")
     
-    def show_models(self):
+    async def show_models(self):
         """Show available models"""
-        models = self.client.list_models()
+        import asyncio
+        # list_models is a blocking HTTP call; keep the daemon's event loop free
+        models = await asyncio.to_thread(self.client.list_models)
         if models:
             print("Available models:")
             for model in models:
@@ -185,6 +319,7 @@ Available commands:
     
     async def handle_general_query(self, query: str):
         """Handle general coding questions"""
+        from assistant import TaskType, CodeContext
         context = CodeContext(
             file_path="",
             content="",
@@ -192,24 +327,101 @@ Available commands:
             cursor_position=0
         )
         
-        result = await self.assistant.process_request(
-            TaskType.EXPLANATION, context, query
-        )
-        
-        print(f"\nResponse:\n{result['response']}")
+        result = await self.stream_to_console(TaskType.EXPLANATION, context, query, "Response")
+        if result.get("retrieved"):
+            print("\nSources: " + ", ".join(result["retrieved"]))
+
+def command_line(command: str, args: list) -> str:
+    """Rebuild the line the interactive prompt would have received"""
+    if command == 'batch':
+        return shlex.join([command] + args)
+    return ' '.join([command] + args)
+
+def absolute_args(command: str, args: list) -> list:
+    """Make file arguments absolute so a daemon in another directory finds them"""
+    if command in FILE_TASKS and args:
+        return [os.path.abspath(' '.join(args))]
+    if command != 'batch':
+        return args
+    resolved, positional = [], 0
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        if arg in ('--out', '-o') and args:
+            resolved += [arg, os.path.abspath(args.pop(0))]
+        elif arg in ('--jobs', '-j') and args:
+            resolved += [arg, args.pop(0)]
+        else:
+            positional += 1
+            resolved.append(os.path.abspath(arg) if positional == 2 else arg)
+    return resolved
+
+def run_daemon_command(args) -> int:
+    """cli.py daemon [start|stop|status]"""
+    import daemon_client
+    action = args.args[0] if args.args else 'start'
+    if action in ('stop', 'status'):
+        code = daemon_client.request(args.project, {"op": action})
+        if code is None:
+            print(f"No daemon running for {os.path.abspath(args.project)}")
+            return 1
+        return code
+    if action != 'start':
+        print("Usage: daemon [start|stop|status]")
+        return 2
+    
+    import asyncio
+    from config import load_config
+    from daemon import AssistantDaemon
+    cli = CLIInterface(load_config(args.config), args.project, model=args.model)
+    try:
+        asyncio.run(AssistantDaemon(cli).serve())
+    except KeyboardInterrupt:
+        pass
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        return 1
+    return 0
 
 def main():
-    parser = argparse.ArgumentParser(description="AI Coding Assistant")
-    parser.add_argument("--model", default="codellama:7b", help="Ollama model to use")
+    parser = argparse.ArgumentParser(
+        description="AI Coding Assistant",
+        epilog="Without a command, starts the interactive prompt. "
+               "One-shot: review|complete|debug|explain <file>, batch <task> <dir|glob>, "
+               "find <symbol>, index, models. "
+               "One-shot commands run in the project's daemon (cli.py daemon) when one is listening.")
+    parser.add_argument("--model", default=None,
+                        help="Ollama model to use (runs in-process, bypassing the daemon)")
     parser.add_argument("--project", default=".", help="Project root directory")
+    parser.add_argument("--config", default=None, help="Path to config.yaml")
+    parser.add_argument("--no-daemon", action="store_true",
+                        help="Run in-process even if a daemon is listening")
+    parser.add_argument("command", nargs="?", choices=ONE_SHOT_COMMANDS + ('daemon',),
+                        help="Run one command and exit")
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="Arguments for the command")
     
     args = parser.parse_args()
     
-    cli = CLIInterface()
-    cli.client.model = args.model
-    cli.context_manager.project_root = Path(args.project)
+    if args.command == 'daemon':
+        sys.exit(run_daemon_command(args))
+    
+    if args.command is not None and not args.no_daemon and args.model is None:
+        import daemon_client
+        code = daemon_client.run_command(
+            args.project, command_line(args.command, absolute_args(args.command, args.args)))
+        if code is not None:
+            sys.exit(code)
+    
+    # No daemon: run in this process
+    import asyncio
+    from config import load_config
+    cli = CLIInterface(load_config(args.config), args.project, model=args.model)
+    
+    if args.command is None:
+        asyncio.run(cli.run())
+        return
     
-    asyncio.run(cli.run())
+    asyncio.run(cli.run_once(command_line(args.command, args.args)))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
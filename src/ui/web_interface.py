@@ -1,10 +1,197 @@
-from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
+import asyncio
+import json
+import uuid
+from typing import Any, Dict
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from assistant import AICodeAssistant, TaskType, CodeContext, serialize_result
+from batch import BatchRunner
+from completion_scheduler import CompletionScheduler, RequestSuperseded
+from request_queue import AdmissionQueue, Overloaded
+from model_router import create_model_client
+from context_manager import ContextManager
+from config import load_config
 
 app = FastAPI()
 
+config = load_config()
+client = create_model_client(config)
+context_manager = ContextManager.from_config(config)
+assistant = AICodeAssistant.from_config(config, client, context_manager)
+completions = CompletionScheduler.from_config(config, assistant)
+admission = AdmissionQueue.from_config(config)
+batch_jobs: Dict[str, Dict[str, Any]] = {}
+
+def _project_path(path: str, field: str) -> str:
+    """Absolute form of a path from a request body, relative ones taken from
+    the project root; 400 unless it is inside the project"""
+    resolved = str(context_manager.project_root / path)
+    if context_manager.index.relative(resolved) is None:
+        raise HTTPException(status_code=400, detail=f"{field} must be inside the project: {path}")
+    return resolved
+
+def _parse_request(data: Dict[str, Any]):
+    """Turn a JSON request body into (task_type, context, user_input)"""
+    try:
+        task_type = TaskType(data.get("task_type", TaskType.EXPLANATION.value))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Unknown task_type: {data.get('task_type')}")
+
+    # Related files are read from beside file_path even when content is sent
+    file_path = data.get("file_path", "")
+    if file_path:
+        file_path = _project_path(file_path, "file_path")
+    content = data.get("content")
+    if content is None and file_path:
+        content = context_manager.read_file(file_path)
+    content = content or ""
+
+    context = CodeContext(
+        file_path=file_path,
+        content=content,
+        language=data.get("language") or context_manager._detect_language(file_path),
+        cursor_position=data.get("cursor_position", len(content)),
+        selected_text=data.get("selected_text")
+    )
+    return task_type, context, data.get("user_input", "")
+
+def _overloaded(e: Overloaded) -> JSONResponse:
+    return JSONResponse({"error": str(e), "retry_after": e.retry_after}, status_code=429,
+                        headers={"Retry-After": str(max(1, round(e.retry_after)))})
+
 @app.post("/assist")
 async def assist(request: Request):
     data = await request.json()
-    # Process with your assistant
-    return {"response": "..."}
\ No newline at end of file
+    task_type, context, user_input = _parse_request(data)
+    session_id = data.get("session_id")
+    try:
+        async with admission.slot(assistant.model_for(task_type), "interactive"):
+            if task_type == TaskType.CODE_COMPLETION and session_id:
+                # Keystroke-driven: a newer request from the same session replaces this one
+                result = await completions.complete(session_id, context, user_input or "Complete this code")
+            else:
+                result = await assistant.process_request(task_type, context, user_input, session_id)
+    except Overloaded as e:
+        return _overloaded(e)
+    except RequestSuperseded:
+        return JSONResponse({"superseded": True}, status_code=409)
+    return serialize_result(result)
+
+@app.post("/assist/stream")
+async def assist_stream(request: Request):
+    """Server-sent events: one `token` event per chunk, `code_block`/`issue`/`fix`
+    events as each is complete, then a `result` event"""
+    data = await request.json()
+    task_type, context, user_input = _parse_request(data)
+    session_id = data.get("session_id")
+
+    async def events():
+        async with admission.slot(assistant.model_for(task_type), "interactive"):
+            yield None  # admitted
+            async for event in assistant.stream_request(task_type, context, user_input, session_id):
+                data = event["data"]
+                if event["event"] == "result":
+                    data = serialize_result(data)
+                yield f"event: {event['event']}\ndata: {json.dumps(data)}\n\n"
+
+    # Admit before the response starts so an overloaded server can still answer
+    # 429. The slot lives in the generator: closing it releases the slot,
+    # whether the body was streamed, cut off by a disconnect or never sent
+    # (the background task, or the event loop's finalizer when Starlette
+    # skips it).
+    stream = events()
+    try:
+        await stream.__anext__()
+    except Overloaded as e:
+        return _overloaded(e)
+    return StreamingResponse(stream, media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"},
+                             background=BackgroundTask(stream.aclose))
+
+@app.post("/batch")
+async def start_batch(request: Request):
+    """Start a batch job over a directory or glob; poll GET /batch/{job_id}"""
+    data = await request.json()
+    try:
+        task_type = TaskType(data.get("task_type", TaskType.CODE_REVIEW.value))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Unknown task_type: {data.get('task_type')}")
+    if not data.get("target"):
+        raise HTTPException(status_code=400, detail="target is required")
+    target = _project_path(data["target"], "target")
+    checkpoint = _project_path(data["checkpoint"], "checkpoint") if data.get("checkpoint") else None
+
+    job_id = uuid.uuid4().hex[:12]
+    job = {"job_id": job_id, "status": "running", "task_type": task_type.value,
+           "target": data["target"], "done": 0, "total": 0, "report": None}
+
+    def progress(done: int, total: int, file_path: str, status: str):
+        job.update(done=done, total=total)
+
+    batch_config = config.get("batch") or {}
+    runner = BatchRunner(assistant, concurrency=data.get("concurrency", batch_config.get("concurrency", 4)),
+                         checkpoint_path=checkpoint, progress=progress,
+                         admission=admission)
+    files = runner.collect_files(target)
+    job["total"] = len(files)
+
+    async def run():
+        try:
+            report = await runner.run(task_type, files, data.get("user_input", "Please review this code"))
+            job.update(status="finished", report=report.to_dict())
+        except Exception as e:
+            job.update(status="failed", error=str(e))
+
+    job["task"] = asyncio.ensure_future(run())
+    batch_jobs[job_id] = job
+    return JSONResponse(_job_view(job), status_code=202)
+
+@app.get("/batch/{job_id}")
+async def batch_status(job_id: str):
+    job = batch_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown batch job: {job_id}")
+    return _job_view(job)
+
+def _job_view(job: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in job.items() if key != "task"}
+
+@app.get("/stats")
+async def stats():
+    """Queue depth, wait times and cache/coalescing counters"""
+    result = {"queue": admission.get_stats(), "completions": completions.stats,
+              "file_cache": context_manager.get_cache_stats(),
+              "sessions": assistant.sessions.get_stats(),
+              "conversation": assistant.conversation.get_stats()}
+    if assistant.semantic_index is not None:
+        result["semantic_index"] = assistant.semantic_index.get_stats()
+    if hasattr(client, "get_stats"):
+        result["client"] = client.get_stats()
+    if assistant.model_client is not client:
+        result["coalescing"] = assistant.model_client.get_stats()
+    if assistant.response_cache is not None:
+        result["response_cache"] = assistant.response_cache.get_stats()
+    return result
+
+@app.get("/metrics")
+async def metrics():
+    """Per-stage request timings in the Prometheus text format (tracing.enabled)"""
+    return PlainTextResponse(assistant.tracer.prometheus(),
+                             media_type="text/plain; version=0.0.4")
+
+@app.on_event("shutdown")
+async def shutdown():
+    for job in batch_jobs.values():
+        job["task"].cancel()
+    assistant.close()
+    await client.aclose()
+
+def main():
+    import uvicorn
+    web = config.get("web") or {}
+    uvicorn.run(app, host=web.get("host", "localhost"), port=web.get("port", 8000),
+                log_level="debug" if web.get("debug") else "info")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import asyncio
+import json
+import httpx
+from assistant import AICodeAssistant, TaskType
+from batch import BatchRunner
+from context_manager import ContextManager
+from ollama_client import OllamaClient
+
+def ollama(request):
+    """/api/generate answering with a reply much longer than its eval_count"""
+    body = json.loads(request.content)
+    final = {"done": True, "eval_count": 7, "eval_duration": 500_000_000}
+    if body["stream"]:
+        tokens = ["```python\n", "return 1\n", "```", "\n\nThis returns 1."]
+        lines = [{"response": token} for token in tokens] + [dict(final, response="")]
+        return httpx.Response(200, text=''.join(json.dumps(line) + '\n' for line in lines))
+    return httpx.Response(200, json=dict(final, response="word " * 100))
+
+def make_runner(tmp_path, monkeypatch):
+    for name in ("a.py", "b.py"):
+        (tmp_path / name).write_text("def f():\n    pass\n")
+    client = OllamaClient()
+    mock = httpx.AsyncClient(base_url=client.base_url, transport=httpx.MockTransport(ollama))
+    monkeypatch.setattr(client, "_get_client", lambda: mock)
+    assistant = AICodeAssistant(client, ContextManager(str(tmp_path), background_builds=False))
+    return BatchRunner(assistant, concurrency=2)
+
+def test_tokens_are_counted_as_ollama_reports_them(tmp_path, monkeypatch):
+    runner = make_runner(tmp_path, monkeypatch)
+    files = [str(tmp_path / "a.py"), str(tmp_path / "b.py")]
+    report = asyncio.run(runner.run(TaskType.EXPLANATION, files, "Go"))
+    assert report.succeeded == 2
+    assert report.response_tokens == 14
+    assert report.eval_seconds == 1.0
+    assert report.to_dict()["eval_tokens_per_sec"] == 14.0
+
+def test_completions_cut_short_count_the_tokens_streamed(tmp_path, monkeypatch):
+    runner = make_runner(tmp_path, monkeypatch)
+    files = [str(tmp_path / "a.py"), str(tmp_path / "b.py")]
+    report = asyncio.run(runner.run(TaskType.CODE_COMPLETION, files, "Go"))
+    assert report.succeeded == 2
+    # The stream is closed at the end of the code block, before Ollama's final counts
+    assert report.response_tokens == 6
@@ -0,0 +1,101 @@
+import asyncio
+import pytest
+from assistant import CodeContext
+from completion_scheduler import CompletionScheduler, RequestSuperseded
+
+class SlowAssistant:
+    def __init__(self, completion="foo()", delay=0.05):
+        self.completion = completion
+        self.delay = delay
+        self.calls = 0
+
+    async def process_request(self, task_type, context, user_input):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return {"response": self.completion, "completion": self.completion}
+
+def context(content, file_path="m.py"):
+    return CodeContext(file_path, content, "python", len(content))
+
+def test_typed_ahead_request_reuses_the_running_generation():
+    scheduler = CompletionScheduler(SlowAssistant())
+
+    async def run():
+        first = asyncio.ensure_future(scheduler.complete("s", context("x = ")))
+        await asyncio.sleep(0)
+        return await asyncio.gather(first, scheduler.complete("s", context("x = fo")))
+    first, second = asyncio.run(run())
+    assert first["completion"] == "foo()"
+    assert second["completion"] == "o()" and second["reused"]
+    assert scheduler.assistant.calls == 1
+    assert not scheduler._latest and not scheduler._pending
+
+def test_superseded_request_raises_and_leaves_no_state():
+    scheduler = CompletionScheduler(SlowAssistant())
+
+    async def run():
+        first = asyncio.ensure_future(scheduler.complete("s", context("a")))
+        await asyncio.sleep(0.01)
+        second = await scheduler.complete("s", context("b"))
+        with pytest.raises(RequestSuperseded):
+            await first
+        return second
+    assert asyncio.run(run())["completion"] == "foo()"
+    assert scheduler.stats["superseded"] == 1
+    assert not scheduler._latest and not scheduler._pending
+
+def test_caller_cancelled_while_debouncing_drops_its_ticket():
+    scheduler = CompletionScheduler(SlowAssistant(), debounce=0.05)
+
+    async def run():
+        request = asyncio.ensure_future(scheduler.complete("s", context("a")))
+        await asyncio.sleep(0.01)
+        request.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await request
+    asyncio.run(run())
+    assert scheduler.assistant.calls == 0
+    assert not scheduler._latest
+
+def test_many_files_leave_no_tickets_behind():
+    scheduler = CompletionScheduler(SlowAssistant(delay=0))
+
+    async def run():
+        await asyncio.gather(*(scheduler.complete("s", context("x", f"f{i}.py")) for i in range(20)))
+    asyncio.run(run())
+    assert not scheduler._latest and not scheduler._pending
+
+def test_caller_cancellation_is_not_mistaken_for_supersession():
+    scheduler = CompletionScheduler(SlowAssistant(), reuse_prefix=False)
+
+    async def run():
+        first = asyncio.ensure_future(scheduler.complete("s", context("a")))
+        await asyncio.sleep(0.01)
+        # A newer request cancels the generation just as the first caller goes away
+        second = asyncio.ensure_future(scheduler.complete("s", context("b")))
+        first.cancel()
+        await asyncio.sleep(0)
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        await second
+    asyncio.run(run())
+    assert scheduler.stats["superseded"] == 0
+
+class FailingAssistant(SlowAssistant):
+    async def process_request(self, task_type, context, user_input):
+        result = await super().process_request(task_type, context, user_input)
+        if self.calls == 1:
+            result["error"] = "Error: connection reset"
+        return result
+
+def test_failed_generation_is_not_reused():
+    scheduler = CompletionScheduler(FailingAssistant())
+
+    async def run():
+        first = asyncio.ensure_future(scheduler.complete("s", context("x = ")))
+        await asyncio.sleep(0)
+        return await asyncio.gather(first, scheduler.complete("s", context("x = fo")))
+    first, second = asyncio.run(run())
+    assert first["error"]
+    assert "error" not in second and not second.get("reused")
+    assert scheduler.assistant.calls == 2
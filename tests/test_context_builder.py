@@ -0,0 +1,79 @@
+import pytest
+from context_builder import ContextAssembler
+from context_manager import ContextManager
+from project_scanner import ProjectScanner
+
+HELPERS = "def parse_header(data):\n    return data[:4]\n"
+MAIN = "from helpers import parse_header\n\ndef run(data):\n    header = parse_header(data)\n    "
+
+@pytest.fixture
+def project(tmp_path):
+    root = tmp_path / "project"
+    root.mkdir()
+    (root / "helpers.py").write_text(HELPERS)
+    (root / "main.py").write_text(MAIN)
+    return root
+
+def make_manager(root, tmp_path, background_builds):
+    return ContextManager(str(root), index_path=str(tmp_path / "state" / "index.json"),
+                          index_refresh_interval=0, background_builds=background_builds)
+
+def assemble_completion(manager, root):
+    assembler = ContextAssembler(manager)
+    return assembler.assemble("code_completion", str(root / "main.py"), MAIN, "python", len(MAIN))
+
+def test_cold_index_is_built_in_the_background(project, tmp_path):
+    manager = make_manager(project, tmp_path, background_builds=True)
+    assembled = assemble_completion(manager, project)
+    assert assembled.definitions == []
+    assert manager._build_thread is not None
+    manager._build_thread.join(timeout=30)
+
+    assembled = assemble_completion(manager, project)
+    assert assembled.definitions == [("helpers.py:1", "def parse_header(data):")]
+
+def test_one_shot_never_parses_an_unindexed_project(project, tmp_path, monkeypatch):
+    manager = make_manager(project, tmp_path, background_builds=False)
+
+    def scan(self, progress=None):
+        raise AssertionError("prompt assembly ran a project scan")
+    monkeypatch.setattr(ProjectScanner, "scan", scan)
+
+    assembled = assemble_completion(manager, project)
+    assert assembled.definitions == []
+    assert manager._build_thread is None
+    assert manager.import_graph.stats["parsed"] == 0
+    assert manager.symbol_index.stats["indexed"] == 0
+
+def test_one_shot_uses_indexes_persisted_by_an_earlier_run(project, tmp_path):
+    make_manager(project, tmp_path, background_builds=False).build_indexes()
+
+    manager = make_manager(project, tmp_path, background_builds=False)
+    assembled = assemble_completion(manager, project)
+    assert assembled.definitions == [("helpers.py:1", "def parse_header(data):")]
+    assert manager.get_related_files(str(project / "main.py"))[0] == str(project / "helpers.py")
+    assert manager.import_graph.stats["parsed"] == 0
+
+def test_definitions_are_looked_up_in_one_query(project, tmp_path, monkeypatch):
+    manager = make_manager(project, tmp_path, background_builds=False)
+    manager.build_indexes()
+    calls = []
+    original = manager.symbol_index.definitions_many
+    monkeypatch.setattr(manager.symbol_index, "definitions_many",
+                        lambda names: calls.append(list(names)) or original(names))
+    assemble_completion(manager, project)
+    assert len(calls) == 1 and "parse_header" in calls[0]
+
+def test_related_signatures_come_from_the_symbol_index(project, tmp_path, monkeypatch):
+    manager = make_manager(project, tmp_path, background_builds=False)
+    manager.build_indexes()
+    assembler = ContextAssembler(manager)
+    parsed = []
+    original = assembler.parser.parse_functions
+    monkeypatch.setattr(assembler.parser, "parse_functions",
+                        lambda code, *args, **kwargs: parsed.append(code) or original(code, *args, **kwargs))
+    monkeypatch.setattr("symbol_index.file_definitions", lambda *args, **kwargs: pytest.fail("re-parsed"))
+
+    assembled = assembler.assemble("code_completion", str(project / "main.py"), MAIN, "python", len(MAIN))
+    assert assembled.related == [(str(project / "helpers.py"), "def parse_header(data):")]
+    assert HELPERS not in parsed
@@ -0,0 +1,48 @@
+import asyncio
+from assistant import AICodeAssistant, CodeContext, TaskType
+from context_builder import ContextAssembler
+from context_manager import ContextManager
+
+class RecordingModel:
+    model = "codellama:7b"
+
+    def __init__(self):
+        self.prompts = []
+
+    async def generate_response(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return "It does things."
+
+def make_assistant(tmp_path):
+    manager = ContextManager(str(tmp_path), background_builds=False)
+    assembler = ContextAssembler(manager, budgets={"explanation": 200}, context_lines=5)
+    return AICodeAssistant(RecordingModel(), manager, context_assembler=assembler)
+
+CODE = ''.join(f"def function_{i}():\n    return {i}\n\n" for i in range(200))
+
+def ask(assistant, tmp_path, cursor, selected_text=None):
+    context = CodeContext(str(tmp_path / "m.py"), CODE, "python", cursor, selected_text)
+    asyncio.run(assistant.process_request(TaskType.EXPLANATION, context, "Explain",
+                                          session_id="s"))
+    return assistant.model_client.prompts[-1]
+
+def test_same_window_is_referred_back_to(tmp_path):
+    assistant = make_assistant(tmp_path)
+    first = ask(assistant, tmp_path, 100)
+    assert "def function_3" in first
+    second = ask(assistant, tmp_path, 100)
+    assert "(unchanged, shown above)" in second
+    assert "def function_3" not in second
+
+def test_moved_window_is_sent_again(tmp_path):
+    assistant = make_assistant(tmp_path)
+    ask(assistant, tmp_path, 100)
+    second = ask(assistant, tmp_path, CODE.index("def function_150"))
+    assert "(unchanged, shown above)" not in second
+    assert "def function_150" in second
+
+def test_new_selection_is_sent_with_its_window(tmp_path):
+    assistant = make_assistant(tmp_path)
+    ask(assistant, tmp_path, 100, "return 3")
+    second = ask(assistant, tmp_path, 100, "return 4")
+    assert "(unchanged, shown above)" not in second
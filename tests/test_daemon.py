@@ -0,0 +1,103 @@
+import asyncio
+import os
+import stat
+import time
+from daemon import AssistantDaemon
+from ui.cli import CLIInterface
+
+CONFIG = {"cache": {"enabled": False}, "semantic_index": {"enabled": False},
+          "tracing": {"enabled": False}}
+
+def make_cli(tmp_path):
+    project = tmp_path / "project"
+    project.mkdir()
+    (project / "a.py").write_text("def foo():\n    pass\n")
+    return CLIInterface(config=CONFIG, project_root=str(project))
+
+def test_find_does_not_block_the_event_loop(tmp_path, monkeypatch, capsys):
+    cli = make_cli(tmp_path)
+    scan = cli.context_manager.scanner.scan
+
+    def slow_scan(progress=None):
+        time.sleep(0.3)
+        return scan(progress)
+    monkeypatch.setattr(cli.context_manager.scanner, "scan", slow_scan)
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+        task = asyncio.ensure_future(ticker())
+        await cli.run_command("find foo")
+        task.cancel()
+        return ticks
+    assert asyncio.run(run()) > 5
+    assert "a.py:1" in capsys.readouterr().out
+
+def test_socket_is_never_accessible_to_others(tmp_path, monkeypatch):
+    cli = make_cli(tmp_path)
+    path = str(tmp_path / "sock" / "daemon.sock")
+    modes = []
+    start_unix_server = asyncio.start_unix_server
+
+    async def recording_start(*args, **kwargs):
+        server = await start_unix_server(*args, **kwargs)
+        modes.append(stat.S_IMODE(os.stat(kwargs["path"]).st_mode))
+        return server
+    monkeypatch.setattr(asyncio, "start_unix_server", recording_start)
+
+    async def preload():
+        pass
+    monkeypatch.setattr(cli.assistant, "preload", preload)
+
+    async def run():
+        daemon = AssistantDaemon(cli, path)
+        serving = asyncio.ensure_future(daemon.serve())
+        while not modes and not serving.done():
+            await asyncio.sleep(0.01)
+        daemon.stop()
+        await serving
+    asyncio.run(run())
+    assert modes and modes[0] & 0o077 == 0
+
+def test_models_does_not_block_the_event_loop(tmp_path, monkeypatch, capsys):
+    cli = make_cli(tmp_path)
+
+    def slow_list_models():
+        time.sleep(0.3)
+        return ["codellama:7b"]
+    monkeypatch.setattr(cli.client, "list_models", slow_list_models)
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+        task = asyncio.ensure_future(ticker())
+        await cli.run_command("models")
+        task.cancel()
+        return ticks
+    assert asyncio.run(run()) > 5
+    assert "codellama:7b" in capsys.readouterr().out
+
+def test_complete_prints_only_the_completion(tmp_path, capsys):
+    cli = make_cli(tmp_path)
+
+    class Model:
+        model = "codellama:7b"
+
+        async def stream_response(self, prompt, **kwargs):
+            for token in ["Here you go:\n", "```python\n", "    return 1\n", "```\n", "Done."]:
+                yield token
+    cli.assistant.model_client = Model()
+
+    asyncio.run(cli.run_command(f"complete {cli.context_manager.project_root}/a.py"))
+    out = capsys.readouterr().out
+    assert out.endswith("Completion:\n    return 1\n")
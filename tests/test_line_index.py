@@ -0,0 +1,74 @@
+import random
+import pytest
+from code_parser import CodeParser
+from line_index import LineIndex, common_prefix, common_suffix
+from syntax_tree import load_language
+
+TEXT = "one\ntwo\n\nfour"
+
+def test_line_of_bisects_line_starts():
+    lines = LineIndex(TEXT)
+    assert len(lines) == 4
+    assert [lines.line_of(offset) for offset in (0, 3, 4, 8, 9, 13, 100)] == [0, 0, 1, 2, 3, 3, 3]
+    assert lines.line_of(-5) == 0
+    assert lines.line(1) == "two"
+    assert lines.line(2) == ""
+    assert lines.slice_lines(1, 3) == "two\n"
+    assert lines.context_around(5, 1) == ("one\ntwo\n", 0, 3)
+
+@pytest.mark.parametrize("start, old_end, new_text", [
+    (0, 0, "zero\n"),
+    (3, 4, ""),
+    (4, 8, "2\n2\n"),
+    (len(TEXT), len(TEXT), "\nfive\n"),
+    (0, len(TEXT), "x"),
+    (5, 6, "W"),
+])
+def test_update_matches_a_fresh_index(start, old_end, new_text):
+    lines = LineIndex(TEXT)
+    expected = TEXT[:start] + new_text + TEXT[old_end:]
+    assert lines.update(expected)
+    assert lines.text == expected
+    assert lines.starts == LineIndex(expected).starts
+
+@pytest.mark.parametrize("a, b", [("abc", "xbc"), ("abc", "abc"), ("", "a"),
+                                  ("x" * 10000 + "tail", "y" * 5 + "x" * 9999 + "tail")])
+def test_common_suffix_matches_reversed_prefix(a, b):
+    limit = min(len(a), len(b))
+    assert common_suffix(a, b, limit, block=16) == common_prefix(a[::-1], b[::-1], limit)
+
+def test_update_matches_a_fresh_index_across_random_edits():
+    rng = random.Random(0)
+    text = "\n".join(f"line {i}" for i in range(50))
+    lines = LineIndex(text)
+    for _ in range(200):
+        start = rng.randrange(len(text) + 1)
+        end = min(len(text), start + rng.randrange(10))
+        text = text[:start] + rng.choice(["", "x", "\n", "a\nb", "\n\n"]) + text[end:]
+        lines.update(text)
+        assert lines.starts == LineIndex(text).starts
+    assert not lines.update(text)
+
+def test_parser_patches_a_files_index_instead_of_rebuilding():
+    parser = CodeParser()
+    first = parser.line_index("a = 1\n", "m.py")
+    second = parser.line_index("a = 1\nb = 2\n", "m.py")
+    assert second is first
+    assert second.line(1) == "b = 2"
+    assert parser.line_index("a = 1\n") is not first
+    text = "a = 1\n" * 100
+    assert parser.find_context_around_cursor(text, 30, 1, "m.py") == ("a = 1\na = 1\na = 1", 4, 7)
+    assert parser.line_index(text, "m.py") is first
+
+@pytest.mark.skipif(load_language("python") is None, reason="tree-sitter grammar not installed")
+def test_char_offsets_on_non_ascii_source():
+    code = "s = 'héllo wörld'\n\ndef f():\n    return 'ü'\n\ndef g():\n    pass\n"
+    functions = CodeParser().parse_functions(code, "python")
+    assert [code[f['start']:f['end']] for f in functions] == [f['signature'] for f in functions]
+    assert [f['name'] for f in functions] == ["f", "g"]
+
+@pytest.mark.skipif(load_language("javascript") is None, reason="tree-sitter grammar not installed")
+def test_arrow_function_signature_includes_its_parameters():
+    code = "const f = (a, b) => a + b;\nlet g = function (y) { return y; };\n"
+    functions = CodeParser().parse_functions(code, "javascript")
+    assert [f['signature'] for f in functions] == ["f = (a, b) =>", "g = function (y)"]
@@ -0,0 +1,108 @@
+import asyncio
+import httpx
+from assistant import AICodeAssistant, CodeContext, TaskType
+from context_manager import ContextManager
+from model_router import ModelRouter
+from ollama_client import FallbackText, StreamError
+from response_cache import ResponseCache
+
+def status_error(status):
+    request = httpx.Request("POST", "http://ollama/api/generate")
+    return httpx.HTTPStatusError(f"HTTP {status}", request=request,
+                                 response=httpx.Response(status, request=request))
+
+class FakeBackend:
+    """OllamaClient stand-in: each model either answers or raises an error"""
+
+    def __init__(self, replies, base_url="http://a:11434"):
+        self.replies = replies  # model -> reply text or exception
+        self.base_url = base_url
+        self.timeout = 5
+        self.calls = []
+
+    async def fetch_models(self, timeout=None):
+        return list(self.replies)
+
+    def _reply(self, model):
+        self.calls.append(model)
+        reply = self.replies[model]
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    async def generate(self, prompt, temperature=0.7, max_tokens=2000, model=None, **kwargs):
+        return {"response": self._reply(model)}
+
+    async def stream(self, prompt, model=None, **kwargs):
+        for token in self._reply(model).split(" "):
+            yield token
+
+def make_router(*backends):
+    router = ModelRouter(list(backends), model="codellama:7b",
+                         fallback_models=["deepseek-coder:6.7b"])
+    for backend in router.backends:
+        backend.models = set(backend.client.replies)
+        backend.last_checked = float("inf")  # no background health checks
+    return router
+
+def test_failover_to_a_fallback_model_is_marked():
+    backend = FakeBackend({"codellama:7b": status_error(500), "deepseek-coder:6.7b": "answer"})
+    router = make_router(backend)
+    reply = asyncio.run(router.generate_response("prompt"))
+    assert reply == "answer"
+    assert isinstance(reply, FallbackText) and reply.model == "deepseek-coder:6.7b"
+    assert not router.backends[0].healthy
+
+def test_raw_prompts_never_cross_models():
+    backend = FakeBackend({"codellama:7b": httpx.ConnectError("refused"),
+                           "deepseek-coder:6.7b": "garbage"})
+    router = make_router(backend)
+    reply = asyncio.run(router.generate_response("<PRE> x <SUF> <MID>", raw=True))
+    assert reply.startswith("Error communicating with Ollama")
+    assert backend.calls == ["codellama:7b"]
+
+    async def stream():
+        return [token async for token in router.stream_response("<PRE> x <SUF> <MID>", raw=True)]
+    tokens = asyncio.run(stream())
+    assert len(tokens) == 1 and isinstance(tokens[0], StreamError)
+    assert "deepseek-coder:6.7b" not in backend.calls
+
+def test_rejected_request_fails_fast_without_marking_the_endpoint_down():
+    first = FakeBackend({"codellama:7b": status_error(400), "deepseek-coder:6.7b": "answer"})
+    second = FakeBackend({"codellama:7b": "answer", "deepseek-coder:6.7b": "answer"},
+                         base_url="http://b:11434")
+    router = make_router(first, second)
+    router.backends[1].outstanding = 1  # make the first endpoint the preferred one
+    reply = asyncio.run(router.generate_response("prompt"))
+    assert reply.startswith("Error communicating with Ollama")
+    assert all(backend.healthy for backend in router.backends)
+    assert second.calls == []
+
+def test_server_error_fails_over_to_the_next_endpoint():
+    first = FakeBackend({"codellama:7b": status_error(503), "deepseek-coder:6.7b": "x"})
+    second = FakeBackend({"codellama:7b": "from b", "deepseek-coder:6.7b": "x"},
+                         base_url="http://b:11434")
+    router = make_router(first, second)
+    router.backends[1].outstanding = 1
+    reply = asyncio.run(router.generate_response("prompt"))
+    assert reply == "from b" and not isinstance(reply, FallbackText)
+    assert not router.backends[0].healthy and router.backends[1].healthy
+
+def test_fallback_answer_is_cached_under_the_model_that_gave_it(tmp_path):
+    backend = FakeBackend({"codellama:7b": status_error(500), "deepseek-coder:6.7b": "answer"})
+    router = make_router(backend)
+    cache = ResponseCache(cache_nonzero_temperature=["explanation"])
+    assistant = AICodeAssistant(router, ContextManager(str(tmp_path), background_builds=False),
+                                response_cache=cache)
+    (tmp_path / "m.py").write_text("x = 1\n")
+    context = CodeContext(str(tmp_path / "m.py"), "x = 1\n", "python", 0)
+
+    result = asyncio.run(assistant.process_request(TaskType.EXPLANATION, context, "Explain"))
+    assert result["response"] == "answer"
+    assert cache.stats["stores"] == 1
+
+    # The primary model is back: the fallback's answer is not served as its reply
+    backend.replies["codellama:7b"] = "primary answer"
+    router.backends[0].healthy = True
+    result = asyncio.run(assistant.process_request(TaskType.EXPLANATION, context, "Explain"))
+    assert result["response"] == "primary answer"
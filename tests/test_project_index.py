@@ -0,0 +1,67 @@
+import os
+from context_manager import ContextManager
+from project_index import ProjectIndex
+
+def append(path, text):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(text)
+
+def make_project(root):
+    (root / "pkg").mkdir(parents=True)
+    (root / "pkg" / "alpha.py").write_text("def alpha():\n    return 1\n")
+    (root / "main.py").write_text("from pkg.alpha import alpha\n")
+
+def test_restat_sees_files_edited_in_place(tmp_path):
+    make_project(tmp_path)
+    index = ProjectIndex(str(tmp_path), refresh_interval=0)
+    index.refresh()
+    generation = index.generation
+
+    append(tmp_path / "pkg" / "alpha.py", "\ndef gamma():\n    return 2\n")
+    # The directory pass on the request path leaves files alone
+    assert index.refresh() == 0
+    assert index.generation == generation
+    assert index.restat() == 1
+    st = os.stat(tmp_path / "pkg" / "alpha.py")
+    assert index.file_info(os.path.join("pkg", "alpha.py")) == (st.st_mtime_ns, st.st_size)
+    assert index.generation == generation + 1
+
+    # Nothing changed: no new generation
+    assert index.restat() == 0
+    assert index.generation == generation + 1
+
+def test_restat_in_background_runs_once_per_interval(tmp_path):
+    make_project(tmp_path)
+    index = ProjectIndex(str(tmp_path), restat_interval=3600)
+    index.refresh()
+    append(tmp_path / "main.py", "x = 1\n")
+    assert index.restat_in_background()
+    assert not index.restat_in_background()
+    index._restat_thread.join()
+    assert index.stats["files_changed"] == 1
+
+def test_edited_definitions_are_found(tmp_path):
+    root = tmp_path / "project"
+    make_project(root)
+    index_path = str(tmp_path / "state" / "index.json")
+    manager = ContextManager(str(root), index_path=index_path, index_refresh_interval=0)
+    manager.build_indexes()
+    assert [d["name"] for d in manager.find_definitions("alpha")] == ["alpha"]
+    assert manager.find_definitions("gamma") == []
+
+    append(root / "pkg" / "alpha.py", "\ndef gamma():\n    return 2\n")
+    manager.build_indexes()
+    found = manager.find_definitions("gamma")
+    assert [(d["path"], d["line"]) for d in found] == [(os.path.join("pkg", "alpha.py"), 3)]
+
+def test_edits_made_while_not_running_are_found(tmp_path):
+    root = tmp_path / "project"
+    make_project(root)
+    index_path = str(tmp_path / "state" / "index.json")
+    ContextManager(str(root), index_path=index_path, index_refresh_interval=0).build_indexes()
+
+    append(root / "pkg" / "alpha.py", "\ndef gamma():\n    return 2\n")
+    manager = ContextManager(str(root), index_path=index_path, index_refresh_interval=0)
+    assert manager.index.stats["loaded_from_disk"]
+    assert manager.build_indexes() == 1
+    assert [d["name"] for d in manager.find_definitions("gamma")] == ["gamma"]
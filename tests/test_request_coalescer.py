@@ -0,0 +1,84 @@
+import asyncio
+from request_coalescer import CoalescingClient
+
+class SlowClient:
+    model = "codellama:7b"
+
+    def __init__(self):
+        self.calls = 0
+        self.cancelled = 0
+        self.closed = 0
+
+    async def generate_response(self, prompt, **kwargs):
+        self.calls += 1
+        try:
+            await asyncio.sleep(0.05)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return f"reply to {prompt}"
+
+    async def stream_response(self, prompt, **kwargs):
+        self.calls += 1
+        try:
+            for token in ("a", "b", "c"):
+                await asyncio.sleep(0.02)
+                yield token
+        finally:
+            self.closed += 1
+
+def test_identical_requests_share_one_generation():
+    client = CoalescingClient(SlowClient())
+
+    async def run():
+        return await asyncio.gather(*(client.generate_response("p") for _ in range(3)),
+                                    client.generate_response("q"))
+    assert asyncio.run(run()) == ["reply to p"] * 3 + ["reply to q"]
+    assert client.client.calls == 2
+    assert client.stats["coalesced"] == 2
+
+def test_generation_survives_until_its_last_caller_cancels():
+    client = CoalescingClient(SlowClient())
+
+    async def run():
+        first = asyncio.ensure_future(client.generate_response("p"))
+        second = asyncio.ensure_future(client.generate_response("p"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == "reply to p"
+        assert client.client.cancelled == 0
+
+        third = asyncio.ensure_future(client.generate_response("p"))
+        await asyncio.sleep(0.01)
+        third.cancel()
+        await asyncio.sleep(0)
+    asyncio.run(run())
+    assert client.client.cancelled == 1
+    assert client.stats["cancelled"] == 1
+    assert client.get_stats()["in_flight"] == 0
+
+def test_stream_is_closed_once_every_subscriber_leaves():
+    client = CoalescingClient(SlowClient())
+
+    async def run():
+        async def take(n):
+            stream = client.stream_response("p")
+            tokens = []
+            async for token in stream:
+                tokens.append(token)
+                if len(tokens) == n:
+                    break
+            await stream.aclose()
+            return tokens
+        full, partial = await asyncio.gather(take(3), take(1))
+        assert full == ["a", "b", "c"] and partial == ["a"]
+
+        stream = client.stream_response("q")
+        assert await stream.__anext__() == "a"
+        await stream.aclose()
+        await asyncio.sleep(0)
+    asyncio.run(run())
+    assert client.client.calls == 2
+    assert client.client.closed == 2
+    assert client.stats["cancelled"] == 1
+    assert client.get_stats()["in_flight"] == 0
@@ -0,0 +1,69 @@
+import asyncio
+import pytest
+from request_queue import AdmissionQueue, Overloaded
+
+async def hold(queue, lane, log, name, release):
+    async with queue.slot("m", lane):
+        log.append(name)
+        await release.wait()
+
+def test_free_slot_goes_to_interactive_before_batch():
+    queue = AdmissionQueue(concurrency=1)
+    log = []
+
+    async def run():
+        release = asyncio.Event()
+        tasks = [asyncio.ensure_future(hold(queue, "batch", log, "running", release))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.ensure_future(hold(queue, "batch", log, "batch", release)))
+        await asyncio.sleep(0)
+        tasks.append(asyncio.ensure_future(hold(queue, "interactive", log, "interactive", release)))
+        await asyncio.sleep(0)
+        assert queue.get_stats()["models"]["m"]["queued"] == {"interactive": 1, "batch": 1}
+        release.set()
+        await asyncio.gather(*tasks)
+    asyncio.run(run())
+    assert log == ["running", "interactive", "batch"]
+    assert queue.get_stats()["models"]["m"]["active"] == 0
+
+def test_full_lane_is_rejected_with_a_retry_hint():
+    queue = AdmissionQueue(concurrency=1, max_queue={"interactive": 1}, retry_after=2.0)
+
+    async def run():
+        release = asyncio.Event()
+        tasks = [asyncio.ensure_future(hold(queue, "interactive", [], i, release)) for i in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as overloaded:
+            async with queue.slot("m"):
+                pass
+        release.set()
+        await asyncio.gather(*tasks)
+        return overloaded.value
+    assert asyncio.run(run()).retry_after == 2.0
+    assert queue.get_stats()["lanes"]["interactive"]["rejected"] == 1
+
+def test_cancelled_waiter_leaves_the_queue_without_taking_a_slot():
+    queue = AdmissionQueue(concurrency=1)
+    log = []
+
+    async def run():
+        release = asyncio.Event()
+        running = asyncio.ensure_future(hold(queue, "interactive", log, "running", release))
+        await asyncio.sleep(0)
+        waiting = asyncio.ensure_future(hold(queue, "interactive", log, "waiting", release))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert queue.get_stats()["models"]["m"]["queued"]["interactive"] == 0
+        release.set()
+        await running
+    asyncio.run(run())
+    assert log == ["running"]
+    assert queue.get_stats()["models"]["m"]["active"] == 0
+
+def test_unknown_lane_is_an_error():
+    async def run():
+        async with AdmissionQueue().slot("m", "bulk"):
+            pass
+    with pytest.raises(ValueError):
+        asyncio.run(run())
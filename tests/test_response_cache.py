@@ -0,0 +1,28 @@
+from assistant import AICodeAssistant, TaskType
+from context_manager import ContextManager
+from response_cache import ResponseCache
+
+OPTIONS = {"temperature": 0, "num_predict": 100}
+
+def test_key_covers_every_option_and_raw():
+    key = ResponseCache.make_key("m", "p", OPTIONS)
+    assert ResponseCache.make_key("m", "p", {"num_predict": 100, "temperature": 0}) == key
+    assert ResponseCache.make_key("m", "p", dict(OPTIONS, top_k=10)) != key
+    assert ResponseCache.make_key("m", "p", dict(OPTIONS, stop=["\n"])) != key
+    assert ResponseCache.make_key("m", "p", dict(OPTIONS, num_ctx=8192)) != key
+    assert ResponseCache.make_key("m", "p", OPTIONS, raw=True) != key
+    assert ResponseCache.make_key("other", "p", OPTIONS) != key
+
+class Model:
+    model = "codellama:7b-code"
+
+def cache_key(tmp_path, **kwargs):
+    assistant = AICodeAssistant(Model(), ContextManager(str(tmp_path), background_builds=False),
+                                response_cache=ResponseCache(), temperature=0, **kwargs)
+    return assistant._cache_key(TaskType.CODE_COMPLETION, "def f():")
+
+def test_assistant_key_follows_task_options_and_fim(tmp_path):
+    key = cache_key(tmp_path)
+    assert cache_key(tmp_path) == key
+    assert cache_key(tmp_path, task_options={"code_completion": {"top_p": 0.5}}) != key
+    assert cache_key(tmp_path, fim=False) != key
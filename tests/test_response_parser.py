@@ -0,0 +1,49 @@
+import pytest
+from response_parser import ResponseParser
+
+REVIEW = """## Bugs
+- Off by one on line 12, the loop skips the last item
+- **Minor**: rename `x`
+
+```python
+for i in range(n + 1):
+    pass
+```
+"""
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+@pytest.mark.parametrize("size", [1, 2, 7, 1000])
+def test_result_does_not_depend_on_chunking(size):
+    parser = ResponseParser("code_review")
+    elements = [e for chunk in chunked(REVIEW, size) for e in parser.feed(chunk)] + parser.close()
+    assert [e["type"] for e in elements] == ["issue", "issue", "code_block"]
+    assert parser.issues[0]["severity"] == "high" and parser.issues[0]["line"] == 12
+    assert parser.issues[1]["severity"] == "low"
+    assert parser.code_blocks[0] == {"type": "code_block", "language": "python",
+                                     "code": "for i in range(n + 1):\n    pass"}
+
+def test_closing_fence_completes_without_its_newline():
+    parser = ResponseParser("code_completion")
+    assert parser.feed("```py\nreturn 1\n") == []
+    assert parser.feed("```") == [{"type": "code_block", "language": "py", "code": "return 1"}]
+
+def test_longer_fence_keeps_shorter_fences_as_code():
+    text = "````markdown\n```python\nx = 1\n```\n````\n"
+    parser = ResponseParser.parse("explanation", text)
+    assert [b["code"] for b in parser.code_blocks] == ["```python\nx = 1\n```"]
+
+def test_tilde_fence_is_only_closed_by_tildes():
+    parser = ResponseParser.parse("explanation", "~~~\na\n```\n~~~\n")
+    assert parser.code_blocks[0]["code"] == "a\n```"
+
+def test_unterminated_block_is_flushed_on_close():
+    parser = ResponseParser("code_completion")
+    parser.feed("```python\nreturn 1")
+    assert parser.close() == [{"type": "code_block", "language": "python", "code": "return 1"}]
+
+def test_debugging_fix_pairs_code_with_the_prose_before_it():
+    parser = ResponseParser.parse("debugging", "Initialise the total first.\n```python\ntotal = 0\n```\n")
+    assert parser.fixes == [{"type": "fix", "fix": "Initialise the total first.",
+                             "code": "total = 0", "language": "python", "confidence": "medium"}]
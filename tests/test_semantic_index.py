@@ -0,0 +1,64 @@
+import asyncio
+import os
+from context_manager import ContextManager
+from semantic_index import SemanticIndex
+
+class FakeEmbedder:
+    def __init__(self):
+        self.texts = []
+
+    async def embed(self, texts, model):
+        self.texts.extend(texts)
+        return [[1.0, float(len(text))] for text in texts]
+
+def make_index(tmp_path, **kwargs):
+    project = tmp_path / "project"
+    project.mkdir()
+    (project / "a.py").write_text("def foo():\n    return 1\n")
+    manager = ContextManager(str(project), index_refresh_interval=0, **kwargs)
+    return project, SemanticIndex(manager, FakeEmbedder())
+
+def test_edited_file_is_re_embedded(tmp_path):
+    project, index = make_index(tmp_path)
+
+    async def run():
+        await index.ensure_built()
+        path = project / "a.py"
+        stat = path.stat()
+        path.write_text("def foo():\n    return 2\n")
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        index.client.texts.clear()
+        index.context_manager.index.restat()
+        await index.start_build()
+    asyncio.run(run())
+    assert any("return 2" in text for text in index.client.texts)
+
+def test_one_shot_search_does_not_start_a_build(tmp_path):
+    _, index = make_index(tmp_path, background_builds=False)
+
+    async def run():
+        await index.search("foo")
+        return index._build_task
+    assert asyncio.run(run()) is None
+    assert all("return 1" not in text for text in index.client.texts)
+
+def test_hits_in_files_edited_since_embedding_are_skipped(tmp_path):
+    project, index = make_index(tmp_path)
+
+    async def run():
+        await index.ensure_built()
+        first = await index.retrieve("foo")
+        path = project / "a.py"
+        stat = path.stat()
+        path.write_text("x = 0\n" + path.read_text())
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        return first, await index.retrieve("foo")
+    first, second = asyncio.run(run())
+    assert first == [("a.py (lines 1-2)", "def foo():\n    return 1")]
+    assert second == []
+
+def test_chunking_leaves_the_shared_parser_caches_alone(tmp_path):
+    _, index = make_index(tmp_path)
+    asyncio.run(index.ensure_built())
+    assert index.parser.trees.stats["full_parses"] == 0
+    assert not index.parser._line_indexes
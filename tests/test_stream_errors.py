@@ -0,0 +1,117 @@
+import asyncio
+import httpx
+import pytest
+from assistant import AICodeAssistant, CodeContext, TaskType
+from context_manager import ContextManager
+from model_router import ModelRouter
+from ollama_client import ErrorText, StreamError
+from request_coalescer import CoalescingClient
+from response_cache import ResponseCache
+
+class FakeModel:
+    """Streams fixed tokens, optionally cut short by a failure"""
+
+    def __init__(self, tokens, error=None):
+        self.model = "codellama:7b"
+        self.tokens = tokens
+        self.error = error
+
+    async def stream_response(self, prompt, **kwargs):
+        for token in self.tokens:
+            yield token
+        if self.error:
+            yield StreamError(f"Error: {self.error}")
+
+    async def generate_response(self, prompt, **kwargs):
+        return ''.join(self.tokens)
+
+def make_assistant(tmp_path, model):
+    (tmp_path / "m.py").write_text("def f():\n    ")
+    cache = ResponseCache(cache_nonzero_temperature=["code_completion", "explanation"])
+    return AICodeAssistant(model, ContextManager(str(tmp_path), background_builds=False),
+                           response_cache=cache)
+
+def context(tmp_path):
+    return CodeContext(str(tmp_path / "m.py"), "def f():\n    ", "python", 13)
+
+@pytest.mark.parametrize("coalesce", [False, True])
+def test_failed_completion_is_not_cached_or_recorded(tmp_path, coalesce):
+    model = FakeModel(["```python\n", "return 1"], error="connection reset")
+    assistant = make_assistant(tmp_path, CoalescingClient(model) if coalesce else model)
+
+    result = asyncio.run(assistant.process_request(TaskType.CODE_COMPLETION, context(tmp_path),
+                                                   "Complete", session_id="s"))
+    assert result["error"] == "Error: connection reset"
+    assert result["response"].endswith("Error: connection reset")
+    assert assistant.response_cache.stats["stores"] == 0
+    assert len(assistant.sessions.peek("s") or ()) == 0
+
+    model.error = None
+    result = asyncio.run(assistant.process_request(TaskType.CODE_COMPLETION, context(tmp_path),
+                                                   "Complete", session_id="s"))
+    assert "error" not in result
+    assert result["completion"] == "return 1"
+    assert assistant.response_cache.stats["stores"] == 1
+    assert len(assistant.sessions.peek("s")) == 1
+
+def test_failed_stream_request_is_not_cached_or_recorded(tmp_path):
+    model = FakeModel(["It defines ", "f, which"], error="timed out")
+    assistant = make_assistant(tmp_path, model)
+
+    async def run():
+        return [event async for event in assistant.stream_request(
+            TaskType.EXPLANATION, context(tmp_path), "Explain", session_id="s")]
+    events = asyncio.run(run())
+    tokens = [event["data"] for event in events if event["event"] == "token"]
+    assert tokens[-1] == "Error: timed out"
+    result = events[-1]["data"]
+    assert result["error"] == "Error: timed out"
+    assert assistant.response_cache.stats["stores"] == 0
+    assert len(assistant.sessions.peek("s") or ()) == 0
+
+class ReplyModel:
+    model = "codellama:7b"
+
+    def __init__(self, reply):
+        self.reply = reply
+
+    async def generate_response(self, prompt, **kwargs):
+        return self.reply
+
+@pytest.mark.parametrize("reply, failed", [
+    ("Error: the loop never ends because i is not incremented.", False),
+    (ErrorText("Error communicating with Ollama: connection refused"), True),
+])
+def test_only_typed_errors_count_as_failures(tmp_path, reply, failed):
+    assistant = make_assistant(tmp_path, ReplyModel(reply))
+    result = asyncio.run(assistant.process_request(TaskType.EXPLANATION, context(tmp_path),
+                                                   "Explain", session_id="s"))
+    assert ("error" in result) == failed
+    assert assistant.response_cache.stats["stores"] == (0 if failed else 1)
+    assert len(assistant.sessions.peek("s") or ()) == (0 if failed else 1)
+
+class FailingBackend:
+    """OllamaClient stand-in whose stream breaks after some tokens"""
+
+    def __init__(self, tokens, base_url="http://a:11434"):
+        self.tokens = tokens
+        self.base_url = base_url
+        self.timeout = 5
+
+    async def fetch_models(self, timeout=None):
+        return ["codellama:7b"]
+
+    async def stream(self, prompt, **kwargs):
+        for token in self.tokens:
+            yield token
+        raise httpx.ReadError("connection reset")
+
+def test_router_flags_a_stream_that_fails_after_starting():
+    router = ModelRouter([FailingBackend(["a", "b"])])
+
+    async def run():
+        return [token async for token in router.stream_response("prompt")]
+    tokens = asyncio.run(run())
+    assert tokens[:2] == ["a", "b"]
+    assert isinstance(tokens[2], StreamError) and not isinstance(tokens[0], StreamError)
+    assert tokens[2] == "Error: connection reset"
@@ -0,0 +1,43 @@
+import os
+import pytest
+from context_manager import ContextManager
+from project_scanner import ProjectScanner
+
+@pytest.fixture
+def manager(tmp_path):
+    root = tmp_path / "project"
+    (root / "pkg").mkdir(parents=True)
+    (root / "pkg" / "alpha.py").write_text("def alpha():\n    return 1\n")
+    (root / "pkg" / "beta.py").write_text("class Beta:\n    def run(self):\n        pass\n")
+    (root / "main.py").write_text("from pkg.alpha import alpha\n\nalpha()\n")
+    manager = ContextManager(str(root), index_path=str(tmp_path / "state" / "index.json"),
+                             index_refresh_interval=0)
+    manager.build_indexes()
+    return manager
+
+def test_lookups_do_not_run_the_scanner(manager, monkeypatch):
+    def scan(self, progress=None):
+        raise AssertionError("lookup ran a project scan")
+    monkeypatch.setattr(ProjectScanner, "scan", scan)
+
+    assert [d["path"] for d in manager.find_definitions("alpha")] == [os.path.join("pkg", "alpha.py")]
+    assert {r["path"] for r in manager.find_references("alpha")} == {os.path.join("pkg", "alpha.py"), "main.py"}
+
+def test_definitions_record_scope(manager):
+    (method,) = manager.find_definitions("run")
+    assert method["scope"] == "Beta"
+    (cls,) = manager.find_definitions("Beta")
+    assert cls["scope"] == ""
+
+def test_import_graph_follows_edits(manager):
+    root = manager.index.project_root
+    assert manager.import_graph.related("main.py") == [os.path.join("pkg", "alpha.py")]
+
+    with open(root / "main.py", "a", encoding="utf-8") as f:
+        f.write("from pkg.beta import Beta\n")
+    assert set(manager.import_graph.related("main.py")) == {
+        os.path.join("pkg", "alpha.py"), os.path.join("pkg", "beta.py")}
+
+def test_removed_file_drops_its_definitions(manager):
+    os.remove(manager.index.project_root / "pkg" / "beta.py")
+    assert manager.find_definitions("Beta") == []
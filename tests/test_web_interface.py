@@ -0,0 +1,78 @@
+import asyncio
+import gc
+import importlib
+import sys
+import httpx
+import pytest
+
+class FakeRequest:
+    def __init__(self, data):
+        self.data = data
+
+    async def json(self):
+        return self.data
+
+@pytest.fixture
+def web(tmp_path, monkeypatch):
+    project = tmp_path / "project"
+    project.mkdir()
+    (project / "m.py").write_text("x = 1\n")
+    config = tmp_path / "config.yaml"
+    config.write_text("cache: {enabled: false}\n"
+                      "semantic_index: {enabled: false}\n"
+                      "tracing: {enabled: false}\n"
+                      "web: {concurrency_per_model: 1, max_queue_interactive: 0}\n")
+    monkeypatch.setenv("AI_ASSISTANT_CONFIG", str(config))
+    monkeypatch.chdir(project)
+    sys.modules.pop("ui.web_interface", None)
+    web = importlib.import_module("ui.web_interface")
+
+    async def stream_request(task_type, context, user_input, session_id=None):
+        yield {"event": "token", "data": "hello"}
+    monkeypatch.setattr(web.assistant, "stream_request", stream_request)
+    yield web
+    sys.modules.pop("ui.web_interface", None)
+
+def active_slots(web):
+    return sum(slots.active for slots in web.admission._models.values())
+
+def test_stream_that_is_never_sent_releases_its_slot(web):
+    async def run():
+        body = {"task_type": "explanation", "content": "x = 1\n"}
+        response = await web.assist_stream(FakeRequest(body))
+        assert active_slots(web) == 1
+        # Full: a second stream is turned away while the first holds the slot
+        assert (await web.assist_stream(FakeRequest(body))).status_code == 429
+
+        del response
+        gc.collect()
+        for _ in range(3):
+            await asyncio.sleep(0)
+        assert active_slots(web) == 0
+    asyncio.run(run())
+
+def test_streamed_response_releases_its_slot(web):
+    async def run():
+        transport = httpx.ASGITransport(app=web.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.post("/assist/stream", json={"task_type": "explanation",
+                                                                 "content": "x = 1\n"})
+        assert response.status_code == 200
+        assert "event: token\ndata: \"hello\"" in response.text
+        assert active_slots(web) == 0
+    asyncio.run(run())
+
+@pytest.mark.parametrize("path, body", [
+    ("/assist", {"task_type": "explanation", "file_path": "/etc/passwd"}),
+    ("/assist", {"task_type": "explanation", "file_path": "../outside.py", "content": "x"}),
+    ("/batch", {"task_type": "code_review", "target": "/etc"}),
+    ("/batch", {"task_type": "code_review", "target": "m.py", "checkpoint": "/tmp/checkpoint.jsonl"}),
+])
+def test_paths_outside_the_project_are_rejected(web, path, body):
+    async def run():
+        transport = httpx.ASGITransport(app=web.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.post(path, json=body)
+    response = asyncio.run(run())
+    assert response.status_code == 400
+    assert "must be inside the project" in response.json()["detail"]